@@ -0,0 +1,127 @@
+"""Cold-start benchmark: how long a fresh interpreter takes to import main.
+
+Imports main in new Python processes (nothing is cached between runs apart from
+.pyc files), reports the median wall time, and uses `python -X importtime` to
+list the modules that cost the most. Also flags heavy optional dependencies
+that should only load on first use.
+
+    python benchmarks/import_time.py --runs 10 --output before.json
+    python benchmarks/import_time.py --output after.json --compare before.json
+    python benchmarks/import_time.py --check     # exit 1 if a lazy module loads at import
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use (sending mail, hashing, semantic cache, tracing), never by `import main`
+LAZY_MODULES = ["googleapiclient", "google.oauth2", "passlib", "numpy", "smtplib", "opentelemetry", "redis", "uvicorn"]
+
+_TIMED_IMPORT = (
+    "import sys, time, json\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({'seconds': elapsed, 'lazy_loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (LAZY_MODULES,)
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _run_python(args):
+    # No .env overrides here: the point is what a pod or `--reload` restart pays
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"❌ import main failed:\n{result.stderr[-2000:]}")
+    return result
+
+def time_imports(runs):
+    samples, lazy_loaded = [], set()
+    for _ in range(runs):
+        report = json.loads(_run_python(["-c", _TIMED_IMPORT]).stdout.strip().splitlines()[-1])
+        samples.append(report["seconds"])
+        lazy_loaded.update(report["lazy_loaded"])
+    return samples, sorted(lazy_loaded)
+
+def profile_imports(top):
+    """Parse `-X importtime` output into the costliest packages and single modules."""
+    stderr = _run_python(["-X", "importtime", "-c", "import main"]).stderr
+    packages, modules = {}, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.append((int(self_us), name))
+        # Self time summed per top-level package (fastapi, pymongo, email...), so nothing is counted twice
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + int(self_us)
+    return {
+        "by_package_ms": {
+            name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+        "by_module_self_ms": {name: round(us / 1000, 1) for us, name in sorted(modules, reverse=True)[:top]},
+        "modules_imported": len(modules)
+    }
+
+def compare(current, baseline):
+    print(f"\nvs {baseline['meta'].get('commit')}:")
+    before, now = baseline["import_ms"]["median"], current["import_ms"]["median"]
+    change = (now - before) / before * 100 if before else 0.0
+    print(f"import main median: {before} ms -> {now} ms ({change:+.1f}%)")
+    print(f"{'package':28} {'ms':>10} {'Δms':>8}")
+    for name, ms in current["profile"]["by_package_ms"].items():
+        previous = baseline["profile"]["by_package_ms"].get(name)
+        delta = f"{ms - previous:+.1f}" if previous is not None else "new"
+        print(f"{name:28} {ms:>10} {delta:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the profile")
+    parser.add_argument("--check", action="store_true", help="fail if any LAZY_MODULES load at import")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    # One throwaway run so every timed run sees compiled .pyc files
+    _run_python(["-c", "import main"])
+    samples, lazy_loaded = time_imports(args.runs)
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        },
+        "import_ms": {
+            "median": round(statistics.median(samples) * 1000, 1),
+            "min": round(min(samples) * 1000, 1),
+            "max": round(max(samples) * 1000, 1)
+        },
+        "lazy_modules_loaded": lazy_loaded,
+        "profile": profile_imports(args.top)
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.check and lazy_loaded:
+        print(f"❌ Loaded at import but meant to be lazy: {', '.join(lazy_loaded)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
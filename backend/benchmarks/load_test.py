@@ -0,0 +1,310 @@
+"""Load test for the API against local stand-ins for MongoDB and the LLM.
+
+Boots mock_llm_server.py and benchmarks/serve.py (main:app plus instrumentation)
+as subprocesses, seeds data, drives a weighted mix of requests from concurrent
+virtual users, and writes per-endpoint RPS and latency percentiles, event-loop
+lag and Mongo command counts as JSON.
+
+    pip install mongomock-motor          # only needed without a local MongoDB
+    python benchmarks/load_test.py --duration 30 --concurrency 50 --output results.json
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/load_test.py --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timezone
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scenario -> default share of the mix
+DEFAULT_MIX = {"chat": 30, "chat_stream": 15, "history": 20, "public_bots": 20, "login": 10, "signup": 5}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; expected one of {sorted(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class Recorder:
+    """Latency samples and status counts per endpoint label."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.first_tokens = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, label, seconds, status):
+        self.latencies[label].append(seconds)
+        self.statuses[label][status] += 1
+        if status >= 400:
+            self.errors[label] += 1
+
+    def fail(self, label, seconds):
+        self.latencies[label].append(seconds)
+        self.errors[label] += 1
+        self.statuses[label]["exception"] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            endpoints[label] = {
+                "requests": len(samples),
+                "errors": self.errors[label],
+                "rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(_percentile(samples, 0.5) * 1000, 1),
+                "p95_ms": round(_percentile(samples, 0.95) * 1000, 1),
+                "p99_ms": round(_percentile(samples, 0.99) * 1000, 1),
+                "max_ms": round(max(samples) * 1000, 1),
+                "statuses": dict(self.statuses[label]),
+            }
+            if self.first_tokens[label]:
+                endpoints[label]["ttft_p50_ms"] = round(_percentile(self.first_tokens[label], 0.5) * 1000, 1)
+                endpoints[label]["ttft_p95_ms"] = round(_percentile(self.first_tokens[label], 0.95) * 1000, 1)
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {"requests": total, "rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+def _auth(user):
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+class Workload:
+    """One request per scenario; labels match the route being measured."""
+
+    def __init__(self, client, seed_data, recorder):
+        self.client = client
+        self.users = seed_data["users"]
+        self.bots = seed_data["bots"]
+        self.history_bot = seed_data["history_bot"]
+        self.password = seed_data["password"]
+        self.recorder = recorder
+        self.signups = 0
+
+    async def _timed(self, label, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            res = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.fail(label, time.perf_counter() - started)
+            return None
+        self.recorder.add(label, time.perf_counter() - started, res.status_code)
+        return res
+
+    async def chat(self):
+        user = random.choice(self.users)
+        await self._timed("POST /chat/ask", "POST", "/chat/ask", headers=_auth(user), json={
+            "bot_id": random.choice(self.bots), "message": random.choice(MESSAGES)
+        })
+
+    async def chat_stream(self):
+        user = random.choice(self.users)
+        label = "POST /chat/ask/stream"
+        body = {"bot_id": random.choice(self.bots), "message": random.choice(MESSAGES)}
+        started = time.perf_counter()
+        first_token = None
+        try:
+            async with self.client.stream("POST", "/chat/ask/stream", headers=_auth(user), json=body) as res:
+                async for line in res.aiter_lines():
+                    if first_token is None and line.startswith("data:"):
+                        first_token = time.perf_counter() - started
+        except httpx.HTTPError:
+            self.recorder.fail(label, time.perf_counter() - started)
+            return
+        self.recorder.add(label, time.perf_counter() - started, res.status_code)
+        if first_token is not None:
+            self.recorder.first_tokens[label].append(first_token)
+
+    async def history(self):
+        user = random.choice(self.users)
+        await self._timed("GET /chat/history", "GET", "/chat/history", headers=_auth(user), params={
+            "bot_id": self.history_bot, "limit": 30
+        })
+
+    async def public_bots(self):
+        """A landing page view: one catalogue page, then its avatar thumbnails."""
+        res = await self._timed("GET /bots/public", "GET", "/bots/public", params={"limit": 24})
+        if res is None or res.status_code != 200:
+            return
+        urls = [bot["avatar_url"] for bot in res.json().get("data", []) if bot.get("avatar_url")]
+        await asyncio.gather(*(
+            self._timed("GET /avatars/{hash}", "GET", url, params={"size": 64}) for url in urls
+        ))
+
+    async def login(self):
+        user = random.choice(self.users)
+        await self._timed("POST /auth/login", "POST", "/auth/login", json={"email": user["email"], "password": self.password})
+
+    async def signup(self):
+        self.signups += 1
+        email = f"signup{self.signups}-{random.getrandbits(32):08x}@example.com"
+        await self._timed("POST /auth/signup", "POST", "/auth/signup", json={
+            "full_name": "Bench Signup", "email": email, "password": self.password, "confirm_password": self.password
+        })
+
+MESSAGES = ["hi", "hey what's up", "tell me about your day", "what do you like to do?", "I had a rough week", "good morning!"]
+
+async def virtual_user(workload, mix, deadline):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        await getattr(workload, random.choices(names, weights)[0])()
+
+async def wait_until_up(url, timeout=60):
+    async with httpx.AsyncClient() as client:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_processes(args):
+    llm_port, api_port = _free_port(), _free_port()
+    llm_env = {
+        **os.environ,
+        "MOCK_LLM_PORT": str(llm_port),
+        "MOCK_LLM_FIRST_TOKEN_DELAY": str(args.llm_latency),
+        "MOCK_LLM_TOKEN_DELAY": str(args.token_delay),
+    }
+    api_env = {
+        **os.environ,
+        "BENCH_PORT": str(api_port),
+        "MONGODB_URI": os.getenv("MONGODB_URI", "mongomock"),
+        # A throwaway database per run, dropped when the server shuts down
+        "MONGODB_DB_NAME": f"bench_{int(time.time())}",
+        "BENCH_DROP_DB": "true",
+        "LLM_PROVIDERS": "mock",
+        "MOCK_LLM_URL": f"http://127.0.0.1:{llm_port}/v1beta",
+        "MAIL_TRANSPORT": "file",
+        "MAIL_OUTBOX_DIR": os.path.join(BACKEND_DIR, "benchmarks", "outbox"),
+        "PENDING_STORE": "memory",
+        "JWT_SECRET_KEY": "benchmark",
+        # Seeded access tokens have to outlast warm-up and the run
+        "ACCESS_TOKEN_TTL": "86400",
+    }
+    if not args.keep_rate_limits:
+        # Measure the server, not the throttles
+        for rule in ("CHAT_USER", "CHAT_BOT", "SIGNUP", "OTP"):
+            api_env[f"{rule}_RATE"] = api_env[f"{rule}_BURST"] = "1000000"
+    llm = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "mock_llm_server.py")], cwd=BACKEND_DIR, env=llm_env)
+    api = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "serve.py")], cwd=BACKEND_DIR, env=api_env)
+    return llm, api, f"http://127.0.0.1:{llm_port}", f"http://127.0.0.1:{api_port}", api_env["MONGODB_URI"]
+
+async def run(args):
+    random.seed(args.seed)
+    llm, api, llm_url, api_url, mongodb_uri = start_processes(args)
+    try:
+        await wait_until_up(f"{llm_url}/docs")
+        await wait_until_up(f"{api_url}/")
+        limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=api_url, timeout=60, limits=limits) as client:
+            res = await client.post("/__bench__/seed", json={"users": args.users, "bots": args.bots, "history": args.history})
+            res.raise_for_status()
+            seed_data = res.json()
+
+            if args.warmup:
+                warmup = Workload(client, seed_data, Recorder())
+                deadline = time.perf_counter() + args.warmup
+                await asyncio.gather(*(virtual_user(warmup, args.mix, deadline) for _ in range(args.concurrency)))
+            await client.post("/__bench__/reset")
+
+            recorder = Recorder()
+            workload = Workload(client, seed_data, recorder)
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(virtual_user(workload, args.mix, deadline) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            server = (await client.get("/__bench__/stats")).json()
+
+        summary = recorder.summary(elapsed)
+        server["db_commands_per_request"] = round(server["db_commands_total"] / summary["requests"], 2) if summary["requests"] else 0.0
+        return {
+            "meta": {
+                "commit": _git_commit(),
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "duration_s": round(elapsed, 2),
+                "concurrency": args.concurrency,
+                "mix": args.mix,
+                "mongodb": "mongomock" if mongodb_uri == "mongomock" else "mongodb",
+                "llm_first_token_delay_s": args.llm_latency,
+                "llm_token_delay_s": args.token_delay,
+                "seed": args.seed,
+            },
+            **summary,
+            "server": server,
+        }
+    finally:
+        for process in (api, llm):
+            process.terminate()
+        for process in (api, llm):
+            process.wait(timeout=30)
+
+def compare(current, baseline):
+    """Print RPS and p95 change per endpoint against an earlier result file."""
+    print(f"\nvs {baseline['meta'].get('commit')}:")
+    print(f"{'endpoint':28} {'rps':>10} {'Δrps':>8} {'p95 ms':>10} {'Δp95':>8}")
+    for label, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(label)
+        if not before:
+            print(f"{label:28} {now['rps']:>10} {'new':>8} {now['p95_ms']:>10}")
+            continue
+        drps = (now["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        dp95 = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        print(f"{label:28} {now['rps']:>10} {drps:>+7.1f}% {now['p95_ms']:>10} {dp95:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. chat=50,history=30,public_bots=20")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--history", type=int, default=40, help="stored turns per seeded user")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="mock LLM delay before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="mock LLM delay between tokens")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="leave the app's rate limits at their defaults")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Microbenchmark: cost per item of turning Mongo documents into a JSON response body.
+
+Compares, for history pages and bot card pages of growing size:
+    legacy    str(_id) and isoformat per row, jsonable_encoder, json.dumps (the old handlers)
+    model     validating into the response models and dumping with pydantic
+    orjson    MongoJSONResponse as the handlers use it now
+
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --sizes 50,1000 --output serialization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.responses import MongoJSONResponse
+from routers.chat import HistoryPage
+from routers.bots import BotPage
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _legacy_timestamp(timestamp):
+    """What every history row went through before: the old format_timestamp_for_response."""
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.isoformat()
+    return datetime.now(timezone.utc).isoformat()
+
+def chat_docs(count):
+    # Naive datetimes, as Motor returns them
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "user_id": "3f2b8c1e-6a55-4d0c-9a63-1c2d3e4f5a6b",
+        "bot_id": "8e7d6c5b-4a39-4281-9f0e-d1c2b3a4f5e6",
+        "message": f"How was your day? I went hiking and saw a deer, message {i}",
+        "response": "That sounds lovely! Deer are so calm in the morning. Where did you go hiking? " * 2,
+        "message_id": "5c8d9e0f-1a2b-4c3d-8e4f-5a6b7c8d9e0f",
+        "timestamp": now - timedelta(seconds=count - i),
+        "updated": now - timedelta(seconds=count - i)
+    } for i in range(count)]
+
+def bot_docs(count):
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "bot_id": f"8e7d6c5b-4a39-4281-9f0e-{i:012d}",
+        "user_id": "3f2b8c1e-6a55-4d0c-9a63-1c2d3e4f5a6b",
+        "name": f"Companion {i}",
+        "bio": "A cheerful companion who loves long walks, books and bad puns.",
+        "first_message": "Hey! Good to see you.",
+        "type_of_bot": "friend",
+        "privacy": "public",
+        "avatar_hash": "a" * 64,
+        "avatar_url": f"/avatars/{'a' * 64}",
+        "created_at": now - timedelta(minutes=i),
+        "chat_count": i
+    } for i in range(count)]
+
+def legacy_history(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        doc["timestamp"] = _legacy_timestamp(doc.get("timestamp"))
+        doc["chat_id"] = "chat"
+    content = jsonable_encoder({"status": "success", "data": docs, "next_before": None, "next_after": None, "has_more": False})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+def legacy_bots(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    content = jsonable_encoder({"data": docs, "next_cursor": None})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+_history_adapter = TypeAdapter(HistoryPage)
+_bot_adapter = TypeAdapter(BotPage)
+
+def model_history(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        doc["chat_id"] = "chat"
+    page = _history_adapter.validate_python({"status": "success", "data": docs, "has_more": False})
+    return _history_adapter.dump_json(page, by_alias=True)
+
+def model_bots(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return _bot_adapter.dump_json(_bot_adapter.validate_python({"data": docs}), by_alias=True)
+
+def orjson_history(docs):
+    for doc in docs:
+        doc["chat_id"] = "chat"
+    return MongoJSONResponse({"status": "success", "data": docs, "next_before": None, "next_after": None, "has_more": False}).body
+
+def orjson_bots(docs):
+    return MongoJSONResponse({"data": docs, "next_cursor": None}).body
+
+CASES = {
+    "history": (chat_docs, {"legacy": legacy_history, "model": model_history, "orjson": orjson_history}),
+    "bot_cards": (bot_docs, {"legacy": legacy_bots, "model": model_bots, "orjson": orjson_bots}),
+}
+
+def measure(encode, docs, min_seconds):
+    """Best per-item time over repeated runs; every run gets fresh copies since encoders mutate rows."""
+    best = float("inf")
+    spent = 0.0
+    runs = 0
+    while spent < min_seconds or runs < 5:
+        batch = [dict(doc) for doc in docs]
+        started = time.perf_counter()
+        encode(batch)
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        spent += elapsed
+        runs += 1
+    return best / len(docs)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,200,1000,5000", help="items per response")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="measuring time per case and size")
+    parser.add_argument("--output", help="also write results JSON here")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {"meta": {"commit": _git_commit(), "python": sys.version.split()[0]}}
+    print(f"{'case':10} {'items':>6} " + " ".join(f"{name + ' µs':>12}" for name in ("legacy", "model", "orjson")) + f" {'speedup':>8}")
+    for case, (make, encoders) in CASES.items():
+        results[case] = {}
+        for size in sizes:
+            docs = make(size)
+            per_item = {name: measure(encode, docs, args.min_seconds) * 1e6 for name, encode in encoders.items()}
+            results[case][size] = {f"{name}_us_per_item": round(us, 3) for name, us in per_item.items()}
+            speedup = per_item["legacy"] / per_item["orjson"]
+            results[case][size]["speedup"] = round(speedup, 1)
+            print(f"{case:10} {size:>6} " + " ".join(f"{us:>12.2f}" for us in per_item.values()) + f" {speedup:>7.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Runs main:app with benchmark instrumentation. Started by load_test.py, not meant for production.
+
+Adds three routes under /__bench__:
+    POST /__bench__/seed    create users (with access tokens), bots (with avatars) and chat history
+    GET  /__bench__/stats   event-loop lag and Mongo command counts since the last reset
+    POST /__bench__/reset   zero the counters after warm-up
+"""
+import os
+import sys
+import uuid
+import base64
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import uvicorn
+from fastapi import Body
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PORT = int(os.getenv("BENCH_PORT", "8100"))
+# Sampling period of the event-loop lag probe
+LAG_INTERVAL = 0.01
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts Mongo commands by name. Only sees traffic to a real server, not mongomock."""
+
+    def __init__(self):
+        self.commands = Counter()
+        self.failures = 0
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        self.failures += 1
+
+_commands = CommandCounter()
+# Listeners must be registered before the client is created
+monitoring.register(_commands)
+
+if os.getenv("MONGODB_URI", "mongomock") == "mongomock":
+    import mongomock_motor
+    import utils.db
+    utils.db._build_client = lambda: mongomock_motor.AsyncMongoMockClient()
+
+import main
+from utils.db import get_db
+from utils.avatars import save_avatar
+from utils.hashing import hash_password_async
+from utils.prompts import compiled_fields
+from utils.search import search_index
+from utils.sessions import issue_tokens
+
+app = main.app
+_lag = []
+
+async def _probe_loop_lag():
+    """Record how late a short sleep wakes up; anything above zero is time the loop was blocked."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        _lag.append(loop.time() - started - LAG_INTERVAL)
+
+_app_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def bench_lifespan(app):
+    async with _app_lifespan(app) as state:
+        probe = asyncio.create_task(_probe_loop_lag())
+        yield state
+        probe.cancel()
+        if os.getenv("BENCH_DROP_DB", "false").lower() == "true":
+            db = get_db()
+            await db.client.drop_database(db.name)
+
+app.router.lifespan_context = bench_lifespan
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+# 1x1 PNG, varied per bot so every avatar is a distinct stored image
+_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+@app.post("/__bench__/seed")
+async def seed(users: int = Body(50), bots: int = Body(50), history: int = Body(40), password: str = Body("benchmark")):
+    db = get_db()
+    password_hash = await hash_password_async(password)
+    now = datetime.now(timezone.utc)
+    user_docs = [{
+        "user_id": str(uuid.uuid4()),
+        "full_name": f"Bench User {i}",
+        "email": f"bench{i}-{uuid.uuid4().hex[:8]}@example.com",
+        "password": password_hash,
+        "is_verified": True
+    } for i in range(users)]
+    await db.users.insert_many(user_docs)
+
+    bot_docs = []
+    avatars = True
+    for i in range(bots):
+        avatar_hash = None
+        if avatars:
+            try:
+                avatar_hash = await save_avatar(base64.b64encode(_PNG + i.to_bytes(4, "big")).decode())
+            except Exception as e:
+                # mongomock has no GridFS; run without avatars
+                print(f"⚠️ Seeding bots without avatars: {e}")
+                avatars = False
+        bot = {
+            "bot_id": str(uuid.uuid4()),
+            "user_id": user_docs[i % users]["user_id"],
+            "name": f"Bench Bot {i}",
+            "bio": "A friendly companion used for load testing",
+            "first_message": "Hey there!",
+            "situation": "Chatting online",
+            "back_story": "Created by the benchmark harness",
+            "personality": "cheerful, curious, kind",
+            "chatting_way": "casual and short",
+            "type_of_bot": ["friend", "mentor", "romantic", "fun"][i % 4],
+            "privacy": "public",
+            "avatar_hash": avatar_hash,
+            "chat_count": 0,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i)
+        }
+        bot.update(compiled_fields(bot))
+        bot_docs.append(bot)
+    await db.bots.insert_many([dict(bot) for bot in bot_docs])
+    for bot in bot_docs:
+        search_index.upsert(bot)
+
+    # Every user gets a history with the first bot, long enough to page through
+    chats = []
+    for user in user_docs:
+        for turn in range(history):
+            timestamp = now - timedelta(minutes=history - turn)
+            chats.append({
+                "user_id": user["user_id"],
+                "bot_id": bot_docs[0]["bot_id"],
+                "message": f"message {turn}",
+                "response": f"reply {turn}",
+                "message_id": str(uuid.uuid4()),
+                "timestamp": timestamp,
+                "updated": timestamp
+            })
+    if chats:
+        await db.chats.insert_many(chats)
+
+    return {
+        "users": [
+            {"user_id": u["user_id"], "email": u["email"], "access_token": issue_tokens(u["user_id"])["access_token"]}
+            for u in user_docs
+        ],
+        "bots": [b["bot_id"] for b in bot_docs],
+        "history_bot": bot_docs[0]["bot_id"],
+        "password": password
+    }
+
+@app.post("/__bench__/reset")
+async def reset():
+    _lag.clear()
+    _commands.commands.clear()
+    _commands.failures = 0
+    return {"status": "ok"}
+
+@app.get("/__bench__/stats")
+async def stats():
+    return {
+        "loop_lag_ms": {
+            "samples": len(_lag),
+            "p50": round(_percentile(_lag, 0.5) * 1000, 2),
+            "p99": round(_percentile(_lag, 0.99) * 1000, 2),
+            "max": round(max(_lag, default=0.0) * 1000, 2)
+        },
+        "db_commands": dict(_commands.commands),
+        "db_commands_total": sum(_commands.commands.values()),
+        "db_commands_failed": _commands.failures,
+        "db_monitored": os.getenv("MONGODB_URI", "mongomock") != "mongomock"
+    }
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=BENCH_PORT, log_level="warning")
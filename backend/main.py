@@ -1,20 +1,82 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, APIRouter, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, bots, chat
-import uvicorn
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from routers import auth, avatars, bots, chat, jobs
+from utils.http_client import init_http_client, close_http_client, get_pool_stats
+from utils.db import init_db, close_db, ping_db, db_initialized, run_when_ready
+from utils.conversations import backfill_conversations, backfill_bot_popularity
+from utils.avatars import migrate_inline_avatars
+from utils.search import build_search_index, search_index
+from utils.bot_cache import listen_for_invalidations, get_cache_stats
+from utils.redis_client import close_redis
+from utils.langchain_utils import get_usage_stats
+from utils.hashing import HashingBusyError, get_hashing_stats, shutdown_hashing, get_pwd_context
+from utils.mail_queue import start_mail_dispatcher, stop_mail_dispatcher, get_mail_stats
+from utils.pending_store import sweep_pending_users
+from utils.rate_limit import RateLimitedError, LLMBusyError, get_rate_limit_stats, llm_admission, LLM_DRAIN_TIMEOUT
+from utils.response_cache import get_response_cache_stats
+from utils.llm_providers import LLMError, get_provider_stats
+from utils.metrics import MetricsMiddleware, monitor_event_loop, render_metrics, require_metrics_access
+from utils.responses import MongoJSONResponse
+from utils.chat_writer import start_chat_writer, stop_chat_writer, get_chat_writer_stats
+from utils.purge import run_purge_worker, get_purge_stats
+from utils.sessions import sync_revocations, get_session_stats
+import math
+import asyncio
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import os
 
 load_dotenv()
 
+async def run_migrations():
+    # Each step waits for init_db (the $merge backfills need its unique indexes) and retries until it succeeds
+    await run_when_ready("Inline avatar migration", migrate_inline_avatars)
+    await run_when_ready("Conversation backfill", backfill_conversations)
+    # Popularity is counted from conversations, so it runs after their backfill
+    await run_when_ready("Bot popularity backfill", backfill_bot_popularity)
 
-# Initialize Mongo connection
-mongo = MongoClient(os.getenv("MONGODB_URI"))
-db_name = os.getenv("MONGODB_DB_NAME", "ai_companion")  # fallback if not in .env
-db = mongo[db_name]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One Mongo client and one pooled HTTP client per process, shared by all routers.
+    # The Mongo check and index build don't hold up startup; /ready reports when they're done
+    db_init = asyncio.create_task(init_db())
+    await init_http_client()
+    # Load passlib/bcrypt off the startup path but before the first login needs it
+    hashing_warmup = asyncio.create_task(asyncio.to_thread(get_pwd_context))
+    # One-off migrations for data stored before the current layout, off the startup path
+    migrations = asyncio.create_task(run_migrations())
+    search_indexer = asyncio.create_task(build_search_index())
+    cache_listener = asyncio.create_task(listen_for_invalidations())
+    pending_sweeper = asyncio.create_task(sweep_pending_users())
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    purge_worker = asyncio.create_task(run_purge_worker())
+    revocation_sync = asyncio.create_task(sync_revocations())
+    start_mail_dispatcher()
+    start_chat_writer()
+    yield
+    # Requests are already drained by the server; this waits for background LLM work such as memory summaries
+    cut_off = await llm_admission.drain(LLM_DRAIN_TIMEOUT)
+    if cut_off:
+        print(f"⚠️ {cut_off} LLM calls still running after {LLM_DRAIN_TIMEOUT}s, shutting down anyway")
+    # Buffered chat turns are flushed while the DB client is still open
+    await stop_chat_writer()
+    await stop_mail_dispatcher()
+    revocation_sync.cancel()
+    purge_worker.cancel()
+    loop_monitor.cancel()
+    pending_sweeper.cancel()
+    cache_listener.cancel()
+    search_indexer.cancel()
+    migrations.cancel()
+    hashing_warmup.cancel()
+    db_init.cancel()
+    await close_http_client()
+    await close_redis()
+    shutdown_hashing()
+    close_db()
 
-app = FastAPI(title="AI Companion API", version="1.0.0")
+# orjson for every response; list endpoints also skip jsonable_encoder by returning it directly
+app = FastAPI(title="AI Companion API", version="1.0.0", lifespan=lifespan, default_response_class=MongoJSONResponse)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,25 +86,128 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]  # Add this line
 )
+# Added last so it is outermost and times everything, CORS included
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(HashingBusyError)
+async def hashing_busy_handler(request: Request, exc: HashingBusyError):
+    # Shed load instead of queueing bcrypt work without bound during login spikes
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please try again"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(RateLimitedError)
+async def rate_limited_handler(request: Request, exc: RateLimitedError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, please slow down"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
+
+@app.exception_handler(LLMBusyError)
+async def llm_busy_handler(request: Request, exc: LLMBusyError):
+    # Every upstream slot stayed taken for LLM_ADMISSION_TIMEOUT
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please try again"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request: Request, exc: LLMError):
+    # Every provider in the chain failed or returned an unusable reply
+    print(f"❌ LLM error: {exc}")
+    return JSONResponse(status_code=502, content={"detail": "Upstream model error"})
 
 # Then import and include your routers
-from routers import auth, bots, chat
+from routers import auth, avatars, bots, chat, jobs
 
 # Routers
 app.include_router(auth.router)
 app.include_router(bots.router)
 app.include_router(chat.router)
+app.include_router(avatars.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to AI Companion API"}
 
-# Test DB connection
-try:
-    db.users.find_one()
-    print("✅ MongoDB Connected Successfully!")
-except Exception as e:
-    print(f"❌ MongoDB connection failed: {e}")
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Liveness: the process is up and serving, whatever state its dependencies are in."""
+    return {"status": "ok"}
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness: Mongo answers and startup index creation has finished."""
+    mongo = db_initialized() and await ping_db()
+    body = {"status": "ready" if mongo else "starting", "mongo": mongo, "search_index": search_index.ready}
+    return JSONResponse(status_code=200 if mongo else 503, content=body)
+
+# /metrics and /stats/* show queue, pool and session internals, so they aren't public
+internal = APIRouter(dependencies=[Depends(require_metrics_access)])
+
+# /stats/* groups whose numeric values are also exported on /metrics
+STATS_SOURCES = {
+    "llm_http": get_pool_stats,
+    "bot_cache": get_cache_stats,
+    "prompt_tokens": get_usage_stats,
+    "hashing": get_hashing_stats,
+    "mail": get_mail_stats,
+    "rate_limits": get_rate_limit_stats,
+    "llm_providers": get_provider_stats,
+    "response_cache": get_response_cache_stats,
+    "chat_writes": get_chat_writer_stats,
+    "purge": get_purge_stats,
+    "sessions": get_session_stats,
+}
+
+@internal.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(STATS_SOURCES), media_type="text/plain; version=0.0.4")
+
+@internal.get("/stats/llm-http")
+async def llm_http_stats():
+    return get_pool_stats()
+
+@internal.get("/stats/bot-cache")
+async def bot_cache_stats():
+    return get_cache_stats()
+
+@internal.get("/stats/prompt-tokens")
+async def prompt_token_stats():
+    return get_usage_stats()
+
+@internal.get("/stats/hashing")
+async def hashing_stats():
+    return get_hashing_stats()
+
+@internal.get("/stats/mail")
+async def mail_stats():
+    return get_mail_stats()
+
+@internal.get("/stats/rate-limits")
+async def rate_limit_stats():
+    return get_rate_limit_stats()
+
+@internal.get("/stats/llm-providers")
+async def llm_provider_stats():
+    return get_provider_stats()
+
+@internal.get("/stats/response-cache")
+async def response_cache_stats():
+    return get_response_cache_stats()
+
+@internal.get("/stats/chat-writes")
+async def chat_write_stats():
+    return get_chat_writer_stats()
+
+@internal.get("/stats/purge")
+async def purge_stats():
+    return get_purge_stats()
+
+@internal.get("/stats/sessions")
+async def session_stats():
+    return get_session_stats()
+
+app.include_router(internal)
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,137 @@
+"""Local stand-in for the Gemini and OpenAI-compatible REST APIs.
+
+Run it and point the backend at it:
+
+    python mock_llm_server.py
+    LLM_PROVIDERS=mock python main.py
+    # or exercise the OpenAI backend against it
+    LLM_PROVIDERS=openai OPENAI_API_BASE=http://localhost:8001/v1 python main.py
+"""
+from fastapi import FastAPI, Body, HTTPException
+from fastapi.responses import StreamingResponse
+import asyncio, hashlib, json, math, os, random
+import uvicorn
+
+MOCK_LLM_PORT = int(os.getenv("MOCK_LLM_PORT", "8001"))
+# Seconds before the first token and between tokens, to imitate model latency
+MOCK_LLM_FIRST_TOKEN_DELAY = float(os.getenv("MOCK_LLM_FIRST_TOKEN_DELAY", "0.2"))
+MOCK_LLM_TOKEN_DELAY = float(os.getenv("MOCK_LLM_TOKEN_DELAY", "0.02"))
+# Share of requests that fail with a 500 error payload, or stall for MOCK_LLM_SLOW_DELAY
+# first, to exercise provider fallback and hedging
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+MOCK_LLM_SLOW_RATE = float(os.getenv("MOCK_LLM_SLOW_RATE", "0"))
+MOCK_LLM_SLOW_DELAY = float(os.getenv("MOCK_LLM_SLOW_DELAY", "5"))
+MOCK_EMBEDDING_DIMENSIONS = 256
+
+app = FastAPI(title="Mock LLM Server")
+
+def last_user_message(payload):
+    """Pull the latest user text out of a Gemini request payload."""
+    text = ""
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            text = part.get("text", text)
+    for line in reversed(text.splitlines()):
+        line = line.strip()
+        if line.startswith("User:"):
+            return line[len("User:"):].strip()
+    return text.strip()
+
+def reply_for(payload):
+    """Deterministic reply so runs are reproducible."""
+    return f"haha you said: {last_user_message(payload)}"
+
+async def first_token_delay():
+    """Raise a 500 or wait before the first token, per the configured rates."""
+    if random.random() < MOCK_LLM_ERROR_RATE:
+        raise HTTPException(status_code=500, detail="Injected mock failure")
+    slow = random.random() < MOCK_LLM_SLOW_RATE
+    await asyncio.sleep(MOCK_LLM_SLOW_DELAY if slow else MOCK_LLM_FIRST_TOKEN_DELAY)
+
+def to_chunk(text, usage=None):
+    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+    if usage:
+        chunk["usageMetadata"] = usage
+    return chunk
+
+def usage_for(payload, reply):
+    """Rough token counts (~4 characters per token) in Gemini's usageMetadata shape."""
+    texts = [part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", [])]
+    texts += [part.get("text", "") for part in payload.get("systemInstruction", {}).get("parts", [])]
+    prompt_tokens = sum(len(text) for text in texts) // 4 + 1
+    output_tokens = len(reply) // 4 + 1
+    return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens, "totalTokenCount": prompt_tokens + output_tokens}
+
+def embedding_for(text):
+    """Hashed bag of words, so messages sharing words get similar vectors."""
+    values = [0.0] * MOCK_EMBEDDING_DIMENSIONS
+    for word in text.lower().split():
+        values[int(hashlib.md5(word.encode()).hexdigest(), 16) % MOCK_EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+@app.post("/v1beta/models/{model_action}")
+async def models(model_action: str, payload: dict = Body(...)):
+    model, _, action = model_action.partition(":")
+    reply = reply_for(payload)
+
+    if action == "generateContent":
+        await first_token_delay()
+        await asyncio.sleep(MOCK_LLM_TOKEN_DELAY * len(reply.split()))
+        return to_chunk(reply, usage_for(payload, reply))
+
+    if action == "embedContent":
+        text = " ".join(part.get("text", "") for part in payload.get("content", {}).get("parts", []))
+        return {"embedding": {"values": embedding_for(text)}}
+
+    if action == "streamGenerateContent":
+        await first_token_delay()
+
+        async def event_stream():
+            words = reply.split(" ")
+            for i, word in enumerate(words):
+                token = word if i == 0 else " " + word
+                usage = usage_for(payload, reply) if i == len(words) - 1 else None
+                yield f"data: {json.dumps(to_chunk(token, usage))}\r\n\r\n"
+                await asyncio.sleep(MOCK_LLM_TOKEN_DELAY)
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
+
+def gemini_contents(messages):
+    """OpenAI chat messages in the Gemini contents shape, so replies match across protocols."""
+    return {"contents": [{"parts": [{"text": m.get("content") or ""}]} for m in messages if m.get("role") != "system"]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(payload: dict = Body(...)):
+    gemini_payload = gemini_contents(payload.get("messages", []))
+    reply = reply_for(gemini_payload)
+    gemini_usage = usage_for(gemini_payload, reply)
+    usage = {
+        "prompt_tokens": gemini_usage["promptTokenCount"],
+        "completion_tokens": gemini_usage["candidatesTokenCount"],
+        "total_tokens": gemini_usage["totalTokenCount"]
+    }
+    model = payload.get("model", "mock")
+    await first_token_delay()
+
+    if not payload.get("stream"):
+        await asyncio.sleep(MOCK_LLM_TOKEN_DELAY * len(reply.split()))
+        return {"model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}], "usage": usage}
+
+    async def event_stream():
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            yield f"data: {json.dumps({'model': model, 'choices': [{'index': 0, 'delta': {'content': token}}]})}\n\n"
+            await asyncio.sleep(MOCK_LLM_TOKEN_DELAY)
+        yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/v1/embeddings")
+async def embeddings(payload: dict = Body(...)):
+    return {"data": [{"index": 0, "embedding": embedding_for(str(payload.get("input", "")))}]}
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=MOCK_LLM_PORT)
@@ -1,31 +1,31 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request
 from pydantic import EmailStr
-from motor.motor_asyncio import AsyncIOMotorClient
+from utils.db import get_db
 from bson import ObjectId
 from datetime import datetime, timedelta
-from utils.hashing import hash_password, verify_password
+from utils.hashing import hash_password_async, verify_password_async, verify_and_update_async
 from utils.gmail_utils import send_otp_email, send_welcome_email
+from utils.pending_store import pending_store
+from utils.rate_limit import check_rate_limit
+from utils.sessions import issue_tokens, refresh_session, decode_token, revoke_session, revoke_user_sessions
 import random, uuid, os
 
 from dotenv import load_dotenv
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGODB_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["ai_companion"]
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# In-memory storage for pending users (in production, use Redis or similar)
-pending_users = {}
-
 @router.post("/signup")
 async def signup(
+    request: Request,
     full_name: str = Body(...),
     email: EmailStr = Body(...),
     password: str = Body(...),
     confirm_password: str = Body(...)
 ):
+    await check_rate_limit("signup", request.client.host if request.client else "unknown")
+    db = get_db()
     if password != confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
@@ -33,25 +33,27 @@ async def signup(
         raise HTTPException(status_code=400, detail="User already exists")
 
     # Check if user is already in pending state
-    if email in pending_users:
+    if await pending_store.get(email):
         raise HTTPException(status_code=400, detail="Verification already sent. Please check your email.")
 
     # Generate OTP
     otp = random.randint(100000, 999999)
     
-    # Store user data temporarily with OTP
-    pending_users[email] = {
+    # Store user data temporarily with OTP; add() is atomic, so concurrent signups can't both win
+    added = await pending_store.add(email, {
         "user_id": str(uuid.uuid4()),
         "full_name": full_name,
         "email": email,
-        "password": hash_password(password),
+        "password": await hash_password_async(password),
         "is_verified": False,
         "otp": str(otp),
         "otp_created_at": datetime.utcnow()
-    }
+    })
+    if not added:
+        raise HTTPException(status_code=400, detail="Verification already sent. Please check your email.")
 
     try:
-        # Send welcome email with OTP
+        # Queue welcome email with OTP; delivery happens in the background
         await send_welcome_email(email, full_name)
         await send_otp_email(email, otp)
         return {
@@ -61,29 +63,57 @@ async def signup(
     except Exception as e:
         print(f"[ERROR] Email sending failed: {e}")
         # Remove user from pending if email fails
-        if email in pending_users:
-            del pending_users[email]
+        await pending_store.delete(email)
         raise HTTPException(status_code=500, detail="Failed to send verification email. Please try again.")
 
 
 @router.post("/login")
 async def login(email: EmailStr = Body(...), password: str = Body(...)):
+    db = get_db()
     user = await db.users.find_one({"email": email})
-    if not user or not verify_password(password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    valid, new_hash = await verify_and_update_async(password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Transparently upgrade hashes made with an older cost factor
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
     if not user.get("is_verified"):
         raise HTTPException(status_code=403, detail="Email not verified")
 
     return {
         "message": "Login successful",
         "user_id": user["user_id"],
-        "full_name": user["full_name"]
+        "full_name": user["full_name"],
+        **issue_tokens(user["user_id"])
     }
 
 
+@router.post("/refresh")
+async def refresh(refresh_token: str = Body(..., embed=True)):
+    # Each refresh token works once; keep the new one from the response
+    return await refresh_session(refresh_token)
+
+
+@router.post("/logout")
+async def logout(refresh_token: str = Body(..., embed=True)):
+    try:
+        claims = decode_token(refresh_token, "refresh")
+    except HTTPException:
+        # Expired or unknown: there is no session left to end
+        return {"message": "Logged out"}
+    await revoke_session(claims)
+    return {"message": "Logged out"}
+
+
 @router.post("/forgot-password/request")
 async def forgot_password_request(email: EmailStr = Body(...)):
+    await check_rate_limit("otp", email)
+    db = get_db()
     user = await db.users.find_one({"email": email})
     if not user:
         # For security, don't reveal if email exists or not
@@ -115,6 +145,9 @@ async def verify_password_reset_otp(
     otp: str = Body(...),
     new_password: str = Body(None)
 ):
+    # Six-digit codes are only safe while guesses per email stay scarce
+    await check_rate_limit("otp", email)
+    db = get_db()
     user = await db.users.find_one({"email": email})
     if not user:
         # For security, don't reveal if email exists or not
@@ -135,7 +168,7 @@ async def verify_password_reset_otp(
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
         
         # Check if new password is the same as the old one
-        if verify_password(new_password, user["password"]):
+        if await verify_password_async(new_password, user["password"]):
             raise HTTPException(
                 status_code=400,
                 detail="New password cannot be the same as your current password"
@@ -144,10 +177,12 @@ async def verify_password_reset_otp(
         await db.users.update_one(
             {"email": email},
             {
-                "$set": {"password": hash_password(new_password)},
+                "$set": {"password": await hash_password_async(new_password)},
                 "$unset": {"reset_otp": "", "reset_otp_created_at": ""}
             }
         )
+        # Whoever knew the old password may still be logged in
+        await revoke_user_sessions(user["user_id"])
         return {"message": "Password reset successful. You can now login with your new password."}
     
     # If no new password, just verify the OTP is valid
@@ -156,17 +191,18 @@ async def verify_password_reset_otp(
 
 @router.post("/email-verification")
 async def email_verification(email: EmailStr = Body(...), otp: str = Body(...)):
+    await check_rate_limit("otp", email)
+    db = get_db()
     # Check if user exists in pending users
-    if email not in pending_users:
+    user_data = await pending_store.get(email)
+    if not user_data:
         raise HTTPException(status_code=404, detail="No pending signup found for this email")
     
-    user_data = pending_users[email]
-    
     # Check if OTP exists and is not expired (10 minutes)
     otp_created_at = user_data.get("otp_created_at")
     if not otp_created_at or (datetime.utcnow() - otp_created_at) > timedelta(minutes=10):
         # Remove expired pending user
-        del pending_users[email]
+        await pending_store.delete(email)
         raise HTTPException(status_code=400, detail="OTP has expired. Please sign up again.")
 
     # Verify OTP
@@ -183,6 +219,6 @@ async def email_verification(email: EmailStr = Body(...), otp: str = Body(...)):
     await db.users.insert_one(user_to_insert)
     
     # Remove from pending users
-    del pending_users[email]
+    await pending_store.delete(email)
     
     return {"message": "Email verified successfully. Account created."}
\ No newline at end of file
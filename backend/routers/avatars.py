@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from utils.avatars import load_avatar, AVATAR_HASH_RE, AVATAR_THUMBNAIL_SIZES
+
+router = APIRouter(prefix="/avatars", tags=["Avatars"])
+
+# Avatars are content-addressed, so a given URL never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{avatar_hash}")
+async def get_avatar(avatar_hash: str, request: Request, size: int = None):
+    if not AVATAR_HASH_RE.match(avatar_hash):
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    if size is not None and size not in AVATAR_THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(AVATAR_THUMBNAIL_SIZES)}")
+
+    etag = f'"{avatar_hash}-{size or "orig"}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    avatar = await load_avatar(avatar_hash, size)
+    if not avatar:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    content, media_type = avatar
+    return Response(content=content, media_type=media_type, headers=headers)
@@ -1,6 +1,15 @@
-from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException, Body
-from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Body, Query, Depends
+from utils.db import get_db
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from utils.search import search_index
+from utils.bot_cache import invalidate_bot
+from utils.prompts import compiled_fields
+from utils.avatars import save_avatar, avatar_url
+from utils.llm_providers import parse_model_spec
+from utils.purge import delete_bot_later
+from utils.responses import MongoJSONResponse
+from utils.sessions import current_user
 from datetime import datetime, timezone
 import os, uuid
 from dotenv import load_dotenv
@@ -8,15 +17,47 @@ load_dotenv()
 
 router = APIRouter(prefix="/bots", tags=["Bots"])
 
-client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
-db = client["ai_companion"]
+# Avatars live in the avatar store; bot documents only carry the content hash
+BOT_PROJECTION = {"avatar_base64": 0}
+# List endpoints return only what BotCard.tsx renders; full documents come from /bots/{bot_id}
+CARD_PROJECTION = {
+    "bot_id": 1, "user_id": 1, "name": 1, "bio": 1, "first_message": 1, "type_of_bot": 1,
+    "privacy": 1, "avatar_hash": 1, "created_at": 1, "chat_count": 1
+}
+# sort query value -> bot field; chat_count is the number of distinct users who chatted with the bot
+SORT_FIELDS = {"created_at": "created_at", "popularity": "chat_count"}
+# Deleted bots keep their document until the purge job finishes; every read skips them
+LIVE = {"deleted_at": None}
+BOT_PAGE_LIMIT = 24
+BOT_MAX_PAGE_LIMIT = 100
 
 def get_current_timestamp():
     """Get current UTC timestamp as timezone-aware datetime object."""
     return datetime.now(timezone.utc)
 
+def serialize_bot(bot):
+    """Prepare a bot document for a JSON response; MongoJSONResponse encodes _id and datetimes."""
+    bot["avatar_url"] = avatar_url(bot.get("avatar_hash"))
+    return bot
+
+def check_model(model):
+    """Validate a bot's model setting ("openai", "gemini:gemini-2.5-flash"); empty means the default chain."""
+    if not model:
+        return None
+    try:
+        parse_model_spec(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model
+
+async def store_avatar(avatar_base64):
+    try:
+        return await save_avatar(avatar_base64)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# The owner is the logged-in user; a user_id sent in the body is ignored
 class BotCreate(BaseModel):
-    user_id: str
     name: str
     bio: str
     first_message: str
@@ -27,9 +68,9 @@ class BotCreate(BaseModel):
     type_of_bot: str
     privacy: str
     avatar_base64: str = None
+    model: str = None
 
 class BotUpdate(BaseModel):
-    user_id: str
     name: str
     bio: str
     first_message: str
@@ -40,17 +81,45 @@ class BotUpdate(BaseModel):
     type_of_bot: str
     privacy: str
     avatar_base64: str = None
+    # Left out: keep the current model; empty string: back to the default chain
+    model: str = None
+
+class BotCard(BaseModel):
+    id: str = Field(alias="_id")
+    bot_id: str
+    user_id: str
+    name: str
+    bio: str = None
+    first_message: str = None
+    type_of_bot: str = None
+    privacy: str
+    avatar_hash: str = None
+    avatar_url: str = None
+    created_at: datetime = None
+    chat_count: int = 0
+
+class BotPage(BaseModel):
+    data: list[BotCard]
+    next_cursor: str = None
+
+class BotSearchPage(BaseModel):
+    data: list[BotCard]
+    total: int
+    next_offset: int = None
+    indexing: bool
 
 @router.post("/createbot")
-async def create_bot(bot_data: BotCreate):
+async def create_bot(bot_data: BotCreate, user_id: str = Depends(current_user)):
+    db = get_db()
     print("Received bot data:", bot_data.name, bot_data.type_of_bot, "Has avatar:", bool(bot_data.avatar_base64))
 
     try:
         bot_id = str(uuid.uuid4())
+        avatar_hash = await store_avatar(bot_data.avatar_base64) if bot_data.avatar_base64 else None
 
         bot = {
             "bot_id": bot_id,
-            "user_id": bot_data.user_id,
+            "user_id": user_id,
             "name": bot_data.name,
             "bio": bot_data.bio,
             "first_message": bot_data.first_message,
@@ -60,56 +129,112 @@ async def create_bot(bot_data: BotCreate):
             "chatting_way": bot_data.chatting_way,
             "type_of_bot": bot_data.type_of_bot,
             "privacy": bot_data.privacy,
-            "avatar_base64": bot_data.avatar_base64,
+            "avatar_hash": avatar_hash,
+            "model": check_model(bot_data.model),
+            "chat_count": 0,
             "created_at": get_current_timestamp(),
             "updated_at": get_current_timestamp()
         }
+        bot.update(compiled_fields(bot))
 
         await db.bots.insert_one(bot)
+        search_index.upsert(bot)
 
         return {"message": "Bot created successfully", "bot_id": bot_id}
     
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error in create_bot:", str(e))
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
 
-@router.get("/public")
-async def list_public_bots():
+async def list_bot_cards(query, limit, cursor, sort, type_of_bot):
+    """One keyset page of bot cards, newest or most popular first."""
+    db = get_db()
+    field = SORT_FIELDS[sort]
+    query.update(LIVE)
+    if type_of_bot:
+        query["type_of_bot"] = type_of_bot
+    if cursor:
+        query.update(keyset_filter(field, *decode_cursor(cursor, as_datetime=field == "created_at"), -1))
+
+    # Fetch one extra card to know whether another page exists
+    bots = await db.bots.find(query, CARD_PROJECTION).sort([(field, -1), ("_id", -1)]).to_list(length=limit + 1)
+    has_more = len(bots) > limit
+    bots = bots[:limit]
+    next_cursor = encode_cursor(bots[-1].get(field), bots[-1]["_id"]) if has_more else None
+    return MongoJSONResponse({"data": [serialize_bot(bot) for bot in bots], "next_cursor": next_cursor})
+
+@router.get("/public", response_model=BotPage)
+async def list_public_bots(
+    limit: int = Query(BOT_PAGE_LIMIT, ge=1, le=BOT_MAX_PAGE_LIMIT),
+    cursor: str = None,
+    sort: str = Query("created_at", pattern="^(created_at|popularity)$"),
+    type_of_bot: str = None
+):
     try:
-        public_bots = []
-        async for bot in db.bots.find({"privacy": "public"}):
-            # Convert ObjectId to string for JSON serialization
-            bot["_id"] = str(bot["_id"])
-            public_bots.append(bot)
-        return public_bots
+        return await list_bot_cards({"privacy": "public"}, limit, cursor, sort, type_of_bot)
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error in list_public_bots:", str(e))
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
 
-@router.get("/my")
-async def list_my_bots(user_id: str):
+@router.get("/my", response_model=BotPage)
+async def list_my_bots(
+    user_id: str = Depends(current_user),
+    limit: int = Query(BOT_PAGE_LIMIT, ge=1, le=BOT_MAX_PAGE_LIMIT),
+    cursor: str = None,
+    sort: str = Query("created_at", pattern="^(created_at|popularity)$"),
+    type_of_bot: str = None
+):
     try:
-        my_bots = []
-        async for bot in db.bots.find({"user_id": user_id}):
-            # Convert ObjectId to string for JSON serialization
-            bot["_id"] = str(bot["_id"])
-            my_bots.append(bot)
-        return my_bots
+        return await list_bot_cards({"user_id": user_id}, limit, cursor, sort, type_of_bot)
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error in list_my_bots:", str(e))
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
 
+@router.get("/search", response_model=BotSearchPage)
+async def search_bots(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=BOT_MAX_PAGE_LIMIT),
+    offset: int = Query(0, ge=0)
+):
+    """Ranked, prefix- and typo-tolerant search over public bots."""
+    db = get_db()
+    try:
+        ranked = search_index.search(q)
+        page_ids = [bot_id for bot_id, _ in ranked[offset:offset + limit]]
+        # Re-read the page so bots deleted or made private elsewhere never show up
+        bots = {
+            bot["bot_id"]: bot
+            async for bot in db.bots.find({"bot_id": {"$in": page_ids}, "privacy": "public", **LIVE}, CARD_PROJECTION)
+        }
+        next_offset = offset + limit if offset + limit < len(ranked) else None
+        return MongoJSONResponse({
+            "data": [serialize_bot(bots[bot_id]) for bot_id in page_ids if bot_id in bots],
+            "total": len(ranked),
+            "next_offset": next_offset,
+            "indexing": not search_index.ready
+        })
+    except Exception as e:
+        print("❌ Error in search_bots:", str(e))
+        raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
+
 @router.put("/{bot_id}")
-async def update_bot(bot_id: str, bot_data: BotUpdate):
+async def update_bot(bot_id: str, bot_data: BotUpdate, user_id: str = Depends(current_user)):
+    db = get_db()
     try:
         # Find the bot to update
-        existing_bot = await db.bots.find_one({"bot_id": bot_id})
+        existing_bot = await db.bots.find_one({"bot_id": bot_id, **LIVE})
         
         if not existing_bot:
             raise HTTPException(status_code=404, detail="Bot not found")
         
         # Check if the user owns this bot
-        if existing_bot.get("user_id") != bot_data.user_id:
+        if existing_bot.get("user_id") != user_id:
             raise HTTPException(status_code=403, detail="You don't have permission to update this bot")
         
         # Update the bot data
@@ -126,14 +251,21 @@ async def update_bot(bot_id: str, bot_data: BotUpdate):
             "updated_at": get_current_timestamp()
         }
         
+        update_data.update(compiled_fields({**existing_bot, **update_data}))
+
+        if bot_data.model is not None:
+            update_data["model"] = check_model(bot_data.model)
+
         # Only update avatar if provided
         if bot_data.avatar_base64:
-            update_data["avatar_base64"] = bot_data.avatar_base64
+            update_data["avatar_hash"] = await store_avatar(bot_data.avatar_base64)
         
         await db.bots.update_one(
             {"bot_id": bot_id},
             {"$set": update_data}
         )
+        search_index.upsert({**existing_bot, **update_data})
+        await invalidate_bot(bot_id)
         
         return {"message": "Bot updated successfully", "bot_id": bot_id}
     
@@ -144,10 +276,11 @@ async def update_bot(bot_id: str, bot_data: BotUpdate):
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
 
 @router.delete("/{bot_id}")
-async def delete_bot(bot_id: str, user_id: str):
+async def delete_bot(bot_id: str, user_id: str = Depends(current_user)):
+    db = get_db()
     try:
         # Find the bot to delete
-        existing_bot = await db.bots.find_one({"bot_id": bot_id})
+        existing_bot = await db.bots.find_one({"bot_id": bot_id, **LIVE})
         
         if not existing_bot:
             raise HTTPException(status_code=404, detail="Bot not found")
@@ -156,10 +289,12 @@ async def delete_bot(bot_id: str, user_id: str):
         if existing_bot.get("user_id") != user_id:
             raise HTTPException(status_code=403, detail="You don't have permission to delete this bot")
         
-        # Delete the bot
-        await db.bots.delete_one({"bot_id": bot_id})
+        # Hide the bot now; its chats, summaries and avatar are purged in the background
+        job_id = await delete_bot_later(existing_bot)
+        search_index.remove(bot_id)
+        await invalidate_bot(bot_id)
         
-        return {"message": "Bot deleted successfully", "bot_id": bot_id}
+        return {"message": "Bot deleted successfully", "bot_id": bot_id, "job_id": job_id}
     
     except HTTPException:
         raise
@@ -169,14 +304,13 @@ async def delete_bot(bot_id: str, user_id: str):
 
 @router.get("/{bot_id}")
 async def get_bot(bot_id: str):
+    db = get_db()
     try:
-        bot = await db.bots.find_one({"bot_id": bot_id})
+        bot = await db.bots.find_one({"bot_id": bot_id, **LIVE}, BOT_PROJECTION)
         if not bot:
             raise HTTPException(status_code=404, detail="Bot not found")
         
-        # Convert ObjectId to string for JSON serialization
-        bot["_id"] = str(bot["_id"])
-        return bot
+        return MongoJSONResponse(serialize_bot(bot))
     except HTTPException:
         raise
     except Exception as e:
@@ -1,44 +1,66 @@
-from fastapi import APIRouter, Body, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
-from utils.langchain_utils import chat_with_bot
+from fastapi import APIRouter, Body, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from utils.db import get_db
+from utils.langchain_utils import chat_with_bot, stream_chat_with_bot
+from utils.memory import clear_context
+from utils.conversations import list_recent_conversations, clear_conversation
+from utils.chat_writer import store_chat, flush_chat
+from utils.purge import clear_chat_later, hidden_before
+from utils.avatars import avatar_url
+from utils.bot_cache import get_cached_bot
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from utils.rate_limit import check_rate_limits, LLMBusyError
+from utils.llm_providers import LLMError
+from utils.responses import MongoJSONResponse, dumps, stream_json_array
+from utils.sessions import current_user
 from datetime import datetime, timezone
-import uuid, os
+import asyncio, httpx, uuid, os
 from dotenv import load_dotenv
 load_dotenv()
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
-db = client["ai_companion"]
-
 def get_current_timestamp():
     """Get current UTC timestamp as timezone-aware datetime object."""
     return datetime.now(timezone.utc)
 
-def format_timestamp_for_response(timestamp):
-    """Format timestamp for API response with proper timezone handling."""
-    if not timestamp:
-        return get_current_timestamp().isoformat()
-    
-    if isinstance(timestamp, datetime):
-        # Ensure timezone awareness
-        if timestamp.tzinfo is None:
-            timestamp = timestamp.replace(tzinfo=timezone.utc)
-        return timestamp.isoformat()
-    elif isinstance(timestamp, str):
-        try:
-            # Validate the timestamp string
-            parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            return parsed.isoformat()
-        except ValueError:
-            # If invalid, return current time
-            return get_current_timestamp().isoformat()
-    else:
-        return get_current_timestamp().isoformat()
+class ChatTurn(BaseModel):
+    id: str = Field(alias="_id")
+    chat_id: str
+    timestamp: datetime
+    user_id: str = None
+    bot_id: str = None
+    message: str = None
+    response: str = None
+    message_id: str = None
+    is_system_message: bool = None
+    updated: datetime = None
+
+class HistoryPage(BaseModel):
+    status: str
+    data: list[ChatTurn]
+    next_before: str = None
+    next_after: str = None
+    has_more: bool
+
+class ConversationSummary(BaseModel):
+    chat_id: str
+    user_id: str
+    bot_id: str
+    bot_name: str = None
+    bot_avatar_url: str = None
+    last_message: str = None
+    last_timestamp: datetime = None
+    message_count: int = 0
+
+class RecentConversations(BaseModel):
+    status: str
+    data: list[ConversationSummary]
 
 @router.post("/ask")
 async def ask(
-    user_id: str = Body(...),
+    user_id: str = Depends(current_user),
     bot_id: str = Body(...),
     message: str = Body(...),
     is_system_message: bool = Body(False),
@@ -48,73 +70,232 @@ async def ask(
     # chat_id is constructed when needed instead of stored
     chat_id = f"{user_id}_{bot_id}"
     
-    # Load bot data from MongoDB
-    bot = await db.bots.find_one({"bot_id": bot_id})
+    # Load bot data (cached; only the fields the prompt needs)
+    bot = await get_cached_bot(bot_id)
     if not bot:
         return {"status": "error", "message": "Bot not found"}
 
     # If it's a system message (like bot's first message), store it directly
     if is_system_message and response:
-        await db.chats.insert_one({
+        timestamp = get_current_timestamp()
+        await store_chat({
             "user_id": user_id,
             "bot_id": bot_id,
             "message": message,  # Empty for system messages is acceptable
             "response": response,
             "is_system_message": True,
             "message_id": message_id or str(uuid.uuid4()),
-            "timestamp": get_current_timestamp(),
-            "updated": get_current_timestamp()
-        })
+            "timestamp": timestamp,
+            "updated": timestamp
+        }, bot)
         return {"status": "success", "message": "System message stored"}
     
-    # Normal user message flow
-    response = await chat_with_bot(bot, message, chat_id)
+    # Normal user message flow; only these reach the model, so only these are throttled
+    await check_rate_limits(("chat_user", user_id), ("chat_bot", bot_id))
+    usage = {}
+    response = await chat_with_bot(bot, message, chat_id, usage)
 
-    await db.chats.insert_one({
+    timestamp = get_current_timestamp()
+    # Buffered when CHAT_WRITE_BEHIND is on, so the reply doesn't wait on Mongo
+    await store_chat({
         "user_id": user_id,
         "bot_id": bot_id,
         "message": message,
         "response": response,
         "message_id": message_id or str(uuid.uuid4()),
-        "timestamp": get_current_timestamp(),
-        "updated": get_current_timestamp()
-    })
+        "timestamp": timestamp,
+        "updated": timestamp
+    }, bot)
+
+    return {"status": "success", "response": response, "usage": usage}
+
+def sse_event(data):
+    """Encode a dict as a single Server-Sent Events message."""
+    return b"data: " + dumps(data) + b"\n\n"
+
+@router.post("/ask/stream")
+async def ask_stream(
+    user_id: str = Depends(current_user),
+    bot_id: str = Body(...),
+    message: str = Body(...),
+    message_id: str = Body(None)
+):
+    chat_id = f"{user_id}_{bot_id}"
+
+    bot = await get_cached_bot(bot_id)
+    if not bot:
+        return {"status": "error", "message": "Bot not found"}
+
+    # Checked before the stream starts so a throttled client gets a real 429
+    await check_rate_limits(("chat_user", user_id), ("chat_bot", bot_id))
+
+    message_id = message_id or str(uuid.uuid4())
+    timestamp = get_current_timestamp()
+
+    async def store_turn(response):
+        await store_chat({
+            "user_id": user_id,
+            "bot_id": bot_id,
+            "message": message,
+            "response": response,
+            "message_id": message_id,
+            "timestamp": timestamp,
+            "updated": get_current_timestamp()
+        }, bot)
+
+    async def event_stream():
+        chunks = []
+        usage = {}
+        try:
+            async for chunk in stream_chat_with_bot(bot, message, chat_id, usage):
+                chunks.append(chunk)
+                yield sse_event({"token": chunk})
+        except (httpx.HTTPError, LLMError) as e:
+            print(f"Error in ask_stream: {str(e)}")
+            yield sse_event({"status": "error", "message": "Upstream model error"})
+            return
+        except LLMBusyError:
+            yield sse_event({"status": "error", "message": "Server busy, please try again"})
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away mid-reply: the upstream stream is already closed, store nothing
+            print(f"Client disconnected from stream for chat_id: {chat_id}")
+            raise
+
+        response = "".join(chunks)
+        # Shield the writes so a disconnect right after the last token can't drop the turn
+        await asyncio.shield(store_turn(response))
+        yield sse_event({"status": "success", "done": True, "response": response, "message_id": message_id, "usage": usage})
 
-    return {"status": "success", "response": response}
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+HISTORY_PAGE_LIMIT = 50
+HISTORY_MAX_PAGE_LIMIT = 200
+# Fields a client may ask for via ?fields=; _id and timestamp are always returned for cursors
+HISTORY_FIELDS = {"message", "response", "is_system_message", "message_id", "updated", "user_id", "bot_id"}
+
+async def visible_history_query(user_id, bot_id):
+    """Base history filter: flushes buffered turns and hides ones a restart is purging.
+
+    None once the bot is deleted, since its chats are only removed later by the purge job.
+    """
+    # Cached, and dropped from the cache on delete, so this costs no round trip
+    if not await get_cached_bot(bot_id):
+        return None
+    chat_id = f"{user_id}_{bot_id}"
+    await flush_chat(chat_id)
+    query = {"user_id": user_id, "bot_id": bot_id}
+    cutoff = await hidden_before(chat_id)
+    if cutoff:
+        query["timestamp"] = {"$gt": cutoff}
+    return query
+
+@router.get("/history", response_model=HistoryPage)
+async def get_chat_history(
+    bot_id: str,
+    user_id: str = Depends(current_user),
+    limit: int = Query(HISTORY_PAGE_LIMIT, ge=1, le=HISTORY_MAX_PAGE_LIMIT),
+    before: str = None,
+    after: str = None,
+    latest: bool = True,
+    fields: str = None
+):
+    """Keyset-paginated history on (timestamp, _id), always returned oldest first.
+
+    With no cursor, `latest=True` returns the most recent page so the chat opens at the
+    bottom; pass `next_before` back as `before` to load older turns on scroll.
+    """
+    db = get_db()
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    keyset = {}
+    if before:
+        keyset = keyset_filter("timestamp", *decode_cursor(before, as_datetime=True), -1)
+    elif after:
+        keyset = keyset_filter("timestamp", *decode_cursor(after, as_datetime=True), 1)
+    descending = bool(before) or (latest and not after)
+    direction = -1 if descending else 1
+
+    projection = None
+    if fields:
+        requested = {f.strip() for f in fields.split(",")} & HISTORY_FIELDS
+        projection = {f: 1 for f in requested | {"timestamp"}}
 
-@router.get("/history")
-async def get_chat_history(user_id: str, bot_id: str):
     try:
         chat_id = f"{user_id}_{bot_id}"
-        # Convert MongoDB cursor to list of dicts and handle ObjectId serialization
-        history = []
-        async for doc in db.chats.find({"user_id": user_id, "bot_id": bot_id}).sort("timestamp", 1):
-            # Convert ObjectId to string
-            doc["_id"] = str(doc["_id"])
-            # Format timestamp properly
-            doc["timestamp"] = format_timestamp_for_response(doc.get("timestamp"))
-            # Add chat_id for frontend compatibility
-            doc["chat_id"] = f"{user_id}_{bot_id}"
-            history.append(doc)
-        return {"status": "success", "data": history}
+        query = await visible_history_query(user_id, bot_id)
+        if query is None:
+            return MongoJSONResponse({"status": "error", "message": "Bot not found"})
+        query.update(keyset)
+        # Fetch one extra document to know whether another page exists
+        cursor = db.chats.find(query, projection).sort([("timestamp", direction), ("_id", direction)]).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        if descending:
+            docs.reverse()
+
+        # _id and timestamp are encoded by MongoJSONResponse; chat_id is for frontend compatibility
+        for doc in docs:
+            doc["chat_id"] = chat_id
+
+        older_exists = has_more if descending else bool(after)
+        newer_exists = bool(before) if descending else has_more
+        return MongoJSONResponse({
+            "status": "success",
+            "data": docs,
+            "next_before": encode_cursor(docs[0]["timestamp"], docs[0]["_id"]) if docs and older_exists else None,
+            "next_after": encode_cursor(docs[-1]["timestamp"], docs[-1]["_id"]) if docs and newer_exists else None,
+            "has_more": has_more
+        })
     except Exception as e:
         print(f"Error in get_chat_history: {str(e)}")  # Add logging
-        return {"status": "error", "message": str(e)}
+        return MongoJSONResponse({"status": "error", "message": str(e)})
+
+@router.get("/history/export")
+async def export_chat_history(bot_id: str, user_id: str = Depends(current_user)):
+    """Whole conversation oldest first, streamed as one JSON array straight from the cursor."""
+    db = get_db()
+    query = await visible_history_query(user_id, bot_id)
+    if query is None:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    cursor = db.chats.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(500)
+    return stream_json_array(cursor, head={"status": "success", "chat_id": f"{user_id}_{bot_id}"})
+
+@router.get("/recent", response_model=RecentConversations)
+async def get_recent_chats(user_id: str = Depends(current_user), limit: int = Query(50, ge=1, le=200)):
+    """Most recent conversations for the dashboard, one indexed query on conversations."""
+    try:
+        recent = await list_recent_conversations(user_id, limit)
+        for conversation in recent:
+            conversation["bot_avatar_url"] = avatar_url(conversation.pop("bot_avatar_hash", None))
+        return MongoJSONResponse({"status": "success", "data": recent})
+    except Exception as e:
+        print(f"Error in get_recent_chats: {str(e)}")
+        return MongoJSONResponse({"status": "error", "message": str(e)})
 
 @router.delete("/restart")
-async def restart_chat(user_id: str, bot_id: str):
+async def restart_chat(bot_id: str, user_id: str = Depends(current_user)):
     try:
-        # Delete all messages for this chat using user_id and bot_id
-        result = await db.chats.delete_many({"user_id": user_id, "bot_id": bot_id})
+        # Buffered turns would otherwise land after the summary is cleared and resurrect it
+        await flush_chat(f"{user_id}_{bot_id}")
+        # Messages are hidden now and deleted in batches by the purge worker;
+        # memory and the summary are single documents, so they go right away
+        job_id = await clear_chat_later(user_id, bot_id)
+        await clear_context(f"{user_id}_{bot_id}")
+        await clear_conversation(f"{user_id}_{bot_id}")
         
-        # Log the result
-        print(f"Deleted {result.deleted_count} messages for user_id: {user_id}, bot_id: {bot_id}")
+        print(f"Queued purge {job_id} of messages for user_id: {user_id}, bot_id: {bot_id}")
         
-        # Return success response with count of deleted messages
         return {
             "status": "success",
             "message": "Chat history cleared successfully",
-            "deleted_count": result.deleted_count
+            "job_id": job_id
         }
     except Exception as e:
         print(f"Error in restart_chat: {str(e)}")
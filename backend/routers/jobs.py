@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException, Depends
+from utils.purge import get_purge_job
+from utils.sessions import current_user
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(current_user)):
+    """Status and progress of a background purge (bot deletion or chat restart)."""
+    job = await get_purge_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.get("user_id") != user_id:
+        raise HTTPException(status_code=403, detail="You don't have permission to view this job")
+    return job
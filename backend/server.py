@@ -0,0 +1,70 @@
+"""Production entry point: `python server.py`.
+
+Runs main:app under uvicorn with one worker process per CPU core (override with
+WEB_CONCURRENCY). Each worker runs the FastAPI lifespan, so it opens its own
+Mongo client, HTTP pool and background tasks and drains them on shutdown.
+`python main.py` stays the single-process, auto-reloading dev server.
+"""
+import os
+import importlib.util
+import uvicorn
+from dotenv import load_dotenv
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Keep idle client connections longer than the load balancer does, or it may reuse one we just closed
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "65"))
+# Pending connections the kernel queues per listening socket before refusing new ones
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# On SIGTERM, time open requests (including streaming replies) get to finish before they are cancelled
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Restart a worker after this many requests; 0 keeps workers for the life of the server
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() == "true"
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+def check_multi_worker_config(workers):
+    """Refuse settings that only work in one process and point out ones that become per-worker."""
+    if workers <= 1:
+        return
+    if os.getenv("PENDING_STORE", "mongo") == "memory":
+        raise SystemExit("❌ PENDING_STORE=memory keeps signups in one process; use mongo or redis with several workers")
+    if not (os.getenv("JWT_SECRET_KEY") or os.getenv("JWT_SECRET")):
+        raise SystemExit("❌ JWT_SECRET_KEY is not set; each worker would sign sessions with its own random key")
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "memory":
+        print(f"⚠️ RATE_LIMIT_BACKEND=memory: each of the {workers} workers keeps its own buckets, so limits are {workers}x looser")
+    if not os.getenv("REDIS_URL"):
+        print("⚠️ No REDIS_URL: bot edits reach other workers' caches only after BOT_CACHE_TTL")
+
+def main():
+    workers = max(1, WEB_CONCURRENCY)
+    check_multi_worker_config(workers)
+    # bcrypt threads are per process; split the cores between workers instead of oversubscribing them
+    os.environ.setdefault("HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    print(f"✅ Starting {workers} workers on {HOST}:{PORT} ({loop}, {http})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEPALIVE,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        limit_max_requests=SERVER_MAX_REQUESTS or None,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        access_log=SERVER_ACCESS_LOG,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import io
+import re
+import base64
+import hashlib
+import asyncio
+import binascii
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from utils.db import get_db
+from dotenv import load_dotenv
+load_dotenv()
+
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_THUMBNAIL_SIZES = (64, 128, 256)
+AVATAR_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Magic bytes for the formats the avatar picker accepts
+_SIGNATURES = [
+    (b"\x89PNG", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+]
+
+def avatar_files():
+    return AsyncIOMotorGridFSBucket(get_db(), bucket_name="avatars")
+
+def avatar_url(avatar_hash):
+    return f"/avatars/{avatar_hash}" if avatar_hash else None
+
+def decode_avatar(avatar_base64):
+    """Decode a data URL or bare base64 string into (bytes, content_type)."""
+    header, sep, data = avatar_base64.partition(",")
+    if not sep:
+        data = avatar_base64
+    try:
+        raw = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        raise ValueError("Avatar is not valid base64")
+    if len(raw) > AVATAR_MAX_BYTES:
+        raise ValueError(f"Avatar is larger than {AVATAR_MAX_BYTES // 1024} KB")
+    for signature, content_type in _SIGNATURES:
+        if raw.startswith(signature):
+            return raw, content_type
+    # RIFF also wraps WAV and AVI; WebP names itself right after the chunk size
+    if raw.startswith(b"RIFF") and raw[8:12] == b"WEBP":
+        return raw, "image/webp"
+    raise ValueError("Avatar must be a PNG, JPEG, GIF or WebP image")
+
+async def _read(name):
+    try:
+        grid_out = await avatar_files().open_download_stream_by_name(name)
+    except NoFile:
+        return None
+    data = await grid_out.read()
+    return data, (grid_out.metadata or {}).get("content_type", "application/octet-stream")
+
+async def _exists(name):
+    db = get_db()
+    return await db["avatars.files"].find_one({"filename": name}, {"_id": 1}) is not None
+
+async def save_avatar(avatar_base64):
+    """Store an uploaded avatar once per distinct image and return its content hash."""
+    raw, content_type = decode_avatar(avatar_base64)
+    avatar_hash = hashlib.sha256(raw).hexdigest()
+    if not await _exists(avatar_hash):
+        await avatar_files().upload_from_stream(avatar_hash, raw, metadata={"content_type": content_type})
+    return avatar_hash
+
+def _make_thumbnail(raw, size):
+    """Resize to fit size x size as WebP, or return None when Pillow isn't installed
+    or can't decode the image (the header matched but the data is corrupt or truncated)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, format="WEBP", quality=85)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"⚠️ Could not thumbnail avatar, serving the original: {e}")
+        return None
+    return out.getvalue()
+
+async def load_avatar(avatar_hash, size=None):
+    """Return (bytes, content_type) for an avatar, building and storing thumbnails on first use."""
+    if not size:
+        return await _read(avatar_hash)
+
+    thumbnail_name = f"{avatar_hash}_{size}"
+    cached = await _read(thumbnail_name)
+    if cached:
+        return cached
+
+    original = await _read(avatar_hash)
+    if not original:
+        return None
+    # Image decoding is CPU-bound, keep it off the event loop
+    thumbnail = await asyncio.to_thread(_make_thumbnail, original[0], size)
+    if thumbnail is None:
+        return original
+    if not await _exists(thumbnail_name):
+        await avatar_files().upload_from_stream(thumbnail_name, thumbnail, metadata={"content_type": "image/webp"})
+    return thumbnail, "image/webp"
+
+async def migrate_inline_avatars():
+    """Move avatars still stored inline on bot documents into the avatar store."""
+    db = get_db()
+    migrated = 0
+    async for bot in db.bots.find({"avatar_base64": {"$exists": True}}, {"bot_id": 1, "avatar_base64": 1}):
+        update = {"$unset": {"avatar_base64": ""}}
+        if bot.get("avatar_base64"):
+            try:
+                update["$set"] = {"avatar_hash": await save_avatar(bot["avatar_base64"])}
+            except ValueError as e:
+                print(f"❌ Dropping unreadable avatar for bot {bot['bot_id']}: {e}")
+        await db.bots.update_one({"_id": bot["_id"]}, update)
+        migrated += 1
+    if migrated:
+        print(f"✅ Moved {migrated} inline avatars to the avatar store")
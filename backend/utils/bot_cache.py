@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from utils.db import get_db
+from utils.redis_client import get_redis
+from utils.prompts import ensure_compiled
+from dotenv import load_dotenv
+load_dotenv()
+
+BOT_CACHE_MAX_SIZE = int(os.getenv("BOT_CACHE_MAX_SIZE", "1024"))
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", "300"))
+BOT_CACHE_REDIS_TTL = int(os.getenv("BOT_CACHE_REDIS_TTL", "3600"))
+INVALIDATION_CHANNEL = "bot_cache:invalidate"
+
+# Only what the chat path needs: the compiled prompt and its inputs, plus what the conversation summary stores
+PROMPT_FIELDS = {
+    "_id": 0, "bot_id": 1, "name": 1, "personality": 1, "situation": 1, "back_story": 1,
+    "chatting_way": 1, "type_of_bot": 1, "avatar_hash": 1, "updated_at": 1,
+    "system_prompt": 1, "prompt_version": 1, "model": 1
+}
+
+_stats = {"hits": 0, "misses": 0, "redis_hits": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+class LRUCache:
+    """Size-bounded LRU with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            _stats["expirations"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+    def pop(self, key):
+        return self.entries.pop(key, None)
+
+_local = LRUCache(BOT_CACHE_MAX_SIZE, BOT_CACHE_TTL)
+
+def _key(bot_id):
+    # Bump the prefix whenever PROMPT_FIELDS changes so stale Redis entries are ignored
+    return f"bot:v3:{bot_id}"
+
+def _dumps(bot):
+    return json.dumps(bot, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+async def get_cached_bot(bot_id):
+    """Prompt-relevant bot fields via local LRU, then Redis (if configured), then Mongo."""
+    bot = _local.get(bot_id)
+    if bot is not None:
+        _stats["hits"] += 1
+        return bot
+    _stats["misses"] += 1
+
+    redis = get_redis()
+    if redis is not None:
+        try:
+            cached = await redis.get(_key(bot_id))
+        except Exception as e:
+            print(f"Bot cache Redis read failed: {e}")
+            cached = None
+        if cached:
+            _stats["redis_hits"] += 1
+            bot = json.loads(cached)
+            _local.set(bot_id, bot)
+            return bot
+
+    db = get_db()
+    bot = await db.bots.find_one({"bot_id": bot_id, "deleted_at": None}, PROMPT_FIELDS)
+    if bot is None:
+        return None
+    bot = await ensure_compiled(bot)
+    _local.set(bot_id, bot)
+    if redis is not None:
+        try:
+            await redis.set(_key(bot_id), _dumps(bot), ex=BOT_CACHE_REDIS_TTL)
+        except Exception as e:
+            print(f"Bot cache Redis write failed: {e}")
+    return bot
+
+async def invalidate_bot(bot_id):
+    """Drop a bot from every cache tier, including other workers' local caches."""
+    _local.pop(bot_id)
+    _stats["invalidations"] += 1
+    redis = get_redis()
+    if redis is not None:
+        try:
+            await redis.delete(_key(bot_id))
+            await redis.publish(INVALIDATION_CHANNEL, bot_id)
+        except Exception as e:
+            print(f"Bot cache Redis invalidation failed: {e}")
+
+async def listen_for_invalidations():
+    """Evict bots that other workers changed. Without Redis each worker relies on the TTL."""
+    redis = get_redis()
+    if redis is None:
+        return
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        _local.pop(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Bot cache invalidation listener failed, retrying: {e}")
+            await asyncio.sleep(5)
+
+def get_cache_stats():
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "size": len(_local.entries),
+        "max_size": BOT_CACHE_MAX_SIZE,
+        "ttl_seconds": BOT_CACHE_TTL,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "redis": get_redis() is not None,
+    }
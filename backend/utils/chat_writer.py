@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+from collections import Counter, defaultdict
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, PyMongoError
+from bson import json_util
+from utils.db import get_db
+from utils.conversations import conversation_update, record_conversation
+from dotenv import load_dotenv
+load_dotenv()
+
+# Write-behind for chat turns: acknowledge the request, persist in batches shortly after
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+CHAT_FLUSH_SIZE = int(os.getenv("CHAT_FLUSH_SIZE", "200"))
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", "0.05"))
+# Past this many buffered turns, writers wait for a flush instead of growing the buffer
+CHAT_BUFFER_MAX = int(os.getenv("CHAT_BUFFER_MAX", "10000"))
+CHAT_FLUSH_RETRIES = int(os.getenv("CHAT_FLUSH_RETRIES", "3"))
+# A batch that still fails goes back in the buffer and is retried with backoff up to this long
+CHAT_RETRY_MAX_DELAY = float(os.getenv("CHAT_RETRY_MAX_DELAY", "30"))
+# Write concern for buffered chat inserts: 0, 1 or majority. Summary updates stay
+# acknowledged because the popularity counter depends on their upsert results.
+CHAT_WRITE_CONCERN = os.getenv("CHAT_WRITE_CONCERN", "1")
+CHAT_FLUSH_TIMEOUT = float(os.getenv("CHAT_FLUSH_TIMEOUT", "10"))
+# Turns still unwritten when shutdown gives up are appended here, one JSON document per line
+CHAT_DEAD_LETTER_PATH = os.getenv("CHAT_DEAD_LETTER_PATH", "chat_dead_letters.jsonl")
+
+_pending = []  # (chat document, bot) in arrival order
+_pending_chats = defaultdict(int)  # chat_id -> buffered turns, for read-your-writes
+_has_items = asyncio.Event()
+_full = asyncio.Event()
+_flush_lock = asyncio.Lock()
+_flusher = None
+
+_stats = {
+    "buffered_writes": 0, "flushes": 0, "chats_written": 0, "conversation_updates": 0,
+    "coalesced_updates": 0, "retries": 0, "requeued": 0, "dead_lettered": 0, "backpressure_waits": 0,
+    "last_flush_ms": 0.0
+}
+
+def _write_concern():
+    return WriteConcern(w=int(CHAT_WRITE_CONCERN) if CHAT_WRITE_CONCERN.isdigit() else CHAT_WRITE_CONCERN)
+
+async def store_chat(chat, bot):
+    """Persist a chat turn and fold it into its conversation summary.
+
+    With CHAT_WRITE_BEHIND the turn is only buffered here and written by the
+    background flusher, so the response doesn't wait on Mongo. Turns are kept
+    and retried through a Mongo outage; a crash loses whatever is still buffered.
+    """
+    if _flusher is None:
+        db = get_db()
+        await db.chats.insert_one(chat)
+        await record_conversation(chat["user_id"], bot, chat["message"], chat["response"], chat["timestamp"])
+        return
+
+    _pending.append((chat, bot))
+    _pending_chats[f"{chat['user_id']}_{chat['bot_id']}"] += 1
+    _stats["buffered_writes"] += 1
+    _has_items.set()
+    if len(_pending) >= CHAT_FLUSH_SIZE:
+        _full.set()
+    while len(_pending) >= CHAT_BUFFER_MAX:
+        _stats["backpressure_waits"] += 1
+        if not await flush_chat_writes():
+            # Mongo is down; hold this request rather than let the buffer grow
+            await asyncio.sleep(1)
+
+async def _insert_chats(chats):
+    """insert_many with retries. _ids are assigned on the first attempt, so a retry
+    after a partial write only hits duplicate-key errors for what already landed."""
+    collection = get_db().chats.with_options(write_concern=_write_concern())
+    for attempt in range(CHAT_FLUSH_RETRIES + 1):
+        try:
+            await collection.insert_many(chats, ordered=False)
+            return True
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if errors and all(error.get("code") == 11000 for error in errors) and not e.details.get("writeConcernErrors"):
+                return True
+            print(f"❌ Chat flush failed (attempt {attempt + 1}): {e.details.get('writeErrors', e)[:1]}")
+        except PyMongoError as e:
+            print(f"❌ Chat flush failed (attempt {attempt + 1}): {e}")
+        if attempt < CHAT_FLUSH_RETRIES:
+            _stats["retries"] += 1
+            await asyncio.sleep(0.1 * 2 ** attempt)
+    return False
+
+async def _update_conversations(batch):
+    """One upsert per conversation in the batch, then one popularity bump per bot."""
+    db = get_db()
+    updates = {}  # chat_id -> (query, update, bot_id)
+    for chat, bot in batch:
+        query, update = conversation_update(chat["user_id"], bot, chat["message"], chat["response"], chat["timestamp"])
+        existing = updates.get(query["chat_id"])
+        if existing is None:
+            updates[query["chat_id"]] = (query, update, bot["bot_id"])
+            continue
+        # Later turns win the summary fields; counts add up; created_at stays the earliest
+        existing[1]["$set"] = update["$set"]
+        existing[1]["$inc"]["message_count"] += 1
+        _stats["coalesced_updates"] += 1
+
+    entries = list(updates.values())
+    result = await db.conversations.bulk_write(
+        [UpdateOne(query, update, upsert=True) for query, update, _ in entries], ordered=False
+    )
+    _stats["conversation_updates"] += len(entries)
+    new_conversations = Counter(entries[index][2] for index in result.upserted_ids)
+    if new_conversations:
+        await db.bots.bulk_write([
+            UpdateOne({"bot_id": bot_id}, {"$inc": {"chat_count": count}})
+            for bot_id, count in new_conversations.items()
+        ], ordered=False)
+
+async def _write_batch(batch):
+    """False if the turns couldn't be inserted; nothing of the batch is lost then."""
+    started = time.perf_counter()
+    if not await _insert_chats([chat for chat, _ in batch]):
+        return False
+    _stats["chats_written"] += len(batch)
+    try:
+        await _update_conversations(batch)
+    except PyMongoError as e:
+        # Not retried: $inc isn't idempotent, and summaries self-correct on the next turn
+        print(f"❌ Conversation summary flush failed: {e}")
+    _stats["flushes"] += 1
+    _stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return True
+
+async def flush_chat_writes():
+    """Write out everything buffered so far. Safe to call with write-behind off.
+
+    A batch that can't be written goes back to the front of the buffer and the
+    flush stops there; returns whether the buffer was emptied.
+    """
+    async with _flush_lock:
+        while _pending:
+            batch = _pending[:CHAT_FLUSH_SIZE]
+            del _pending[:CHAT_FLUSH_SIZE]
+            try:
+                written = await _write_batch(batch)
+            except asyncio.CancelledError:
+                # Cut off by the shutdown timeout; keep the batch for the dead-letter file
+                _pending[:0] = batch
+                raise
+            if not written:
+                _pending[:0] = batch
+                _stats["requeued"] += len(batch)
+                return False
+            for chat, _ in batch:
+                chat_id = f"{chat['user_id']}_{chat['bot_id']}"
+                _pending_chats[chat_id] -= 1
+                if _pending_chats[chat_id] <= 0:
+                    del _pending_chats[chat_id]
+        _has_items.clear()
+        _full.clear()
+        return True
+
+async def flush_chat(chat_id):
+    """Make buffered turns of one chat visible before it is read."""
+    if chat_id in _pending_chats:
+        await flush_chat_writes()
+
+async def _flush_loop():
+    delay = 1
+    while True:
+        await _has_items.wait()
+        # Give the batch CHAT_FLUSH_INTERVAL to fill up, or go as soon as it is full
+        try:
+            await asyncio.wait_for(_full.wait(), CHAT_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            flushed = await flush_chat_writes()
+        except Exception as e:
+            print(f"❌ Chat write flusher error: {e}")
+            flushed = False
+        if flushed:
+            delay = 1
+            continue
+        print(f"❌ {len(_pending)} chat turns not written, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, CHAT_RETRY_MAX_DELAY)
+
+async def _flush_until_empty():
+    delay = 1
+    while not await flush_chat_writes():
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, CHAT_RETRY_MAX_DELAY)
+
+def _dead_letter():
+    """Save what is still buffered to CHAT_DEAD_LETTER_PATH; Mongo is unreachable by now."""
+    try:
+        with open(CHAT_DEAD_LETTER_PATH, "a") as f:
+            for chat, bot in _pending:
+                f.write(json_util.dumps({"chat": chat, "bot_id": bot["bot_id"]}) + "\n")
+    except OSError as e:
+        print(f"❌ Lost {len(_pending)} chat turns, could not write {CHAT_DEAD_LETTER_PATH}: {e}")
+        return
+    _stats["dead_lettered"] += len(_pending)
+    print(f"⚠️ {len(_pending)} chat turns not flushed before shutdown, saved to {CHAT_DEAD_LETTER_PATH}")
+    _pending.clear()
+    _pending_chats.clear()
+
+def start_chat_writer():
+    global _flusher
+    if CHAT_WRITE_BEHIND and _flusher is None:
+        _flusher = asyncio.create_task(_flush_loop())
+
+async def stop_chat_writer():
+    """Stop buffering and flush what is left, bounded by CHAT_FLUSH_TIMEOUT."""
+    global _flusher
+    if _flusher is None:
+        return
+    # Taking the lock first means the flusher is never cancelled halfway through a batch
+    async with _flush_lock:
+        _flusher.cancel()
+        _flusher = None
+    try:
+        await asyncio.wait_for(_flush_until_empty(), CHAT_FLUSH_TIMEOUT)
+    except asyncio.TimeoutError:
+        _dead_letter()
+
+def get_chat_writer_stats():
+    return {
+        **_stats,
+        "write_behind": _flusher is not None,
+        "pending": len(_pending),
+        "flush_size": CHAT_FLUSH_SIZE,
+        "flush_interval_s": CHAT_FLUSH_INTERVAL,
+        "write_concern": CHAT_WRITE_CONCERN,
+    }
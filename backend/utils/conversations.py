@@ -0,0 +1,94 @@
+from utils.db import get_db
+
+def conversation_update(user_id, bot, message, response, timestamp):
+    """Upsert that folds one stored chat turn into its conversation summary."""
+    return (
+        {"chat_id": f"{user_id}_{bot['bot_id']}"},
+        {
+            "$set": {
+                "user_id": user_id,
+                "bot_id": bot["bot_id"],
+                "bot_name": bot.get("name"),
+                "bot_avatar_hash": bot.get("avatar_hash"),
+                "last_message": message or response or "",
+                "last_timestamp": timestamp
+            },
+            "$inc": {"message_count": 1},
+            "$setOnInsert": {"created_at": timestamp}
+        }
+    )
+
+async def record_conversation(user_id, bot, message, response, timestamp):
+    db = get_db()
+    query, update = conversation_update(user_id, bot, message, response, timestamp)
+    result = await db.conversations.update_one(query, update, upsert=True)
+    if result.upserted_id is not None:
+        # A new conversation makes the bot more popular in the catalogue
+        await db.bots.update_one({"bot_id": bot["bot_id"]}, {"$inc": {"chat_count": 1}})
+
+async def list_recent_conversations(user_id, limit):
+    db = get_db()
+    # deleted_at marks conversations with a bot that is being purged; cleared ones have no last_timestamp
+    cursor = db.conversations.find(
+        {"user_id": user_id, "last_timestamp": {"$ne": None}, "deleted_at": None}, {"_id": 0, "created_at": 0, "deleted_at": 0}
+    ).sort("last_timestamp", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def clear_conversation(chat_id):
+    """Empty a conversation's summary. The document stays, so the next message
+    doesn't upsert a new one and count the same user towards chat_count again."""
+    db = get_db()
+    await db.conversations.update_one(
+        {"chat_id": chat_id},
+        {"$set": {"message_count": 0}, "$unset": {"last_message": "", "last_timestamp": ""}}
+    )
+
+async def backfill_conversations():
+    """Build summaries for chats stored before the conversations collection existed.
+
+    Runs server-side in one aggregation and only when the collection is still empty.
+    """
+    db = get_db()
+    if await db.conversations.estimated_document_count() or not await db.chats.estimated_document_count():
+        return
+    print("Backfilling conversation summaries from chats...")
+    pipeline = [
+        {"$sort": {"user_id": 1, "bot_id": 1, "timestamp": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "bot_id": "$bot_id"},
+            "last_message": {"$last": {"$cond": [{"$ne": [{"$ifNull": ["$message", ""]}, ""]}, "$message", "$response"]}},
+            "last_timestamp": {"$last": "$timestamp"},
+            "created_at": {"$first": "$timestamp"},
+            "message_count": {"$sum": 1}
+        }},
+        {"$lookup": {"from": "bots", "localField": "_id.bot_id", "foreignField": "bot_id", "as": "bot"}},
+        {"$project": {
+            "_id": 0,
+            "chat_id": {"$concat": ["$_id.user_id", "_", "$_id.bot_id"]},
+            "user_id": "$_id.user_id",
+            "bot_id": "$_id.bot_id",
+            "bot_name": {"$arrayElemAt": ["$bot.name", 0]},
+            "bot_avatar_hash": {"$arrayElemAt": ["$bot.avatar_hash", 0]},
+            "last_message": 1,
+            "last_timestamp": 1,
+            "created_at": 1,
+            "message_count": 1
+        }},
+        {"$merge": {"into": "conversations", "on": "chat_id", "whenMatched": "keepExisting"}}
+    ]
+    # Raises on failure so startup retries it; $merge needs the unique chat_id index
+    await db.chats.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    print("✅ Conversation summaries backfilled")
+
+async def backfill_bot_popularity():
+    """Give bots created before chat_count existed their count of conversations."""
+    db = get_db()
+    if not await db.bots.find_one({"chat_count": {"$exists": False}}, {"_id": 1}):
+        return
+    await db.conversations.aggregate([
+        {"$group": {"_id": "$bot_id", "chat_count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "bot_id": "$_id", "chat_count": 1}},
+        {"$merge": {"into": "bots", "on": "bot_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]).to_list(length=None)
+    await db.bots.update_many({"chat_count": {"$exists": False}}, {"$set": {"chat_count": 0}})
+    print("✅ Bot popularity counters backfilled")
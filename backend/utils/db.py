@@ -0,0 +1,125 @@
+import os
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from utils.metrics import MONGO_LISTENERS, check_mongo_attribution
+from dotenv import load_dotenv
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "ai_companion")  # fallback if not in .env
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# Longest a readiness probe waits for Mongo to answer
+MONGODB_PING_TIMEOUT = float(os.getenv("MONGODB_PING_TIMEOUT", "2"))
+
+_client = None
+# Set once Mongo answers and indexes exist; startup work that needs either waits on it
+_ready = asyncio.Event()
+
+# (collection, keys, options) for every index the hot queries rely on
+INDEXES = [
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    ("bots", [("bot_id", ASCENDING)], {"unique": True}),
+    # Catalogue pages: (filter, sort key, _id) so every keyset page is an index range scan
+    ("bots", [("privacy", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ("bots", [("privacy", ASCENDING), ("chat_count", DESCENDING), ("_id", DESCENDING)], {}),
+    ("bots", [("privacy", ASCENDING), ("type_of_bot", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ("bots", [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    # Search index sync picks up recent edits by updated_at
+    ("bots", [("updated_at", ASCENDING)], {}),
+    # Covers the history keyset on (timestamp, _id) in both directions
+    ("chats", [("user_id", ASCENDING), ("bot_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], {}),
+    # Purging a deleted bot sweeps chats left without a conversation row
+    ("chats", [("bot_id", ASCENDING), ("_id", ASCENDING)], {}),
+    ("chat_memory", [("chat_id", ASCENDING)], {"unique": True}),
+    ("conversations", [("chat_id", ASCENDING)], {"unique": True}),
+    ("pending_users", [("email", ASCENDING)], {"unique": True}),
+    ("pending_users", [("expire_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("prompt_caches", [("bot_id", ASCENDING), ("prompt_version", ASCENDING)], {"unique": True}),
+    ("prompt_caches", [("expire_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("conversations", [("user_id", ASCENDING), ("last_timestamp", DESCENDING)], {}),
+    # Purging a deleted bot walks its conversations, and checks whether its avatar is still used
+    ("conversations", [("bot_id", ASCENDING)], {}),
+    ("bots", [("avatar_hash", ASCENDING)], {}),
+    ("purge_jobs", [("job_id", ASCENDING)], {"unique": True}),
+    ("purge_jobs", [("status", ASCENDING), ("run_after", ASCENDING)], {}),
+    ("purge_jobs", [("chat_id", ASCENDING), ("status", ASCENDING)], {}),
+    ("purge_jobs", [("expire_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    # Workers poll recent logouts; entries go once the refresh tokens they cover have expired
+    ("revoked_tokens", [("revoked_at", ASCENDING)], {}),
+    ("revoked_tokens", [("expire_at", ASCENDING)], {"expireAfterSeconds": 0}),
+]
+
+def _build_client():
+    return AsyncIOMotorClient(
+        MONGODB_URI,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        # Command timings and pool usage for /metrics
+        event_listeners=MONGO_LISTENERS,
+    )
+
+async def init_db():
+    """Wait for Mongo to answer, then build indexes. Runs as a background task, so the
+    server starts serving (and reports not ready) while the database is still unreachable."""
+    delay = 1
+    while not await ping_db():
+        print(f"❌ MongoDB connection failed, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
+    print("✅ MongoDB Connected Successfully!")
+    await check_mongo_attribution(lambda: _client.admin.command("ping"))
+    await ensure_indexes()
+    _ready.set()
+
+async def ping_db():
+    get_db()  # builds the client on first use
+    try:
+        await asyncio.wait_for(_client.admin.command("ping"), MONGODB_PING_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+def db_initialized():
+    return _ready.is_set()
+
+async def run_when_ready(name, task):
+    """Wait for init_db, then run `task()` until it succeeds, backing off like init_db does."""
+    await _ready.wait()
+    delay = 1
+    while True:
+        try:
+            return await task()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ {name} failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+def close_db():
+    global _client
+    _ready.clear()
+    if _client is not None:
+        _client.close()
+        _client = None
+
+def get_db():
+    """Return the application database on the shared client."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client[MONGODB_DB_NAME]
+
+async def ensure_indexes():
+    db = get_db()
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            print(f"❌ Failed to create index on {collection} {keys}: {e}")
@@ -1,27 +1,52 @@
-import base64, os
-from email.mime.text import MIMEText
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import base64
+from utils.mail_queue import enqueue_email
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
 
+_service = None
+
 def get_gmail_service():
-    creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    return build("gmail", "v1", credentials=creds)
+    """Build the Gmail service once; the authorised HTTP client refreshes the token itself."""
+    global _service
+    if _service is None:
+        # Imported here so the Google client libraries only load when mail is actually sent
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.discovery import build
+        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        _service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+    return _service
 
-def send_email(recipient, subject, body):
+def build_raw_message(recipient, subject, body):
+    from email.mime.text import MIMEText
     message = MIMEText(body)
     message["to"] = recipient
     message["subject"] = subject
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
 
+def send_email(recipient, subject, body):
     service = get_gmail_service()
-    service.users().messages().send(userId="me", body={"raw": raw}).execute()
+    service.users().messages().send(userId="me", body={"raw": build_raw_message(recipient, subject, body)}).execute()
+
+def send_email_batch(messages):
+    """Send several messages in one Gmail batch request. Returns one error (or None) per message."""
+    service = get_gmail_service()
+    errors = [None] * len(messages)
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[int(request_id)] = str(exception)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for i, message in enumerate(messages):
+        raw = build_raw_message(message["to"], message["subject"], message["body"])
+        batch.add(service.users().messages().send(userId="me", body={"raw": raw}), request_id=str(i))
+    batch.execute()
+    return errors
 
 async def send_welcome_email(to, name):
     body = f"Hi {name},\n\nWelcome to AI Companion! Your account has been created.\n\nThanks!"
-    send_email(to, "Welcome to AI Companion!", body)
+    enqueue_email(to, "Welcome to AI Companion!", body)
 
 async def send_otp_email(to, otp):
     body = f"Your OTP for password reset is: {otp}\n\nValid for 10 minutes."
-    send_email(to, "AI Companion - OTP", body)
+    enqueue_email(to, "AI Companion - OTP", body)
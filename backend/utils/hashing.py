@@ -1,9 +1,95 @@
-from passlib.context import CryptContext
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import phase, bcrypt_latency
+from dotenv import load_dotenv
+load_dotenv()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a small thread pool gives real parallelism
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to wait for a worker before new ones are rejected
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+
+# passlib and its bcrypt backend load on the first hash, not at startup
+_pwd_context = None
+_executor = None
+
+_stats = {"in_flight": 0, "completed": 0, "rejected": 0, "rehashed": 0, "total_seconds": 0.0}
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full; handlers turn it into a 503."""
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        # min_rounds marks hashes made with a lower cost factor as deprecated, so they get rehashed on login
+        _pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS
+        )
+    return _pwd_context
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+async def _run(fn, *args):
+    if _stats["in_flight"] >= HASH_WORKERS + HASH_MAX_QUEUE:
+        _stats["rejected"] += 1
+        raise HashingBusyError()
+    _stats["in_flight"] += 1
+    started = time.perf_counter()
+    try:
+        with phase("bcrypt", bcrypt_latency, fn.__name__):
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _stats["in_flight"] -= 1
+        _stats["completed"] += 1
+        _stats["total_seconds"] += time.perf_counter() - started
+
+async def hash_password_async(password: str) -> str:
+    return await _run(get_pwd_context().hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(get_pwd_context().verify, plain_password, hashed_password)
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    valid, new_hash = await _run(get_pwd_context().verify_and_update, plain_password, hashed_password)
+    if new_hash:
+        _stats["rehashed"] += 1
+    return valid, new_hash
+
+def get_hashing_stats():
+    in_flight = _stats["in_flight"]
+    completed = _stats["completed"]
+    return {
+        "workers": HASH_WORKERS,
+        "max_queue": HASH_MAX_QUEUE,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "in_progress": min(in_flight, HASH_WORKERS),
+        "queued": max(in_flight - HASH_WORKERS, 0),
+        "completed": completed,
+        "rejected": _stats["rejected"],
+        "rehashed": _stats["rehashed"],
+        "avg_ms": round(_stats["total_seconds"] / completed * 1000, 2) if completed else 0.0,
+    }
+
+def shutdown_hashing():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
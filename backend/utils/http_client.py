@@ -0,0 +1,162 @@
+import os
+import random
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
+import httpx
+from dotenv import load_dotenv
+load_dotenv()
+
+# Pool and timeout settings for outbound LLM calls
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+LLM_HTTP_POOL_TIMEOUT = float(os.getenv("LLM_HTTP_POOL_TIMEOUT", "10"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+
+# Bounded retry with full-jitter exponential backoff
+LLM_HTTP_MAX_RETRIES = int(os.getenv("LLM_HTTP_MAX_RETRIES", "2"))
+LLM_HTTP_BACKOFF_BASE = float(os.getenv("LLM_HTTP_BACKOFF_BASE", "0.25"))
+LLM_HTTP_BACKOFF_MAX = float(os.getenv("LLM_HTTP_BACKOFF_MAX", "4"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Only errors where the request can't have reached the model are retried. RemoteProtocolError
+# is left out: the provider may already be generating, and a retry would pay for a second reply
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_client = None
+_http2_enabled = False
+
+_stats = {
+    "requests": 0,
+    "in_flight": 0,
+    "queued": 0,
+    "new_connections": 0,
+    "retries": 0,
+}
+
+def _build_client():
+    global _http2_enabled
+    _http2_enabled = LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+    if LLM_HTTP2 and not _http2_enabled:
+        print("⚠️ h2 is not installed, LLM HTTP client falling back to HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=_http2_enabled,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            LLM_HTTP_TIMEOUT,
+            connect=LLM_HTTP_CONNECT_TIMEOUT,
+            pool=LLM_HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+async def init_http_client():
+    """Create the process-wide client. Called from the app lifespan."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client():
+    """Return the shared client, creating it on first use outside the lifespan."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+def get_pool_stats():
+    """Snapshot of the shared client's pool counters."""
+    sent = _stats["requests"]
+    return {
+        **_stats,
+        "reused_connections": max(sent - _stats["new_connections"], 0),
+        "max_connections": LLM_HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": LLM_HTTP_MAX_KEEPALIVE,
+        "http2": _http2_enabled,
+    }
+
+def _backoff_delay(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_HTTP_BACKOFF_MAX, LLM_HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def _make_trace():
+    """httpcore trace hook that tells queued, new and reused connections apart."""
+    state = {"waiting": True}
+    _stats["queued"] += 1
+
+    async def trace(event_name, info):
+        if event_name == "connection.connect_tcp.started":
+            _stats["new_connections"] += 1
+        elif event_name.endswith("send_request_headers.started") and state["waiting"]:
+            # A connection has been checked out of the pool for this request
+            state["waiting"] = False
+            _stats["queued"] -= 1
+            _stats["requests"] += 1
+
+    return trace, state
+
+async def _send_with_retry(method, url, stream=False, **kwargs):
+    client = get_http_client()
+    attempt = 0
+    while True:
+        request = client.build_request(method, url, **kwargs)
+        trace, state = _make_trace()
+        request.extensions["trace"] = trace
+        try:
+            response = await client.send(request, stream=stream)
+        except RETRY_EXCEPTIONS:
+            if attempt >= LLM_HTTP_MAX_RETRIES:
+                raise
+            response = None
+        finally:
+            if state["waiting"]:
+                _stats["queued"] -= 1
+
+        if response is not None and (response.status_code not in RETRY_STATUS_CODES or attempt >= LLM_HTTP_MAX_RETRIES):
+            return response
+
+        delay = _backoff_delay(attempt, response)
+        if response is not None:
+            await response.aclose()
+        attempt += 1
+        _stats["retries"] += 1
+        await asyncio.sleep(delay)
+
+async def request_with_retry(method, url, **kwargs):
+    """Send a request on the shared client, retrying 429/5xx and connect failures."""
+    _stats["in_flight"] += 1
+    try:
+        return await _send_with_retry(method, url, **kwargs)
+    finally:
+        _stats["in_flight"] -= 1
+
+@asynccontextmanager
+async def stream_with_retry(method, url, **kwargs):
+    """Like request_with_retry, but yields a streaming response that is closed on exit.
+
+    Retries only happen before the first byte of the body is read.
+    """
+    _stats["in_flight"] += 1
+    try:
+        response = await _send_with_retry(method, url, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+    finally:
+        _stats["in_flight"] -= 1
@@ -1,35 +1,162 @@
 import os
-import httpx
+import time
+from datetime import datetime, timedelta, timezone
+from utils.db import get_db
+from utils.http_client import request_with_retry
+from utils import llm_providers
+from utils.llm_providers import LLMRequest, GEMINI_API_BASE, GEMINI_MODEL
+from utils.memory import load_context, record_turn, estimate_tokens
+from utils.prompts import prompt_version, to_contents
+from utils import response_cache
 from dotenv import load_dotenv
 load_dotenv()
 
-async def chat_with_bot(bot, user_message, chat_id):
-    prompt = f"""
-        You are an AI bot named {bot['name']} with the following details:
-        Personality: {bot['personality']}
-        Situation: {bot['situation']}
-        Backstory: {bot['back_story']}
-        Chatting Style: {bot['chatting_way']}
-        Your role is like a {bot['type_of_bot']}.
+# Gemini explicit context caching for long personas. The API rejects caches below a
+# model-specific minimum size, so shorter personas are sent as a plain system instruction.
+PROMPT_CONTEXT_CACHE = os.getenv("PROMPT_CONTEXT_CACHE", "false").lower() == "true"
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "4096"))
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "3600"))
+
+# (bot_id, prompt_version) -> (cachedContent name, expiry as epoch seconds)
+_context_caches = {}
+
+_usage_stats = {"turns": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+
+def _add_to_totals(usage):
+    if not usage:
+        return
+    _usage_stats["turns"] += 1
+    for key in ("prompt_tokens", "cached_tokens", "output_tokens"):
+        _usage_stats[key] += usage.get(key, 0)
+
+def get_usage_stats():
+    turns = _usage_stats["turns"]
+    return {
+        **_usage_stats,
+        "avg_prompt_tokens": round(_usage_stats["prompt_tokens"] / turns, 1) if turns else 0.0,
+        "cached_ratio": round(_usage_stats["cached_tokens"] / _usage_stats["prompt_tokens"], 4) if _usage_stats["prompt_tokens"] else 0.0,
+        "context_cache_enabled": PROMPT_CONTEXT_CACHE,
+    }
+
+async def get_context_cache(bot):
+    """Return a Gemini cachedContent name holding the bot's persona, creating it if needed."""
+    system_prompt = bot.get("system_prompt")
+    if not PROMPT_CONTEXT_CACHE or not system_prompt or estimate_tokens(system_prompt) < PROMPT_CACHE_MIN_TOKENS:
+        return None
+    # Handles are created for the default Gemini model; other providers get the plain system prompt
+    if "gemini" not in llm_providers.LLM_PROVIDERS:
+        return None
+
+    key = (bot["bot_id"], prompt_version(bot))
+    cached = _context_caches.get(key)
+    # Leave a minute of headroom so a handle never expires mid-request
+    if cached and cached[1] > time.time() + 60:
+        return cached[0]
+
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    stored = await db.prompt_caches.find_one({
+        "bot_id": key[0],
+        "prompt_version": key[1],
+        "expire_at": {"$gt": now + timedelta(seconds=60)}
+    })
+    if stored:
+        expire_at = stored["expire_at"].replace(tzinfo=timezone.utc)
+        _context_caches[key] = (stored["name"], expire_at.timestamp())
+        return stored["name"]
 
-        Respond naturally, casually, like a human texting, with short one-line replies — no long paragraphs, no formal tone, just chill and real.
+    try:
+        res = await request_with_retry(
+            "POST",
+            f"{GEMINI_API_BASE}/cachedContents",
+            params={"key": os.getenv("GOOGLE_API_KEY")},
+            json={
+                "model": f"models/{GEMINI_MODEL}",
+                "systemInstruction": {"parts": [{"text": system_prompt}]},
+                "ttl": f"{PROMPT_CACHE_TTL}s"
+            }
+        )
+        res.raise_for_status()
+        name = res.json()["name"]
+    except Exception as e:
+        print(f"Context cache creation failed for bot {key[0]}: {str(e)}")
+        return None
 
-        Start the chat from the perspective of {bot['name']} and continue accordingly.
+    expire_at = now + timedelta(seconds=PROMPT_CACHE_TTL)
+    await db.prompt_caches.update_one(
+        {"bot_id": key[0], "prompt_version": key[1]},
+        {"$set": {"name": name, "expire_at": expire_at}},
+        upsert=True
+    )
+    _context_caches[key] = (name, expire_at.timestamp())
+    return name
 
-        User: {user_message}
-        AI:
+async def build_request(bot, user_message, context):
+    """Prompt with the compiled persona, plus a Gemini cached-context handle when one exists."""
+    return LLMRequest(
+        bot["system_prompt"],
+        to_contents(context, user_message),
+        cached_content=await get_context_cache(bot),
+        cache_model=GEMINI_MODEL
+    )
+
+async def embed_text(text):
+    """Embedding vector for text, used by the semantic response cache."""
+    return await llm_providers.embed(text)
+
+async def generate_text(prompt):
+    return await llm_providers.generate(LLMRequest(None, [{"role": "user", "parts": [{"text": prompt}]}]))
+
+async def summarize_turns(summary, turns):
+    """Fold older turns into the rolling conversation summary."""
+    transcript = "\n".join(f"User: {t['user']}\nAI: {t['bot']}" for t in turns)
+    prompt = f"""
+        Update the running summary of a chat between a user and an AI companion.
+        Keep names, facts about the user, promises and open threads. Reply with the summary only, under 150 words.
+
+        Current summary: {summary or "(none)"}
+
+        New messages:
+        {transcript}
     """
+    return (await generate_text(prompt)).strip()
 
-    api_key = os.getenv("GOOGLE_API_KEY")
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+async def chat_with_bot(bot, user_message, chat_id, usage=None):
+    """Reply to one user message. Token counts for the turn are written into `usage` if given."""
+    usage = {} if usage is None else usage
+    context = await load_context(chat_id)
+    probe = await response_cache.lookup(bot, context, user_message, embed_text)
+    if probe and probe.reply is not None:
+        usage["cached_response"] = True
+        reply = probe.reply
+    else:
+        request = await build_request(bot, user_message, context)
+        reply = await llm_providers.generate(request, usage, admission_key=chat_id, model=bot.get("model"))
+        _add_to_totals(usage)
+        response_cache.store(probe, reply)
+    await record_turn(chat_id, user_message, reply, summarize_turns)
+    return reply
 
-    headers = {"Content-Type": "application/json"}
-    params = {"key": api_key}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}]
-    }
+async def stream_chat_with_bot(bot, user_message, chat_id, usage=None):
+    """Yield reply text from the provider's streaming endpoint as each chunk arrives."""
+    usage = {} if usage is None else usage
+    context = await load_context(chat_id)
+    probe = await response_cache.lookup(bot, context, user_message, embed_text)
+    if probe and probe.reply is not None:
+        usage["cached_response"] = True
+        yield probe.reply
+        await record_turn(chat_id, user_message, probe.reply, summarize_turns)
+        return
+    request = await build_request(bot, user_message, context)
+
+    chunks = []
+    # Closing this generator (including on client disconnect) closes the upstream stream
+    async for text in llm_providers.stream(request, usage, admission_key=chat_id, model=bot.get("model")):
+        chunks.append(text)
+        yield text
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(url, headers=headers, params=params, json=payload)
-        data = res.json()
-        return data['candidates'][0]['content']['parts'][0]['text']
+    _add_to_totals(usage)
+    reply = "".join(chunks)
+    response_cache.store(probe, reply)
+    # Only completed replies make it into memory
+    await record_turn(chat_id, user_message, reply, summarize_turns)
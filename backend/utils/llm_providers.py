@@ -0,0 +1,410 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+import httpx
+from utils.http_client import request_with_retry, stream_with_retry
+from utils.rate_limit import llm_admission
+from utils.metrics import phase, add_phase, llm_latency, llm_first_token
+from dotenv import load_dotenv
+load_dotenv()
+
+# Providers tried in order; later ones are the fallback chain (and hedge targets)
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "gemini").split(",") if name.strip()]
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL", "text-embedding-004")
+# Any OpenAI-compatible chat completions API (OpenAI, vLLM, Ollama, ...)
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+# mock_llm_server.py, for running and load-testing without a network
+MOCK_LLM_URL = os.getenv("MOCK_LLM_URL", "http://127.0.0.1:8001/v1beta")
+
+# Hedging: if the first provider hasn't answered (or sent its first token) within
+# its recent p95 latency, the next provider in the chain is raced against it
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))          # used until enough samples exist
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+class LLMError(Exception):
+    """The provider answered, but with an error or without a usable reply."""
+
+class LLMRequest:
+    """Provider-neutral prompt: system text plus Gemini-style user/model contents."""
+
+    def __init__(self, system, contents, cached_content=None, cache_model=None):
+        self.system = system
+        self.contents = contents
+        # Gemini cachedContent handle; only valid for the model it was created for
+        self.cached_content = cached_content
+        self.cache_model = cache_model
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _error_message(res):
+    try:
+        error = res.json().get("error")
+    except ValueError:
+        error = None
+    if isinstance(error, dict):
+        return error.get("message") or str(error)
+    return error or res.text[:200]
+
+class Provider:
+    """Shared bookkeeping; subclasses implement generate, stream and embed for one protocol."""
+
+    def __init__(self, name, base_url, api_key, model):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.latencies = deque(maxlen=LATENCY_WINDOW)        # full replies
+        self.first_tokens = deque(maxlen=LATENCY_WINDOW)     # time to first streamed token
+        self.stats = {"requests": 0, "errors": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0}
+
+    def hedge_delay(self, streaming):
+        samples = self.first_tokens if streaming else self.latencies
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, _percentile(samples, 0.95))
+
+    def describe(self):
+        def ms(samples, q):
+            return round(_percentile(samples, q) * 1000, 1) if samples else None
+        return {
+            **self.stats,
+            "model": self.model,
+            "p50_ms": ms(self.latencies, 0.5),
+            "p95_ms": ms(self.latencies, 0.95),
+            "ttft_p50_ms": ms(self.first_tokens, 0.5),
+            "ttft_p95_ms": ms(self.first_tokens, 0.95),
+        }
+
+class GeminiProvider(Provider):
+    """Gemini generateContent / streamGenerateContent (also spoken by mock_llm_server.py)."""
+
+    def _payload(self, request, model):
+        payload = {"contents": request.contents}
+        if request.cached_content and request.cache_model == model:
+            payload["cachedContent"] = request.cached_content
+        elif request.system:
+            payload["systemInstruction"] = {"parts": [{"text": request.system}]}
+        return payload
+
+    def _parse(self, data, usage):
+        """Text of the first candidate; error payloads and blocked prompts raise LLMError."""
+        if "error" in data:
+            raise LLMError(f"{self.name}: {data['error'].get('message', data['error'])}")
+        metadata = data.get("usageMetadata")
+        if metadata:
+            usage.update({
+                "prompt_tokens": metadata.get("promptTokenCount", 0),
+                "cached_tokens": metadata.get("cachedContentTokenCount", 0),
+                "output_tokens": metadata.get("candidatesTokenCount", 0),
+            })
+        candidates = data.get("candidates")
+        if not candidates:
+            reason = data.get("promptFeedback", {}).get("blockReason")
+            if reason:
+                raise LLMError(f"{self.name}: prompt blocked ({reason})")
+            return ""
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def generate(self, request, model, usage):
+        res = await request_with_retry(
+            "POST", f"{self.base_url}/models/{model}:generateContent",
+            params={"key": self.api_key}, json=self._payload(request, model)
+        )
+        if res.status_code >= 400:
+            raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+        text = self._parse(res.json(), usage)
+        if not text:
+            raise LLMError(f"{self.name}: empty reply")
+        return text
+
+    async def stream(self, request, model, usage):
+        async with stream_with_retry(
+            "POST", f"{self.base_url}/models/{model}:streamGenerateContent",
+            params={"key": self.api_key, "alt": "sse"}, json=self._payload(request, model)
+        ) as res:
+            if res.status_code >= 400:
+                await res.aread()
+                raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+            async for line in res.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                # Usage arrives on the final chunks; the last one has the totals
+                text = self._parse(json.loads(line[len("data:"):]), usage)
+                if text:
+                    yield text
+
+    async def embed(self, text):
+        res = await request_with_retry(
+            "POST", f"{self.base_url}/models/{GEMINI_EMBED_MODEL}:embedContent",
+            params={"key": self.api_key}, json={"content": {"parts": [{"text": text}]}}
+        )
+        if res.status_code >= 400:
+            raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+        return res.json()["embedding"]["values"]
+
+class OpenAIProvider(Provider):
+    """OpenAI-compatible /chat/completions."""
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def _payload(self, request, model):
+        messages = [{"role": "system", "content": request.system}] if request.system else []
+        for content in request.contents:
+            messages.append({
+                "role": "assistant" if content.get("role") == "model" else "user",
+                "content": "".join(part.get("text", "") for part in content.get("parts", []))
+            })
+        return {"model": model, "messages": messages}
+
+    def _record_usage(self, data, usage):
+        metadata = data.get("usage")
+        if metadata:
+            usage.update({
+                "prompt_tokens": metadata.get("prompt_tokens", 0),
+                "cached_tokens": (metadata.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                "output_tokens": metadata.get("completion_tokens", 0),
+            })
+
+    async def generate(self, request, model, usage):
+        res = await request_with_retry(
+            "POST", f"{self.base_url}/chat/completions",
+            headers=self._headers(), json=self._payload(request, model)
+        )
+        if res.status_code >= 400:
+            raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+        data = res.json()
+        self._record_usage(data, usage)
+        choices = data.get("choices")
+        text = choices[0].get("message", {}).get("content") if choices else None
+        if not text:
+            raise LLMError(f"{self.name}: empty reply")
+        return text
+
+    async def stream(self, request, model, usage):
+        payload = {**self._payload(request, model), "stream": True, "stream_options": {"include_usage": True}}
+        async with stream_with_retry("POST", f"{self.base_url}/chat/completions", headers=self._headers(), json=payload) as res:
+            if res.status_code >= 400:
+                await res.aread()
+                raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+            async for line in res.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                line = line[len("data:"):].strip()
+                if line == "[DONE]":
+                    break
+                data = json.loads(line)
+                self._record_usage(data, usage)
+                for choice in data.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+
+    async def embed(self, text):
+        res = await request_with_retry(
+            "POST", f"{self.base_url}/embeddings",
+            headers=self._headers(), json={"model": OPENAI_EMBED_MODEL, "input": text}
+        )
+        if res.status_code >= 400:
+            raise LLMError(f"{self.name} returned {res.status_code}: {_error_message(res)}")
+        return res.json()["data"][0]["embedding"]
+
+PROVIDERS = {
+    "gemini": GeminiProvider("gemini", GEMINI_API_BASE, os.getenv("GOOGLE_API_KEY"), GEMINI_MODEL),
+    "openai": OpenAIProvider("openai", OPENAI_API_BASE, os.getenv("OPENAI_API_KEY"), OPENAI_MODEL),
+    "mock": GeminiProvider("mock", MOCK_LLM_URL, "mock", "mock"),
+}
+
+for _name in LLM_PROVIDERS:
+    if _name not in PROVIDERS:
+        raise RuntimeError(f"Unknown LLM provider {_name!r} in LLM_PROVIDERS; expected one of {sorted(PROVIDERS)}")
+
+def parse_model_spec(spec):
+    """Split a bot's model setting ("openai", "gemini:gemini-2.5-flash") into (provider, model)."""
+    name, _, model = (spec or "").strip().partition(":")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown model provider {name!r}; expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name], model or PROVIDERS[name].model
+
+def resolve_chain(spec=None):
+    """(provider, model) pairs to try in order: the bot's own model first, then the defaults."""
+    chain = [(PROVIDERS[name], PROVIDERS[name].model) for name in LLM_PROVIDERS]
+    if spec:
+        try:
+            preferred = parse_model_spec(spec)
+        except ValueError as e:
+            print(f"⚠️ Ignoring bot model setting: {e}")
+        else:
+            chain = [preferred] + [entry for entry in chain if entry != preferred]
+    return chain
+
+async def _generate_once(entry, request, admission_key):
+    """One upstream call; returns (text, usage) with usage naming who answered."""
+    provider, model = entry
+    usage = {"provider": provider.name, "model": model}
+    provider.stats["requests"] += 1
+    started = time.perf_counter()
+    try:
+        async with llm_admission.slot(admission_key):
+            text = await provider.generate(request, model, usage)
+    except (LLMError, httpx.HTTPError):
+        provider.stats["errors"] += 1
+        raise
+    elapsed = time.perf_counter() - started
+    provider.latencies.append(elapsed)
+    llm_latency.observe(elapsed, provider.name)
+    return text, usage
+
+class _OpenStream:
+    """A provider stream that has produced its first chunk and still holds its upstream slot."""
+
+    def __init__(self, entry, request, admission_key):
+        self.entry = entry
+        self.usage = {"provider": entry[0].name, "model": entry[1]}
+        self.chunks = self._run(request, admission_key)
+        self.first = None
+        self.started = None
+
+    async def _run(self, request, admission_key):
+        provider, model = self.entry
+        async with llm_admission.slot(admission_key):
+            async for text in provider.stream(request, model, self.usage):
+                yield text
+
+    async def start(self):
+        """Wait for the first chunk, recording time to first token."""
+        provider = self.entry[0]
+        provider.stats["requests"] += 1
+        self.started = time.perf_counter()
+        try:
+            self.first = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            provider.stats["errors"] += 1
+            raise LLMError(f"{provider.name}: empty reply")
+        except (LLMError, httpx.HTTPError):
+            provider.stats["errors"] += 1
+            raise
+        elapsed = time.perf_counter() - self.started
+        provider.first_tokens.append(elapsed)
+        llm_first_token.observe(elapsed, provider.name)
+        return self
+
+async def _race(primary, backup, start, streaming, tried):
+    """Run start(primary); if it runs past primary's p95, race start(backup) against it.
+
+    The first success wins and the other attempt is cancelled. Streams that
+    lose after already opening are closed so their upstream slot is freed.
+    """
+    first = asyncio.create_task(start(primary))
+    started = [first]
+    pending = {first}
+    winner = None
+    try:
+        done, _ = await asyncio.wait(pending, timeout=primary[0].hedge_delay(streaming))
+        if not done:
+            primary[0].stats["hedges"] += 1
+            tried.append(backup)
+            started.append(asyncio.create_task(start(backup)))
+            pending.add(started[-1])
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    if task is not first:
+                        backup[0].stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        losers = [task for task in started if task is not winner]
+        for task in losers:
+            task.cancel()
+        if streaming:
+            for result in await asyncio.gather(*losers, return_exceptions=True):
+                if isinstance(result, _OpenStream):
+                    await result.chunks.aclose()
+
+async def _first_success(chain, start, streaming):
+    """Walk the chain until an attempt succeeds, hedging each step with the next entry."""
+    chain = deque(chain)
+    error = None
+    while chain:
+        entry = chain.popleft()
+        tried = []
+        try:
+            if LLM_HEDGE and chain:
+                return await _race(entry, chain[0], start, streaming, tried)
+            return await start(entry)
+        except (LLMError, httpx.HTTPError) as e:
+            error = e
+            print(f"❌ LLM provider {entry[0].name} failed: {e}")
+            if tried:
+                chain.popleft()
+            if chain:
+                entry[0].stats["fallbacks"] += 1
+    raise error
+
+async def generate(request, usage=None, admission_key="background", model=None):
+    """Non-streaming reply from the first provider in the chain that gives one."""
+    with phase("llm"):
+        text, call_usage = await _first_success(
+            resolve_chain(model), lambda entry: _generate_once(entry, request, admission_key), False
+        )
+    if usage is not None:
+        usage.update(call_usage)
+    return text
+
+async def stream(request, usage=None, admission_key="background", model=None):
+    """Yield reply text from the first provider that starts streaming.
+
+    Fallback and hedging only happen before the first token; after that the
+    reply is committed to one provider.
+    """
+    started = time.perf_counter()
+    opened = await _first_success(
+        resolve_chain(model), lambda entry: _OpenStream(entry, request, admission_key).start(), True
+    )
+    add_phase("llm_ttft", time.perf_counter() - started)
+    try:
+        yield opened.first
+        async for text in opened.chunks:
+            yield text
+    finally:
+        await opened.chunks.aclose()
+        add_phase("llm", time.perf_counter() - started)
+    elapsed = time.perf_counter() - opened.started
+    opened.entry[0].latencies.append(elapsed)
+    llm_latency.observe(elapsed, opened.entry[0].name)
+    if usage is not None:
+        usage.update(opened.usage)
+
+async def embed(text):
+    """Embedding from the first default provider."""
+    provider = PROVIDERS[LLM_PROVIDERS[0]]
+    async with llm_admission.slot("embedding"):
+        return await provider.embed(text)
+
+def get_provider_stats():
+    return {
+        "chain": LLM_PROVIDERS,
+        "hedging": LLM_HEDGE,
+        "providers": {
+            name: provider.describe() for name, provider in PROVIDERS.items()
+            if name in LLM_PROVIDERS or provider.stats["requests"]
+        },
+    }
@@ -0,0 +1,194 @@
+import os
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+from utils.db import get_db
+from utils.metrics import email_latency
+from dotenv import load_dotenv
+load_dotenv()
+
+# gmail | smtp | file
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "gmail")
+MAIL_QUEUE_MAX = int(os.getenv("MAIL_QUEUE_MAX", "1000"))
+# Messages are collected for up to MAIL_BATCH_WINDOW seconds into batches of MAIL_BATCH_SIZE
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_BATCH_WINDOW = float(os.getenv("MAIL_BATCH_WINDOW", "0.25"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", "2"))
+MAIL_DRAIN_TIMEOUT = float(os.getenv("MAIL_DRAIN_TIMEOUT", "10"))
+MAIL_OUTBOX_DIR = os.getenv("MAIL_OUTBOX_DIR", "outbox")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_SENDER = os.getenv("SMTP_SENDER", "no-reply@aicompanion.local")
+
+class MailQueueFullError(Exception):
+    """Raised when too many emails are waiting to be sent."""
+
+class GmailTransport:
+    async def send_batch(self, messages):
+        from utils.gmail_utils import send_email_batch
+        # The Google client is blocking, so batches run in a worker thread
+        return await asyncio.to_thread(send_email_batch, messages)
+
+class SmtpTransport:
+    """Plain SMTP, e.g. a local debugging server, over one connection per batch."""
+
+    def _send(self, messages):
+        # smtplib and email are slow to import and most deployments never use this transport
+        import smtplib
+        from email.mime.text import MIMEText
+        errors = []
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as smtp:
+            for message in messages:
+                mime = MIMEText(message["body"])
+                mime["to"] = message["to"]
+                mime["from"] = SMTP_SENDER
+                mime["subject"] = message["subject"]
+                try:
+                    smtp.sendmail(SMTP_SENDER, [message["to"]], mime.as_string())
+                    errors.append(None)
+                except smtplib.SMTPException as e:
+                    errors.append(str(e))
+        return errors
+
+    async def send_batch(self, messages):
+        return await asyncio.to_thread(self._send, messages)
+
+class FileTransport:
+    """Writes each message to MAIL_OUTBOX_DIR instead of sending it; for local runs and tests."""
+
+    def _send(self, messages):
+        os.makedirs(MAIL_OUTBOX_DIR, exist_ok=True)
+        for message in messages:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            path = os.path.join(MAIL_OUTBOX_DIR, f"{stamp}_{message['to']}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"To: {message['to']}\nSubject: {message['subject']}\n\n{message['body']}\n")
+        return [None] * len(messages)
+
+    async def send_batch(self, messages):
+        return await asyncio.to_thread(self._send, messages)
+
+TRANSPORTS = {"gmail": GmailTransport, "smtp": SmtpTransport, "file": FileTransport}
+
+_transport = None
+_queue = None
+_dispatcher = None
+_retries = {}  # retry task -> message
+
+_stats = {"enqueued": 0, "sent": 0, "failed_attempts": 0, "retried": 0, "dead_lettered": 0, "batches": 0}
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = TRANSPORTS[MAIL_TRANSPORT]()
+    return _transport
+
+def set_transport(transport):
+    """Swap the transport, e.g. for a FileTransport or a stub in tests."""
+    global _transport
+    _transport = transport
+
+def _get_queue():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=MAIL_QUEUE_MAX)
+    return _queue
+
+def enqueue_email(to, subject, body):
+    """Queue an email for background delivery. Never blocks the caller."""
+    try:
+        _get_queue().put_nowait({"to": to, "subject": subject, "body": body, "attempts": 0})
+    except asyncio.QueueFull:
+        raise MailQueueFullError()
+    _stats["enqueued"] += 1
+
+async def _dead_letter(message, error):
+    _stats["dead_lettered"] += 1
+    print(f"❌ Giving up on email to {message['to']}: {error}")
+    try:
+        db = get_db()
+        await db.mail_dead_letters.insert_one({**message, "error": error, "failed_at": datetime.now(timezone.utc)})
+    except Exception as e:
+        print(f"❌ Failed to record dead letter: {e}")
+
+async def _retry_later(message, delay):
+    await asyncio.sleep(delay)
+    _stats["retried"] += 1
+    await _get_queue().put(message)
+
+async def _send(batch):
+    _stats["batches"] += 1
+    transport = get_transport()
+    started = time.perf_counter()
+    try:
+        errors = await transport.send_batch(batch)
+    except Exception as e:
+        errors = [str(e)] * len(batch)
+    email_latency.observe(time.perf_counter() - started, type(transport).__name__)
+
+    for message, error in zip(batch, errors):
+        if error is None:
+            _stats["sent"] += 1
+            continue
+        _stats["failed_attempts"] += 1
+        message["attempts"] += 1
+        if message["attempts"] >= MAIL_MAX_ATTEMPTS:
+            await _dead_letter(message, error)
+            continue
+        delay = MAIL_BACKOFF_BASE ** message["attempts"] * random.uniform(0.5, 1.5)
+        task = asyncio.create_task(_retry_later(message, delay))
+        _retries[task] = message
+        task.add_done_callback(lambda t: _retries.pop(t, None))
+
+async def _dispatch_loop():
+    queue = _get_queue()
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + MAIL_BATCH_WINDOW
+        while len(batch) < MAIL_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await _send(batch)
+        finally:
+            for _ in batch:
+                queue.task_done()
+
+def start_mail_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = asyncio.create_task(_dispatch_loop())
+
+async def stop_mail_dispatcher():
+    """Flush queued mail (bounded by MAIL_DRAIN_TIMEOUT) and dead-letter what can't be sent."""
+    global _dispatcher
+    if _dispatcher is None:
+        return
+    try:
+        await asyncio.wait_for(_get_queue().join(), MAIL_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("⚠️ Mail queue not drained before shutdown")
+    _dispatcher.cancel()
+    _dispatcher = None
+    pending = list(_retries.items())
+    for task, message in pending:
+        task.cancel()
+        await _dead_letter(message, "shutdown before retry")
+    while not _get_queue().empty():
+        await _dead_letter(_get_queue().get_nowait(), "shutdown before send")
+
+def get_mail_stats():
+    return {
+        **_stats,
+        "queued": _get_queue().qsize(),
+        "waiting_retry": len(_retries),
+        "transport": type(get_transport()).__name__,
+    }
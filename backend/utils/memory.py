@@ -0,0 +1,141 @@
+import os
+import asyncio
+import weakref
+from datetime import datetime, timezone
+from utils.db import get_db
+from utils.purge import hidden_before
+from dotenv import load_dotenv
+load_dotenv()
+
+# Recent turns kept verbatim in the prompt, bounded by count and by estimated tokens
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "12"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+# Evicted turns are folded into the rolling summary once this many have piled up
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", "4"))
+MEMORY_SUMMARY_MAX_CHARS = int(os.getenv("MEMORY_SUMMARY_MAX_CHARS", "2000"))
+
+# One lock per live chat so concurrent turns don't overwrite each other's window
+_locks = weakref.WeakValueDictionary()
+_background_tasks = set()
+_folding = set()
+
+def _get_lock(chat_id):
+    lock = _locks.get(chat_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks[chat_id] = lock
+    return lock
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) for budgeting."""
+    return len(text or "") // 4 + 1
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn["user"]) + estimate_tokens(turn["bot"])
+
+def _trim_window(turns):
+    """Split turns into (kept, evicted) so the kept window fits the turn and token budget."""
+    kept = list(turns)
+    evicted = []
+    total = sum(_turn_tokens(t) for t in kept)
+    while kept and (len(kept) > MEMORY_MAX_TURNS or total > MEMORY_TOKEN_BUDGET):
+        turn = kept.pop(0)
+        total -= _turn_tokens(turn)
+        evicted.append(turn)
+    return kept, evicted
+
+async def _bootstrap(chat_id, user_id, bot_id):
+    """Seed memory for chats that predate it from the latest stored turns (bounded read)."""
+    db = get_db()
+    turns = []
+    query = {"user_id": user_id, "bot_id": bot_id}
+    # A restart clears memory right away, but its turns stay in chats until the purge job removes them
+    cutoff = await hidden_before(chat_id)
+    if cutoff:
+        query["timestamp"] = {"$gt": cutoff}
+    cursor = db.chats.find(
+        query,
+        {"message": 1, "response": 1, "_id": 0}
+    ).sort("timestamp", -1).limit(MEMORY_MAX_TURNS)
+    async for doc in cursor:
+        turns.append({"user": doc.get("message") or "", "bot": doc.get("response") or ""})
+    turns.reverse()
+    kept, _ = _trim_window(turns)
+    return {"chat_id": chat_id, "summary": "", "turns": kept, "overflow": []}
+
+async def load_context(chat_id):
+    """Return the rolling summary and recent turns for a chat with a single read."""
+    db = get_db()
+    memory = await db.chat_memory.find_one({"chat_id": chat_id}, {"_id": 0, "summary": 1, "turns": 1})
+    if memory is None:
+        user_id, _, bot_id = chat_id.partition("_")
+        memory = await _bootstrap(chat_id, user_id, bot_id)
+    return {"summary": memory.get("summary", ""), "turns": memory.get("turns", [])}
+
+async def record_turn(chat_id, user_message, bot_reply, summarize):
+    """Append a turn to the window and fold evicted turns into the summary.
+
+    `summarize(summary, turns)` returns the updated summary text. It only runs
+    once MEMORY_FOLD_BATCH turns have been evicted and is done in the background.
+    """
+    db = get_db()
+    async with _get_lock(chat_id):
+        memory = await db.chat_memory.find_one({"chat_id": chat_id})
+        if memory is None:
+            user_id, _, bot_id = chat_id.partition("_")
+            memory = await _bootstrap(chat_id, user_id, bot_id)
+
+        turns = memory.get("turns", []) + [{"user": user_message or "", "bot": bot_reply or ""}]
+        kept, evicted = _trim_window(turns)
+        # If summarising keeps failing, drop the oldest overflow rather than grow forever
+        overflow = (memory.get("overflow", []) + evicted)[-MEMORY_FOLD_BATCH * 4:]
+
+        await db.chat_memory.update_one(
+            {"chat_id": chat_id},
+            {
+                "$set": {
+                    "turns": kept,
+                    "overflow": overflow,
+                    "updated_at": datetime.now(timezone.utc)
+                },
+                "$setOnInsert": {"summary": ""}
+            },
+            upsert=True
+        )
+
+    if len(overflow) >= MEMORY_FOLD_BATCH:
+        task = asyncio.create_task(_fold(chat_id, summarize))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+async def _fold(chat_id, summarize):
+    # The summary call runs outside the chat lock so it never delays the next turn
+    if chat_id in _folding:
+        return
+    _folding.add(chat_id)
+    try:
+        db = get_db()
+        memory = await db.chat_memory.find_one({"chat_id": chat_id})
+        if not memory or not memory.get("overflow"):
+            return
+        overflow = memory["overflow"]
+        try:
+            summary = await summarize(memory.get("summary", ""), overflow)
+        except Exception as e:
+            # Keep the overflow so the next fold retries it
+            print(f"Error folding memory for chat_id {chat_id}: {str(e)}")
+            return
+        async with _get_lock(chat_id):
+            await db.chat_memory.update_one(
+                {"chat_id": chat_id},
+                {
+                    "$set": {"summary": summary[:MEMORY_SUMMARY_MAX_CHARS]},
+                    "$pull": {"overflow": {"$in": overflow}}
+                }
+            )
+    finally:
+        _folding.discard(chat_id)
+
+async def clear_context(chat_id):
+    db = get_db()
+    await db.chat_memory.delete_one({"chat_id": chat_id})
@@ -0,0 +1,319 @@
+import os
+import time
+import asyncio
+import secrets
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from pymongo import monitoring
+from fastapi import HTTPException, Request
+from dotenv import load_dotenv
+load_dotenv()
+
+# Requests slower than this get their phase breakdown printed
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+# Optional OpenTelemetry spans; needs opentelemetry-api (and an SDK/exporter to ship them)
+OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() == "true"
+# Bearer token for /metrics and /stats/*; without one they only answer requests from this host
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# Time spent inside a request is broken out into these phases. Email isn't one:
+# requests only enqueue mail, delivery time is in email_batch_duration_seconds
+PHASES = ("mongo", "llm_ttft", "llm", "bcrypt")
+
+_tracer = None
+if OTEL_TRACING:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("ai-companion")
+    except ImportError:
+        print("⚠️ OTEL_TRACING is set but opentelemetry-api is not installed")
+
+# Phase timings of the request being served
+_request_phases = contextvars.ContextVar("request_phases", default=None)
+# Mongo command events fire on driver threads. started() looks up the request, which only works
+# where the driver runs the command in the caller's context (Motor's executor copies it); the
+# matching succeeded()/failed() is charged by request id from here, whatever thread it lands on
+_mongo_pending = {}
+# Listeners write metrics from driver threads while the event loop writes and renders them
+_lock = threading.Lock()
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}  # label values -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, value, *label_values):
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            snapshot = [(label_values, (list(counts), total, count)) for label_values, (counts, total, count) in self.series.items()]
+        for label_values, (counts, total, count) in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _labels((*self.labels, "le"), (*label_values, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+http_phase = Histogram("http_request_phase_seconds", "Time spent per phase within a request", ("route", "phase"))
+http_response_size = Histogram("http_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS)
+mongo_commands = Histogram("mongo_command_duration_seconds", "MongoDB command latency", ("command",))
+llm_latency = Histogram("llm_request_duration_seconds", "Upstream LLM call latency (full reply)", ("provider",))
+llm_first_token = Histogram("llm_time_to_first_token_seconds", "Upstream LLM time to first streamed token", ("provider",))
+bcrypt_latency = Histogram("bcrypt_duration_seconds", "Password hash/verify time including queueing", ("operation",))
+email_latency = Histogram("email_batch_duration_seconds", "Time to hand a batch of emails to the transport", ("transport",))
+loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop ran a timer; time it was blocked")
+
+_pool = {"open": 0, "checked_out": 0}
+mongo_pool_open = Gauge("mongo_pool_connections", "Open MongoDB connections", lambda: _pool["open"])
+mongo_pool_in_use = Gauge("mongo_pool_checked_out", "MongoDB connections currently checked out", lambda: _pool["checked_out"])
+
+METRICS = [
+    http_requests, http_latency, http_phase, http_response_size, mongo_commands, mongo_pool_open,
+    mongo_pool_in_use, llm_latency, llm_first_token, bcrypt_latency, email_latency, loop_lag
+]
+
+def _charge(phases, name, seconds):
+    with _lock:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+def add_phase(name, seconds):
+    """Charge time to a phase of the current request, if there is one."""
+    phases = _request_phases.get()
+    if phases is not None:
+        _charge(phases, name, seconds)
+
+@contextmanager
+def phase(name, histogram=None, *label_values):
+    """Time a block as a request phase, optionally also observing a histogram and opening a span."""
+    span = _tracer.start_as_current_span(name) if _tracer else None
+    if span:
+        span.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        add_phase(name, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed, *label_values)
+        if span:
+            span.__exit__(None, None, None)
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        phases = _request_phases.get()
+        if phases is not None:
+            with _lock:
+                _mongo_pending[(event.connection_id, event.request_id)] = phases
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.observe(seconds, event.command_name)
+        with _lock:
+            phases = _mongo_pending.pop((event.connection_id, event.request_id), None)
+        if phases is not None:
+            _charge(phases, "mongo", seconds)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+def _pool_add(key, amount):
+    with _lock:
+        _pool[key] += amount
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        _pool_add("open", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        _pool_add("open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        _pool_add("checked_out", 1)
+
+    def connection_checked_in(self, event):
+        _pool_add("checked_out", -1)
+
+MONGO_LISTENERS = [MongoCommandListener(), MongoPoolListener()]
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are measured to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        phases = {}
+        token = _request_phases.set(phases)
+        started = time.perf_counter()
+        response = {"status": 500, "size": 0}
+        span = _tracer.start_as_current_span(f"{scope['method']} {scope['path']}") if _tracer else None
+        if span:
+            span.__enter__()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                # Server-Timing shows the split in browser dev tools; streams only report what ran before the first byte
+                timing = ", ".join(f"{name};dur={phases[name] * 1000:.1f}" for name in PHASES if name in phases)
+                if timing:
+                    message.setdefault("headers", []).append((b"server-timing", timing.encode()))
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_requests.inc(scope["method"], route, response["status"])
+            http_latency.observe(elapsed, scope["method"], route)
+            http_response_size.observe(response["size"], route)
+            with _lock:
+                phases = dict(phases)
+            for name, seconds in phases.items():
+                http_phase.observe(seconds, route, name)
+            if elapsed > SLOW_REQUEST_SECONDS:
+                breakdown = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in phases.items())
+                print(f"⚠️ Slow request {scope['method']} {route} {elapsed * 1000:.0f}ms {breakdown}")
+            if span:
+                current = trace.get_current_span()
+                current.set_attribute("http.route", route)
+                current.set_attribute("http.status_code", response["status"])
+                for name, seconds in phases.items():
+                    current.set_attribute(f"phase.{name}_ms", round(seconds * 1000, 1))
+                span.__exit__(None, None, None)
+            _request_phases.reset(token)
+
+async def check_mongo_attribution(command):
+    """Run one Mongo command as if inside a request and warn if its time doesn't arrive there."""
+    phases = {}
+    token = _request_phases.set(phases)
+    try:
+        await command()
+    finally:
+        _request_phases.reset(token)
+    if "mongo" not in phases:
+        print("⚠️ Mongo command events don't run in the request's context; the mongo phase will stay empty")
+
+def require_metrics_access(request: Request):
+    """Keep /metrics and /stats/* internal: METRICS_TOKEN as a bearer token, or loopback only."""
+    if METRICS_TOKEN:
+        if secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            return
+    elif request.client and request.client.host in ("127.0.0.1", "::1"):
+        return
+    raise HTTPException(status_code=403, detail="Forbidden")
+
+async def monitor_event_loop():
+    """Sample how late a timer fires; anything beyond the interval is time the loop was blocked."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_lag.observe(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+def _flatten(prefix, value, out):
+    if isinstance(value, bool):
+        out.append((prefix, int(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, inner in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), inner, out)
+
+def render_metrics(stats_sources):
+    """Prometheus text format for the metrics above plus the numeric /stats/* values.
+
+    `stats_sources` maps a group name to a function returning that group's stats dict.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines += ["# HELP app_stat Numeric values from the /stats endpoints", "# TYPE app_stat gauge"]
+    for group, read in stats_sources.items():
+        values = []
+        _flatten("", read(), values)
+        for key, value in values:
+            lines.append(f'app_stat{{group="{group}",key="{key}"}} {value}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+def encode_cursor(value, oid):
+    """Opaque keyset cursor '<sort value>:<ObjectId>'; datetimes are stored as epoch ms."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = int(value.timestamp() * 1000)
+    return f"{int(value or 0)}:{oid}"
+
+def decode_cursor(cursor, as_datetime=False):
+    try:
+        value, oid = cursor.split(":", 1)
+        value = int(value)
+        if as_datetime:
+            value = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+        return value, ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(field, value, oid, direction):
+    """Filter for documents strictly after (value, oid) in a (field, _id) sort."""
+    op = "$gt" if direction == 1 else "$lt"
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: oid}}]}
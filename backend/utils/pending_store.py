@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from utils.db import get_db
+from utils.redis_client import get_redis
+from dotenv import load_dotenv
+load_dotenv()
+
+# mongo (default, shared by all workers) | redis | memory (single worker only)
+PENDING_STORE = os.getenv("PENDING_STORE", "mongo")
+# Matches the 10 minute OTP validity in routers/auth.py
+PENDING_SIGNUP_TTL = int(os.getenv("PENDING_SIGNUP_TTL", "600"))
+PENDING_MEMORY_MAX = int(os.getenv("PENDING_MEMORY_MAX", "10000"))
+PENDING_SWEEP_INTERVAL = float(os.getenv("PENDING_SWEEP_INTERVAL", "30"))
+
+class MemoryPendingStore:
+    """Per-process store. Entries share one TTL, so insertion order is expiry order."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # email -> (expires_at, data)
+
+    async def add(self, email, data):
+        if await self.get(email) is not None:
+            return False
+        self.entries[email] = (time.monotonic() + self.ttl, data)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return True
+
+    async def get(self, email):
+        entry = self.entries.get(email)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.entries[email]
+            return None
+        return entry[1]
+
+    async def delete(self, email):
+        self.entries.pop(email, None)
+
+    def sweep(self):
+        """Drop expired entries from the front; stops at the first live one."""
+        now = time.monotonic()
+        while self.entries:
+            email, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at >= now:
+                break
+            del self.entries[email]
+
+class MongoPendingStore:
+    """pending_users collection with a unique email and a TTL index on expire_at."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    async def add(self, email, data):
+        db = get_db()
+        now = datetime.now(timezone.utc)
+        # Mongo's TTL monitor only runs once a minute, so clear an expired leftover first
+        await db.pending_users.delete_one({"email": email, "expire_at": {"$lte": now}})
+        try:
+            await db.pending_users.insert_one({**data, "email": email, "expire_at": now + timedelta(seconds=self.ttl)})
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def get(self, email):
+        db = get_db()
+        return await db.pending_users.find_one(
+            {"email": email, "expire_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "expire_at": 0}
+        )
+
+    async def delete(self, email):
+        db = get_db()
+        await db.pending_users.delete_one({"email": email})
+
+class RedisPendingStore:
+    """One key per email with a Redis expiry; SET NX makes add atomic across workers."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _key(self, email):
+        return f"pending_user:{email}"
+
+    async def add(self, email, data):
+        value = json.dumps(data, default=lambda v: v.isoformat())
+        return bool(await get_redis().set(self._key(email), value, ex=self.ttl, nx=True))
+
+    async def get(self, email):
+        value = await get_redis().get(self._key(email))
+        if value is None:
+            return None
+        data = json.loads(value)
+        for field, field_value in data.items():
+            if field.endswith("_at") and isinstance(field_value, str):
+                data[field] = datetime.fromisoformat(field_value)
+        return data
+
+    async def delete(self, email):
+        await get_redis().delete(self._key(email))
+
+def _build_store():
+    if PENDING_STORE == "redis":
+        if get_redis() is None:
+            print("⚠️ PENDING_STORE=redis but Redis is not configured, using Mongo")
+            return MongoPendingStore(PENDING_SIGNUP_TTL)
+        return RedisPendingStore(PENDING_SIGNUP_TTL)
+    if PENDING_STORE == "memory":
+        return MemoryPendingStore(PENDING_SIGNUP_TTL, PENDING_MEMORY_MAX)
+    return MongoPendingStore(PENDING_SIGNUP_TTL)
+
+pending_store = _build_store()
+
+async def sweep_pending_users():
+    """Active expiry for the in-memory backend; the other backends expire on their own."""
+    if not isinstance(pending_store, MemoryPendingStore):
+        return
+    while True:
+        await asyncio.sleep(PENDING_SWEEP_INTERVAL)
+        pending_store.sweep()
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from utils.db import get_db
+
+# Persona preamble, compiled once per bot version and sent as the system instruction
+PERSONA_TEMPLATE = """You are an AI bot named {name} with the following details:
+Personality: {personality}
+Situation: {situation}
+Backstory: {back_story}
+Chatting Style: {chatting_way}
+Your role is like a {type_of_bot}.
+
+Respond naturally, casually, like a human texting, with short one-line replies — no long paragraphs, no formal tone, just chill and real.
+
+Start the chat from the perspective of {name} and continue accordingly."""
+
+PERSONA_FIELDS = ("name", "personality", "situation", "back_story", "chatting_way", "type_of_bot")
+
+def prompt_version(bot):
+    """Version of a bot's compiled prompt: its updated_at in epoch ms."""
+    updated_at = bot.get("updated_at")
+    if updated_at is None:
+        return 0
+    if isinstance(updated_at, str):
+        updated_at = datetime.fromisoformat(updated_at)
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return int(updated_at.timestamp() * 1000)
+
+def compile_persona(bot):
+    return PERSONA_TEMPLATE.format(**{field: bot.get(field, "") for field in PERSONA_FIELDS})
+
+def compiled_fields(bot):
+    """Fields to $set on a bot document whenever its persona changes."""
+    return {"system_prompt": compile_persona(bot), "prompt_version": prompt_version(bot)}
+
+async def ensure_compiled(bot):
+    """Compile and store the prompt for bots saved before prompts were compiled, or edited since."""
+    version = prompt_version(bot)
+    if bot.get("system_prompt") and bot.get("prompt_version") == version:
+        return bot
+    fields = compiled_fields(bot)
+    bot.update(fields)
+    db = get_db()
+    await db.bots.update_one({"bot_id": bot["bot_id"], "updated_at": bot.get("updated_at")}, {"$set": fields})
+    return bot
+
+def to_contents(context, user_message):
+    """Conversation memory and the new message as Gemini multi-turn contents."""
+    contents = []
+    if context.get("summary"):
+        contents.append({"role": "user", "parts": [{"text": f"(Summary of our conversation so far: {context['summary']})"}]})
+        contents.append({"role": "model", "parts": [{"text": "Got it."}]})
+    for turn in context.get("turns", []):
+        if turn["user"]:
+            contents.append({"role": "user", "parts": [{"text": turn["user"]}]})
+        if turn["bot"]:
+            contents.append({"role": "model", "parts": [{"text": turn["bot"]}]})
+    contents.append({"role": "user", "parts": [{"text": user_message}]})
+    return contents
@@ -0,0 +1,226 @@
+import os
+import uuid
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from utils.db import get_db
+from utils.avatars import avatar_files
+from dotenv import load_dotenv
+load_dotenv()
+
+# Documents removed per delete_many, and the pause between batches so a large
+# purge doesn't starve the primary
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.05"))
+PURGE_POLL_INTERVAL = float(os.getenv("PURGE_POLL_INTERVAL", "5"))
+# A running job whose worker stops renewing this lease is picked up by another worker
+PURGE_LEASE_SECONDS = int(os.getenv("PURGE_LEASE_SECONDS", "60"))
+PURGE_MAX_ATTEMPTS = int(os.getenv("PURGE_MAX_ATTEMPTS", "5"))
+PURGE_JOB_RETENTION = int(os.getenv("PURGE_JOB_RETENTION", str(7 * 24 * 3600)))
+
+# A chat stays hidden while its purge is pending, and also if it gave up, since the user asked for it gone.
+# hidden_before reads the cutoff off the job, so failed chat jobs are kept rather than expired
+HIDING = ("queued", "running", "failed")
+# What GET /jobs/{job_id} shows
+JOB_PROJECTION = {"_id": 0, "lease_until": 0, "expire_at": 0}
+
+_wakeup = asyncio.Event()
+_stats = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0, "batches": 0, "documents_deleted": 0}
+
+def _now():
+    return datetime.now(timezone.utc)
+
+async def _enqueue(job):
+    db = get_db()
+    now = _now()
+    job.update({
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "attempts": 0,
+        "deleted": {},
+        "run_after": now,
+        "created_at": now,
+        "updated_at": now
+    })
+    await db.purge_jobs.insert_one(job)
+    _stats["enqueued"] += 1
+    _wakeup.set()
+    return job["job_id"]
+
+async def delete_bot_later(bot):
+    """Hide a bot now and queue removal of its chats, summaries, prompt caches and avatar."""
+    db = get_db()
+    now = _now()
+    # updated_at moves too, so other workers' search index sync drops the bot
+    await db.bots.update_one({"bot_id": bot["bot_id"]}, {"$set": {"deleted_at": now, "updated_at": now}})
+    # Flagged too, so dashboards stop listing them even if the purge fails
+    await db.conversations.update_many({"bot_id": bot["bot_id"]}, {"$set": {"deleted_at": now}})
+    return await _enqueue({
+        "kind": "bot",
+        "bot_id": bot["bot_id"],
+        "user_id": bot["user_id"],
+        "avatar_hash": bot.get("avatar_hash")
+    })
+
+async def clear_chat_later(user_id, bot_id):
+    """Hide a chat's history now and queue deletion of every turn stored so far.
+
+    Turns sent after the restart are newer than the cutoff, so they survive the purge.
+    """
+    return await _enqueue({
+        "kind": "chat",
+        "chat_id": f"{user_id}_{bot_id}",
+        "user_id": user_id,
+        "bot_id": bot_id,
+        "cutoff": _now()
+    })
+
+async def hidden_before(chat_id):
+    """Timestamp up to which a chat's history is being purged, or None."""
+    db = get_db()
+    job = await db.purge_jobs.find_one(
+        {"chat_id": chat_id, "status": {"$in": HIDING}}, {"_id": 0, "cutoff": 1}, sort=[("cutoff", -1)]
+    )
+    return job["cutoff"] if job else None
+
+async def get_purge_job(job_id):
+    db = get_db()
+    return await db.purge_jobs.find_one({"job_id": job_id}, JOB_PROJECTION)
+
+async def _progress(job, collection, count):
+    """Record deleted documents and renew the lease; called after every batch."""
+    db = get_db()
+    _stats["batches"] += 1
+    _stats["documents_deleted"] += count
+    await db.purge_jobs.update_one(
+        {"job_id": job["job_id"]},
+        {
+            "$inc": {f"deleted.{collection}": count},
+            "$set": {"lease_until": _now() + timedelta(seconds=PURGE_LEASE_SECONDS), "updated_at": _now()}
+        }
+    )
+
+async def _delete_in_batches(job, collection, query):
+    db = get_db()
+    while True:
+        ids = [doc["_id"] async for doc in db[collection].find(query, {"_id": 1}).limit(PURGE_BATCH_SIZE)]
+        if not ids:
+            return
+        result = await db[collection].delete_many({"_id": {"$in": ids}})
+        await _progress(job, collection, result.deleted_count)
+        await asyncio.sleep(PURGE_BATCH_PAUSE)
+
+async def _purge_chat(job):
+    await _delete_in_batches(
+        job, "chats", {"user_id": job["user_id"], "bot_id": job["bot_id"], "timestamp": {"$lte": job["cutoff"]}}
+    )
+
+async def _purge_bot(job):
+    db = get_db()
+    bot_id = job["bot_id"]
+    # One conversation per user who chatted with the bot; walk them to reach the
+    # chats through the (user_id, bot_id) index instead of scanning by bot_id
+    while True:
+        conversations = await db.conversations.find(
+            {"bot_id": bot_id}, {"_id": 1, "chat_id": 1, "user_id": 1}
+        ).limit(PURGE_BATCH_SIZE).to_list(length=PURGE_BATCH_SIZE)
+        if not conversations:
+            break
+        for conversation in conversations:
+            await _delete_in_batches(job, "chats", {"user_id": conversation["user_id"], "bot_id": bot_id})
+        chat_ids = [c["chat_id"] for c in conversations]
+        result = await db.chat_memory.delete_many({"chat_id": {"$in": chat_ids}})
+        await _progress(job, "chat_memory", result.deleted_count)
+        result = await db.conversations.delete_many({"_id": {"$in": [c["_id"] for c in conversations]}})
+        await _progress(job, "conversations", result.deleted_count)
+
+    result = await db.prompt_caches.delete_many({"bot_id": bot_id})
+    await _progress(job, "prompt_caches", result.deleted_count)
+
+    # Avatars are shared by every bot uploading the same image
+    avatar_hash = job.get("avatar_hash")
+    if avatar_hash and not await db.bots.find_one(
+        {"avatar_hash": avatar_hash, "bot_id": {"$ne": bot_id}, "deleted_at": None}, {"_id": 1}
+    ):
+        bucket = avatar_files()
+        removed = 0
+        async for grid_file in db["avatars.files"].find(
+            {"filename": {"$regex": f"^{avatar_hash}(_[0-9]+)?$"}}, {"_id": 1}
+        ):
+            await bucket.delete(grid_file["_id"])
+            removed += 1
+        await _progress(job, "avatars", removed)
+
+    # Turns with no conversation row (still buffered, or stored while the walk ran) are only reachable by bot_id
+    await _delete_in_batches(job, "chats", {"bot_id": bot_id})
+    await db.bots.delete_one({"bot_id": bot_id})
+
+PURGERS = {"bot": _purge_bot, "chat": _purge_chat}
+
+async def _claim():
+    """Take the oldest queued job, or a running one whose worker went away."""
+    db = get_db()
+    now = _now()
+    return await db.purge_jobs.find_one_and_update(
+        {"$or": [{"status": "queued", "run_after": {"$lte": now}}, {"status": "running", "lease_until": {"$lt": now}}]},
+        {
+            "$set": {"status": "running", "lease_until": now + timedelta(seconds=PURGE_LEASE_SECONDS), "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _run(job):
+    db = get_db()
+    try:
+        await PURGERS[job["kind"]](job)
+    except asyncio.CancelledError:
+        # Shutting down; the lease runs out and another worker resumes the job
+        raise
+    except Exception as e:
+        # Every step is idempotent, so a retry picks up where this attempt stopped
+        failed = job["attempts"] >= PURGE_MAX_ATTEMPTS
+        _stats["failed" if failed else "retried"] += 1
+        print(f"❌ Purge job {job['job_id']} ({job['kind']}) failed: {e}")
+        update = {
+            "status": "failed" if failed else "queued", "error": str(e), "updated_at": _now(),
+            "run_after": _now() + timedelta(seconds=PURGE_POLL_INTERVAL * 2 ** job["attempts"])
+        }
+        if failed and job["kind"] != "chat":
+            update["expire_at"] = _now() + timedelta(seconds=PURGE_JOB_RETENTION)
+        await db.purge_jobs.update_one({"job_id": job["job_id"]}, {"$set": update})
+        return
+    now = _now()
+    await db.purge_jobs.update_one({"job_id": job["job_id"]}, {
+        "$set": {
+            "status": "done", "finished_at": now, "updated_at": now,
+            "expire_at": now + timedelta(seconds=PURGE_JOB_RETENTION)
+        },
+        "$unset": {"error": ""}
+    })
+    _stats["completed"] += 1
+
+async def run_purge_worker():
+    """Work through queued purge jobs one at a time; every API worker runs one of these."""
+    while True:
+        try:
+            job = await _claim()
+        except Exception as e:
+            print(f"❌ Purge worker could not claim a job: {e}")
+            job = None
+        if job is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), PURGE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await _run(job)
+        except Exception as e:
+            # Couldn't even record the outcome; the lease expires and the job is retried
+            print(f"❌ Purge worker error on job {job['job_id']}: {e}")
+
+def get_purge_stats():
+    return {**_stats, "batch_size": PURGE_BATCH_SIZE, "batch_pause_s": PURGE_BATCH_PAUSE}
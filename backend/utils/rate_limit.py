@@ -0,0 +1,263 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from utils.redis_client import get_redis
+from dotenv import load_dotenv
+load_dotenv()
+
+def _rule(name, rate, burst):
+    """(tokens per second, bucket size) for a rule, overridable as <NAME>_RATE / <NAME>_BURST."""
+    return float(os.getenv(f"{name}_RATE", rate)), float(os.getenv(f"{name}_BURST", burst))
+
+# Rule -> (refill rate per second, burst)
+RATE_LIMITS = {
+    "chat_user": _rule("CHAT_USER", "0.5", "10"),    # 30 messages a minute per user
+    "chat_bot": _rule("CHAT_BOT", "10", "50"),       # 600 messages a minute per bot
+    "signup": _rule("SIGNUP", "0.05", "5"),          # 3 signups a minute per client address
+    "otp": _rule("OTP", "0.0167", "5"),              # 1 OTP attempt a minute per email
+}
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | redis
+# Buckets kept per process; the least recently used are dropped first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Upstream LLM calls allowed in flight per process, and how many may wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_WAITING = int(os.getenv("LLM_MAX_WAITING", "256"))
+LLM_ADMISSION_TIMEOUT = float(os.getenv("LLM_ADMISSION_TIMEOUT", "10"))
+# On shutdown, how long to wait for LLM calls still in flight (background summaries included)
+LLM_DRAIN_TIMEOUT = float(os.getenv("LLM_DRAIN_TIMEOUT", "20"))
+
+class RateLimitedError(Exception):
+    """Raised when a bucket is empty; main.py turns it into a 429."""
+
+    def __init__(self, rule, retry_after):
+        super().__init__(rule)
+        self.rule = rule
+        self.retry_after = retry_after
+
+class LLMBusyError(Exception):
+    """Raised when no upstream LLM slot frees up in time; handlers turn it into a 503."""
+
+_stats = {rule: {"allowed": 0, "limited": 0} for rule in RATE_LIMITS}
+
+class MemoryRateLimiter:
+    """Token buckets in an LRU dict: one dict lookup and a little arithmetic per decision."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # (rule, key) -> [tokens, updated]
+
+    async def take(self, rule, key):
+        """Return 0 if a token was taken, else seconds until one is available."""
+        rate, burst = RATE_LIMITS[rule]
+        now = time.monotonic()
+        bucket = self.buckets.get((rule, key))
+        if bucket is None:
+            bucket = self.buckets[(rule, key)] = [burst, now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end((rule, key))
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / rate
+
+    async def refund(self, rule, key):
+        """Give back a token taken for a request another rule then rejected."""
+        bucket = self.buckets.get((rule, key))
+        if bucket is not None:
+            bucket[0] = min(RATE_LIMITS[rule][1], bucket[0] + 1)
+
+# Refill and take atomically on the Redis server, using its clock so workers agree
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(retry)
+"""
+
+_REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + 1)))
+end
+return 1
+"""
+
+class RedisRateLimiter:
+    """Buckets shared by every worker; falls back to the local limiter if Redis fails."""
+
+    def __init__(self, redis, fallback):
+        self.script = redis.register_script(_TAKE_SCRIPT)
+        self.refund_script = redis.register_script(_REFUND_SCRIPT)
+        self.fallback = fallback
+
+    async def take(self, rule, key):
+        rate, burst = RATE_LIMITS[rule]
+        try:
+            return float(await self.script(keys=[f"ratelimit:{rule}:{key}"], args=[rate, burst]))
+        except Exception as e:
+            print(f"⚠️ Redis rate limit check failed, using local buckets: {e}")
+            return await self.fallback.take(rule, key)
+
+    async def refund(self, rule, key):
+        try:
+            await self.refund_script(keys=[f"ratelimit:{rule}:{key}"], args=[RATE_LIMITS[rule][1]])
+        except Exception as e:
+            print(f"⚠️ Redis rate limit refund failed, using local buckets: {e}")
+            await self.fallback.refund(rule, key)
+
+_limiter = None
+
+def _get_limiter():
+    global _limiter
+    if _limiter is None:
+        local = MemoryRateLimiter(RATE_LIMIT_MAX_KEYS)
+        redis = get_redis() if RATE_LIMIT_BACKEND == "redis" else None
+        _limiter = RedisRateLimiter(redis, local) if redis is not None else local
+    return _limiter
+
+async def check_rate_limits(*checks):
+    """Take one token from each (rule, key) bucket, or raise RateLimitedError.
+
+    All or nothing: if a later bucket is empty, tokens already taken are given back,
+    so a request that never runs doesn't count against the earlier rules.
+    """
+    limiter = _get_limiter()
+    taken = []
+    for rule, key in checks:
+        retry_after = await limiter.take(rule, key)
+        if retry_after:
+            for taken_rule, taken_key in taken:
+                await limiter.refund(taken_rule, taken_key)
+            _stats[rule]["limited"] += 1
+            raise RateLimitedError(rule, retry_after)
+        taken.append((rule, key))
+    for rule, _ in checks:
+        _stats[rule]["allowed"] += 1
+
+async def check_rate_limit(rule, key):
+    """Take one token from the rule's bucket for key, or raise RateLimitedError."""
+    await check_rate_limits((rule, key))
+
+class FairAdmission:
+    """Caps concurrent upstream calls; waiting callers are served round-robin by key.
+
+    A key with many queued calls only gets every n-th free slot, so one busy
+    conversation can't starve the others behind it.
+    """
+
+    def __init__(self, limit, max_waiting):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self.queues = OrderedDict()  # key -> deque of futures, in round-robin order
+        self.draining = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "wait_seconds": 0.0}
+
+    def _release(self):
+        while self.queues:
+            key, queue = next(iter(self.queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self.queues.move_to_end(key)
+            else:
+                del self.queues[key]
+            if not waiter.done():
+                # The slot passes straight to the waiter, in_flight stays the same
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        if not self.in_flight:
+            self.idle.set()
+
+    def _forget(self, key, waiter):
+        queue = self.queues.get(key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self.queues[key]
+
+    @asynccontextmanager
+    async def slot(self, key):
+        if self.draining:
+            self.stats["rejected"] += 1
+            raise LLMBusyError()
+        if self.in_flight < self.limit and not self.queues:
+            self.in_flight += 1
+            self.idle.clear()
+        else:
+            if self.waiting >= self.max_waiting:
+                self.stats["rejected"] += 1
+                raise LLMBusyError()
+            waiter = asyncio.get_running_loop().create_future()
+            self.queues.setdefault(key, deque()).append(waiter)
+            self.waiting += 1
+            self.stats["queued"] += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), LLM_ADMISSION_TIMEOUT)
+            except BaseException as e:
+                self._forget(key, waiter)
+                if waiter.done() and not waiter.cancelled():
+                    # Granted a slot just as we gave up; hand it on
+                    self._release()
+                waiter.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["timed_out"] += 1
+                    raise LLMBusyError()
+                raise
+            finally:
+                self.waiting -= 1
+                self.stats["wait_seconds"] += time.perf_counter() - started
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def drain(self, timeout):
+        """Turn away new calls and wait for the ones in flight; returns how many were cut off."""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.in_flight
+
+llm_admission = FairAdmission(LLM_MAX_CONCURRENCY, LLM_MAX_WAITING)
+
+def get_rate_limit_stats():
+    return {
+        "backend": "redis" if isinstance(_get_limiter(), RedisRateLimiter) else "memory",
+        "rules": {rule: {"rate": rate, "burst": burst, **_stats[rule]} for rule, (rate, burst) in RATE_LIMITS.items()},
+        "llm_admission": {
+            "limit": llm_admission.limit,
+            "in_flight": llm_admission.in_flight,
+            "waiting": llm_admission.waiting,
+            "queued_keys": len(llm_admission.queues),
+            "draining": llm_admission.draining,
+            **llm_admission.stats
+        }
+    }
@@ -0,0 +1,28 @@
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Redis is optional: shared tiers are only used when REDIS_URL is set and redis is installed
+REDIS_URL = os.getenv("REDIS_URL")
+
+_client = None
+_missing = False
+
+def get_redis():
+    """Return the shared redis.asyncio client, or None when Redis isn't configured."""
+    global _client, _missing
+    if _client is None and REDIS_URL and not _missing:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            print("⚠️ REDIS_URL is set but the redis package is not installed")
+            _missing = True
+            return None
+        _client = redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
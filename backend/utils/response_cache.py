@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import hashlib
+import json
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+# off (default) | exact | semantic (exact first, then nearest cached message by embedding)
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "off").lower()
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_PER_BOT = int(os.getenv("RESPONSE_CACHE_PER_BOT", "256"))
+RESPONSE_CACHE_MAX_BOTS = int(os.getenv("RESPONSE_CACHE_MAX_BOTS", "1000"))
+# Cosine similarity a cached message needs to be served for a different wording
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+# Long messages almost never repeat, so they aren't worth a lookup
+RESPONSE_CACHE_MAX_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_CHARS", "120"))
+# By default only opening messages (no memory yet) are cached; turns with context
+# only match when the whole conversation state is identical
+RESPONSE_CACHE_WITH_CONTEXT = os.getenv("RESPONSE_CACHE_WITH_CONTEXT", "false").lower() == "true"
+
+_stats = {
+    "lookups": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "skipped": 0,
+    "stores": 0, "evictions": 0, "expirations": 0, "embed_calls": 0, "embed_errors": 0
+}
+
+_NOISE_RE = re.compile(r"[^a-z0-9' ]+")
+_REPEAT_RE = re.compile(r"(.)\1{2,}")
+_SPACE_RE = re.compile(r"\s+")
+
+# numpy takes a while to import, so it is only loaded when semantic matching is on
+np = None
+if RESPONSE_CACHE == "semantic":
+    try:
+        import numpy as np
+    except ImportError:
+        print("⚠️ RESPONSE_CACHE=semantic needs numpy, falling back to exact matching")
+        RESPONSE_CACHE = "exact"
+
+def normalize_message(message):
+    """Lowercase, drop punctuation and squash stretched letters ("heyyy!!" -> "hey")."""
+    text = _REPEAT_RE.sub(r"\1", (message or "").lower())
+    return _SPACE_RE.sub(" ", _NOISE_RE.sub(" ", text)).strip()
+
+def state_hash(context):
+    """Stable hash of the memory a reply was generated with; empty for a first turn.
+
+    Turns with no user message (the bot's stored greeting) are left out: every chat with
+    the bot opens with the same one, so they don't make a conversation's state differ.
+    """
+    turns = [turn for turn in context.get("turns", []) if turn.get("user")]
+    if not context.get("summary") and not turns:
+        return ""
+    encoded = json.dumps([context.get("summary", ""), turns], sort_keys=True)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+class CacheProbe:
+    """Result of a lookup; pass it back to store() after a miss so nothing is recomputed."""
+
+    def __init__(self, bot_id, prompt_version, key, vector=None, reply=None):
+        self.bot_id = bot_id
+        self.prompt_version = prompt_version
+        self.key = key
+        self.vector = vector
+        self.reply = reply
+
+class _BotEntries:
+    """One bot's cached replies for its current prompt version, LRU-bounded."""
+
+    def __init__(self, prompt_version):
+        self.prompt_version = prompt_version
+        self.entries = OrderedDict()  # (state_hash, normalized message) -> (expires_at, reply, vector)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            _stats["expirations"] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def nearest(self, scope, vector):
+        """Best cached reply in the same conversation state by cosine similarity."""
+        now = time.monotonic()
+        keys, vectors = [], []
+        for key, (expires_at, _, cached_vector) in self.entries.items():
+            if key[0] == scope and cached_vector is not None and expires_at >= now:
+                keys.append(key)
+                vectors.append(cached_vector)
+        if not vectors:
+            return None
+        # Vectors are stored unit-length, so the dot product is the cosine similarity
+        scores = np.stack(vectors) @ vector
+        best = int(scores.argmax())
+        if scores[best] < RESPONSE_CACHE_THRESHOLD:
+            return None
+        self.entries.move_to_end(keys[best])
+        return self.entries[keys[best]][1]
+
+    def set(self, key, reply, vector):
+        self.entries[key] = (time.monotonic() + RESPONSE_CACHE_TTL, reply, vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > RESPONSE_CACHE_PER_BOT:
+            self.entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+_bots = OrderedDict()  # bot_id -> _BotEntries
+
+def _entries_for(bot_id, prompt_version, create=False):
+    entries = _bots.get(bot_id)
+    if entries is not None and entries.prompt_version != prompt_version:
+        # The persona changed; nothing cached for the old prompt is valid any more
+        _stats["evictions"] += len(entries.entries)
+        del _bots[bot_id]
+        entries = None
+    if entries is None and create:
+        entries = _bots[bot_id] = _BotEntries(prompt_version)
+        while len(_bots) > RESPONSE_CACHE_MAX_BOTS:
+            _, dropped = _bots.popitem(last=False)
+            _stats["evictions"] += len(dropped.entries)
+    if entries is not None:
+        _bots.move_to_end(bot_id)
+    return entries
+
+def _unit(values):
+    vector = np.asarray(values, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else None
+
+async def lookup(bot, context, user_message, embed):
+    """Return a CacheProbe (with .reply set on a hit), or None if this turn isn't cacheable.
+
+    `embed(text)` returns an embedding vector; it is only called in semantic
+    mode and only after an exact miss.
+    """
+    if RESPONSE_CACHE not in ("exact", "semantic"):
+        return None
+    normalized = normalize_message(user_message)
+    scope = state_hash(context)
+    if not normalized or len(normalized) > RESPONSE_CACHE_MAX_CHARS or (scope and not RESPONSE_CACHE_WITH_CONTEXT):
+        _stats["skipped"] += 1
+        return None
+
+    _stats["lookups"] += 1
+    probe = CacheProbe(bot["bot_id"], bot.get("prompt_version"), (scope, normalized))
+    entries = _entries_for(probe.bot_id, probe.prompt_version)
+    probe.reply = entries.get(probe.key) if entries else None
+    if probe.reply is not None:
+        _stats["exact_hits"] += 1
+        return probe
+
+    if RESPONSE_CACHE == "semantic":
+        _stats["embed_calls"] += 1
+        try:
+            probe.vector = _unit(await embed(normalized))
+        except Exception as e:
+            _stats["embed_errors"] += 1
+            print(f"⚠️ Response cache embedding failed: {e}")
+        if probe.vector is not None and entries:
+            probe.reply = entries.nearest(scope, probe.vector)
+            if probe.reply is not None:
+                _stats["semantic_hits"] += 1
+                return probe
+
+    _stats["misses"] += 1
+    return probe
+
+def store(probe, reply):
+    """Remember the reply generated after a miss."""
+    if probe is None or not reply:
+        return
+    _entries_for(probe.bot_id, probe.prompt_version, create=True).set(probe.key, reply, probe.vector)
+    _stats["stores"] += 1
+
+def get_response_cache_stats():
+    hits = _stats["exact_hits"] + _stats["semantic_hits"]
+    return {
+        **_stats,
+        "mode": RESPONSE_CACHE,
+        "threshold": RESPONSE_CACHE_THRESHOLD,
+        "bots": len(_bots),
+        "entries": sum(len(entries.entries) for entries in _bots.values()),
+        "hit_rate": round(hits / _stats["lookups"], 4) if _stats["lookups"] else 0.0,
+        "upstream_calls_saved": hits,
+    }
@@ -0,0 +1,42 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+# Mongo hands back naive datetimes that are UTC; emit them with a +00:00 offset
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(content):
+    """orjson with Mongo types (ObjectId, naive UTC datetimes) handled natively."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+class MongoJSONResponse(ORJSONResponse):
+    """Serializes Mongo documents as they come from the driver.
+
+    Handlers return this directly so FastAPI skips jsonable_encoder and response
+    model validation; their response_model then only documents the shape.
+    """
+
+    def render(self, content):
+        return dumps(content)
+
+def stream_json_array(documents, head=None, tail=None):
+    """Stream `{...head, "data": [documents...], ...tail}` without building the list in memory.
+
+    `documents` is an async iterable, e.g. a Motor cursor; each one is encoded as it arrives.
+    """
+    async def body():
+        prefix = dumps(head or {})[:-1]
+        yield prefix + (b',"data":[' if len(prefix) > 1 else b'"data":[')
+        separator = b""
+        async for document in documents:
+            yield separator + dumps(document)
+            separator = b","
+        suffix = dumps(tail or {})[1:]
+        yield b"]" + (b"," + suffix if len(suffix) > 1 else suffix)
+
+    return StreamingResponse(body(), media_type="application/json")
@@ -0,0 +1,175 @@
+import os
+import re
+import math
+import heapq
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from utils.db import get_db, run_when_ready
+from dotenv import load_dotenv
+load_dotenv()
+
+SEARCH_SYNC_INTERVAL = float(os.getenv("SEARCH_SYNC_INTERVAL", "30"))
+# Ranked candidates kept per query; pages are cut from this list
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+# Field -> weight of a term found in that field
+FIELD_WEIGHTS = {"name": 3.0, "type_of_bot": 2.0, "bio": 1.5, "personality": 1.0}
+SEARCH_PROJECTION = {"_id": 0, "bot_id": 1, "privacy": 1, "updated_at": 1, "deleted_at": 1, **{field: 1 for field in FIELD_WEIGHTS}}
+# How much a prefix or one-typo match counts compared to an exact term
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+MIN_PREFIX = 2
+MAX_PREFIX = 12
+MIN_FUZZY_LENGTH = 4
+
+STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "is", "it", "for", "on", "with", "as", "at", "by", "or", "be", "i", "you", "my"}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def _deletes(term):
+    """All strings one deletion away from term (SymSpell-style typo index keys)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+class BotSearchIndex:
+    """In-process inverted index over public bots with prefix and one-typo matching.
+
+    Every lookup is a dict access, so query cost depends on the query and its
+    matches rather than on catalogue size. Results are only bot ids; callers
+    re-read the bots from Mongo, which drops anything deleted or made private
+    by another worker since the last sync.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)      # term -> {bot_id: weight}
+        self.doc_terms = {}                    # bot_id -> {term: weight}
+        self.prefixes = defaultdict(set)       # prefix -> terms
+        self.typos = defaultdict(set)          # one-deletion variant -> terms
+        self.ready = False
+        self.last_sync = None
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def _add_term(self, term):
+        for i in range(MIN_PREFIX, min(len(term), MAX_PREFIX) + 1):
+            self.prefixes[term[:i]].add(term)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                self.typos[variant].add(term)
+
+    def _drop_term(self, term):
+        for i in range(MIN_PREFIX, min(len(term), MAX_PREFIX) + 1):
+            terms = self.prefixes.get(term[:i])
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self.prefixes[term[:i]]
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                terms = self.typos.get(variant)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self.typos[variant]
+
+    def remove(self, bot_id):
+        for term in self.doc_terms.pop(bot_id, {}):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(bot_id, None)
+            if not posting:
+                del self.postings[term]
+                self._drop_term(term)
+
+    def upsert(self, bot):
+        """Index a bot document, or drop it if it is no longer public."""
+        bot_id = bot["bot_id"]
+        self.remove(bot_id)
+        if bot.get("privacy") != "public" or bot.get("deleted_at"):
+            return
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(bot.get(field)):
+                terms[term] = max(terms.get(term, 0), weight)
+        self.doc_terms[bot_id] = terms
+        for term, weight in terms.items():
+            if term not in self.postings:
+                self._add_term(term)
+            self.postings[term][bot_id] = weight
+
+    def _expand(self, token):
+        """Index terms matching a query token, with the factor each match is worth."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        for term in self.prefixes.get(token[:MAX_PREFIX], ()):
+            if term.startswith(token):
+                matches.setdefault(term, PREFIX_FACTOR)
+        if len(token) >= MIN_FUZZY_LENGTH - 1:
+            # Missing letter, extra letter, or one substitution/transposition
+            candidates = set(self.typos.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self.typos.get(variant, ()))
+            for term in candidates:
+                matches.setdefault(term, FUZZY_FACTOR)
+        return matches
+
+    def search(self, query, limit=SEARCH_MAX_CANDIDATES):
+        """Return up to `limit` (bot_id, score) pairs, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        total_docs = max(len(self.doc_terms), 1)
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokens:
+            best = {}
+            for term, factor in self._expand(token).items():
+                posting = self.postings[term]
+                idf = math.log(1 + total_docs / len(posting))
+                for bot_id, weight in posting.items():
+                    score = idf * weight * factor
+                    if score > best.get(bot_id, 0):
+                        best[bot_id] = score
+            for bot_id, score in best.items():
+                scores[bot_id] += score
+                matched[bot_id] += 1
+        # Bots matching more of the query outrank ones that only match part of it
+        ranked = ((score * matched[bot_id] / len(tokens), bot_id) for bot_id, score in scores.items())
+        return [(bot_id, score) for score, bot_id in heapq.nlargest(limit, ranked)]
+
+search_index = BotSearchIndex()
+
+async def load_search_index():
+    db = get_db()
+    started = datetime.now(timezone.utc)
+    async for bot in db.bots.find({"privacy": "public", "deleted_at": None}, SEARCH_PROJECTION):
+        search_index.upsert(bot)
+    search_index.last_sync = started
+    search_index.ready = True
+    print(f"✅ Search index built with {len(search_index)} bots")
+
+async def build_search_index():
+    """Load every public bot into the index once Mongo is up, then keep it in sync with other workers."""
+    await run_when_ready("Search index build", load_search_index)
+
+    while True:
+        await asyncio.sleep(SEARCH_SYNC_INTERVAL)
+        try:
+            await sync_search_index()
+        except Exception as e:
+            print(f"❌ Search index sync failed: {e}")
+
+async def sync_search_index():
+    """Pick up bots created or edited by other workers since the last sync."""
+    db = get_db()
+    started = datetime.now(timezone.utc)
+    async for bot in db.bots.find({"updated_at": {"$gte": search_index.last_sync}}, SEARCH_PROJECTION):
+        search_index.upsert(bot)
+    search_index.last_sync = started
@@ -0,0 +1,223 @@
+import os
+import time
+import uuid
+import asyncio
+import secrets
+from datetime import datetime, timedelta, timezone
+import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pymongo.errors import DuplicateKeyError
+from utils.db import get_db
+from dotenv import load_dotenv
+load_dotenv()
+
+# JWT_SECRET is the name older .env files used
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY") or os.getenv("JWT_SECRET")
+# Keys retired by a rotation, comma separated; tokens they signed keep verifying until they expire
+JWT_PREVIOUS_SECRET_KEYS = [key for key in os.getenv("JWT_PREVIOUS_SECRET_KEYS", "").split(",") if key]
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+# How soon a logout in one worker reaches the others
+AUTH_REVOCATION_SYNC = float(os.getenv("AUTH_REVOCATION_SYNC", "5"))
+# Tabs share one refresh token, so two may refresh at once; for this long a repeat gets the same new pair
+REFRESH_REUSE_GRACE = float(os.getenv("REFRESH_REUSE_GRACE", "10"))
+ALGORITHM = "HS256"
+# Re-read a little before the last sync to cover clock skew and revocations still being written
+_SYNC_OVERLAP = 10
+
+if not JWT_SECRET_KEY:
+    # Good enough for one dev process; sessions end on restart and don't carry across workers
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+    print("⚠️ JWT_SECRET_KEY not set, signing sessions with a random per-process key")
+
+# Encoded once. The signing key comes first; retired keys are only tried on tokens it doesn't verify
+_KEYS = [secret.encode() for secret in [JWT_SECRET_KEY, *JWT_PREVIOUS_SECRET_KEYS]]
+_REQUIRED_CLAIMS = ["sub", "sid", "typ", "iat", "exp"]
+
+# Revoked session ids, and "user:<id>" cutoffs for every session a user had, -> revoked_at (epoch).
+# Access tokens outlive a revocation by at most ACCESS_TOKEN_TTL, so entries are dropped after that
+_revoked = {}
+
+_stats = {
+    "issued": 0, "verified": 0, "expired": 0, "invalid": 0, "revoked": 0,
+    "refreshed": 0, "refresh_reused": 0, "refresh_repeated": 0, "revocation_syncs": 0, "sync_errors": 0
+}
+
+_bearer = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _epoch(value):
+    """Whole seconds, like a token's iat, so a login in the same second as a reset isn't cut off."""
+    # Motor hands back naive datetimes that are UTC
+    return int((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+
+def _encode(claims):
+    return jwt.encode(claims, _KEYS[0], algorithm=ALGORITHM)
+
+def issue_tokens(user_id, sid=None):
+    """A short-lived access token and a single-use refresh token for one session."""
+    now = int(time.time())
+    sid = sid or uuid.uuid4().hex
+    _stats["issued"] += 1
+    return {
+        "access_token": _encode({"sub": user_id, "sid": sid, "typ": "access", "iat": now, "exp": now + ACCESS_TOKEN_TTL}),
+        "refresh_token": _encode({
+            "sub": user_id, "sid": sid, "typ": "refresh", "jti": uuid.uuid4().hex,
+            "iat": now, "exp": now + REFRESH_TOKEN_TTL
+        }),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL
+    }
+
+def decode_token(token, typ):
+    """Claims of a token signed by one of our keys, raising 401 if it is expired, forged or the wrong type."""
+    claims = None
+    for key in _KEYS:
+        try:
+            claims = jwt.decode(token, key, algorithms=[ALGORITHM], options={"require": _REQUIRED_CLAIMS})
+            break
+        except jwt.InvalidSignatureError:
+            continue
+        except jwt.ExpiredSignatureError:
+            _stats["expired"] += 1
+            raise _unauthorized("Token expired")
+        except jwt.InvalidTokenError:
+            break
+    if claims is None or claims["typ"] != typ:
+        _stats["invalid"] += 1
+        raise _unauthorized("Invalid token")
+    return claims
+
+def _is_revoked(claims):
+    if claims["sid"] in _revoked:
+        return True
+    cutoff = _revoked.get("user:" + claims["sub"])
+    return cutoff is not None and claims["iat"] < cutoff
+
+def verify_access_token(token):
+    """Signature, expiry and the in-memory revocation list; never touches the database."""
+    claims = decode_token(token, "access")
+    if _is_revoked(claims):
+        _stats["revoked"] += 1
+        raise _unauthorized("Session ended")
+    _stats["verified"] += 1
+    return claims
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(_bearer)):
+    """user_id of the bearer access token. Async so it runs on the event loop, not the threadpool."""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    return verify_access_token(credentials.credentials)["sub"]
+
+async def _revoke(key, kind, user_id):
+    now = _now()
+    _revoked[key] = _epoch(now)
+    await get_db().revoked_tokens.update_one(
+        {"_id": key},
+        {"$set": {"kind": kind, "user_id": user_id, "revoked_at": now, "expire_at": now + timedelta(seconds=REFRESH_TOKEN_TTL)}},
+        upsert=True
+    )
+
+async def revoke_session(claims):
+    """Log one session out: its refresh token stops working, and its access tokens once workers sync."""
+    await _revoke(claims["sid"], "session", claims["sub"])
+
+async def revoke_user_sessions(user_id):
+    """End every session the user has open, e.g. after a password reset."""
+    await _revoke("user:" + user_id, "user", user_id)
+
+async def _reissued(db, jti):
+    """The pair a refresh token was swapped for, if that happened within REFRESH_REUSE_GRACE."""
+    used = await db.revoked_tokens.find_one({"_id": "jti:" + jti}, {"revoked_at": 1})
+    if used is None or time.time() - _epoch(used["revoked_at"]) > REFRESH_REUSE_GRACE:
+        return None
+    # The first refresh may still be storing its pair
+    for _ in range(20):
+        doc = await db.revoked_tokens.find_one({"_id": "grace:" + jti}, {"tokens": 1})
+        if doc:
+            return doc["tokens"]
+        await asyncio.sleep(0.05)
+    return None
+
+async def refresh_session(refresh_token):
+    """Swap a refresh token for a new pair in the same session. Each refresh token works once,
+    except that a repeat within REFRESH_REUSE_GRACE gets the pair the first use was given."""
+    claims = decode_token(refresh_token, "refresh")
+    db = get_db()
+    # Refreshing is rare, so it checks the database instead of this worker's list
+    async for doc in db.revoked_tokens.find({"_id": {"$in": [claims["sid"], "user:" + claims["sub"]]}}):
+        if doc["kind"] == "session" or claims["iat"] < _epoch(doc["revoked_at"]):
+            _stats["revoked"] += 1
+            raise _unauthorized("Session ended")
+    try:
+        await db.revoked_tokens.insert_one({
+            "_id": "jti:" + claims["jti"],
+            "kind": "refresh",
+            "user_id": claims["sub"],
+            "revoked_at": _now(),
+            "expire_at": datetime.fromtimestamp(claims["exp"], timezone.utc)
+        })
+    except DuplicateKeyError:
+        # Another tab refreshing at the same moment
+        tokens = await _reissued(db, claims["jti"])
+        if tokens:
+            _stats["refresh_repeated"] += 1
+            return tokens
+        # Seen twice outside the grace window: it has been copied; end the session for both holders
+        _stats["refresh_reused"] += 1
+        await revoke_session(claims)
+        raise _unauthorized("Session ended")
+    _stats["refreshed"] += 1
+    tokens = issue_tokens(claims["sub"], sid=claims["sid"])
+    if REFRESH_REUSE_GRACE > 0:
+        await db.revoked_tokens.insert_one({
+            "_id": "grace:" + claims["jti"],
+            "kind": "grace",
+            "user_id": claims["sub"],
+            "tokens": tokens,
+            # Mongo's TTL sweep runs about once a minute; _reissued checks the window itself
+            "expire_at": _now() + timedelta(seconds=REFRESH_REUSE_GRACE)
+        })
+    return tokens
+
+def _prune():
+    horizon = time.time() - ACCESS_TOKEN_TTL
+    for key in [key for key, revoked_at in _revoked.items() if revoked_at < horizon]:
+        del _revoked[key]
+
+async def sync_revocations():
+    """Keep this worker's revocation list in step with logouts and resets made by other workers."""
+    since = None
+    while True:
+        started = _now()
+        try:
+            if since is None:
+                since = started - timedelta(seconds=ACCESS_TOKEN_TTL)
+            cursor = get_db().revoked_tokens.find(
+                {"kind": {"$in": ["session", "user"]}, "revoked_at": {"$gte": since}}, {"revoked_at": 1}
+            )
+            async for doc in cursor:
+                _revoked[doc["_id"]] = max(_revoked.get(doc["_id"], 0), _epoch(doc["revoked_at"]))
+            since = started - timedelta(seconds=_SYNC_OVERLAP)
+            _prune()
+            _stats["revocation_syncs"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats["sync_errors"] += 1
+            print(f"❌ Revocation sync failed: {e}")
+        await asyncio.sleep(AUTH_REVOCATION_SYNC)
+
+def get_session_stats():
+    return {
+        **_stats,
+        "revoked_cached": len(_revoked),
+        "access_token_ttl": ACCESS_TOKEN_TTL,
+        "signing_keys": len(_KEYS)
+    }
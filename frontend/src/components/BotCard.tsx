@@ -1,10 +1,11 @@
 import React from 'react';
 import { useNavigate } from 'react-router-dom';
 import { MessageCircle, Settings, Globe, Lock, User, Trash2 } from 'lucide-react';
+import { avatarSrc } from '../services/api';
 
 interface Bot {
   bot_id: string;
-  avatar_base64?: string;
+  avatar_url?: string | null;
   name: string;
   type_of_bot: string;
   privacy: 'public' | 'private';
@@ -51,9 +52,9 @@ export default function BotCard({ bot, isOwner, onDelete }: BotCardProps) {
     <div className="bg-white rounded-xl shadow-md hover:shadow-lg transition-shadow border border-slate-200 overflow-hidden">
       <div className="p-6">
         <div className="flex items-center mb-4">
-          {bot.avatar_base64 ? (
+          {bot.avatar_url ? (
             <img
-              src={bot.avatar_base64}
+              src={avatarSrc(bot.avatar_url, 128)}
               alt={bot.name}
               onError={(e) => {
                 // If image fails to load, show the default avatar
@@ -65,7 +66,7 @@ export default function BotCard({ bot, isOwner, onDelete }: BotCardProps) {
               className="w-16 h-16 rounded-full object-cover mr-4"
             />
           ) : null}
-          <div className={`w-16 h-16 bg-gradient-to-br from-blue-500 to-purple-600 rounded-full flex items-center justify-center mr-4 default-avatar ${bot.avatar_base64 ? 'hidden' : ''}`}>
+          <div className={`w-16 h-16 bg-gradient-to-br from-blue-500 to-purple-600 rounded-full flex items-center justify-center mr-4 default-avatar ${bot.avatar_url ? 'hidden' : ''}`}>
             <User className="h-8 w-8 text-white" />
           </div>
           <div className="flex-1">
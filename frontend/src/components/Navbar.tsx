@@ -1,15 +1,15 @@
 import React from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { LogOut, Bot, User } from 'lucide-react';
+import { logoutUser } from '../services/api';
 
 export default function Navbar() {
   const navigate = useNavigate();
   const isLoggedIn = localStorage.getItem('user_id');
 
-  const handleLogout = () => {
-    localStorage.removeItem('user_id');
-    // Dispatch custom event to notify other components about auth change
-    window.dispatchEvent(new Event('authChange'));
+  const handleLogout = async () => {
+    // Ends the session server-side too; local state is cleared even if that fails
+    await logoutUser().catch(() => undefined);
     navigate('/');
   };
 
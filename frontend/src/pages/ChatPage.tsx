@@ -2,7 +2,7 @@ import React, { useEffect, useState, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { Send, RotateCcw, ArrowLeft, Bot, User } from 'lucide-react';
 // Axios is used by the API service
-import { sendMessage, getChatHistory, getBotById, restartChat } from '../services/api';
+import { sendMessage, streamMessage, getChatHistory, getBotById, restartChat, avatarSrc } from '../services/api';
 import { v4 as uuidv4 } from 'uuid';
 
 // Helper function to format timestamp
@@ -19,6 +19,21 @@ const formatTimestamp = (timestamp: string): string => {
   }
 };
 
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+const toChatMessage = (msg: any): ChatMessage => ({
+  id: msg._id || msg.id || msg.message_id || `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+  message: msg.message || '',
+  response: msg.response || '',
+  timestamp: msg.timestamp || new Date().toISOString(),
+  is_system_message: msg.is_system_message || false,
+  message_id: msg.message_id || undefined,
+  updated: msg.updated || undefined,
+  _id: msg._id || undefined,
+  user_id: msg.user_id || undefined,
+  bot_id: msg.bot_id || undefined,
+  chat_id: msg.chat_id || undefined
+});
+
 interface ChatMessage {
   id: string;
   message: string;
@@ -41,7 +56,7 @@ export default function ChatPage() {
   interface Bot {
     id: string;
     name: string;
-    avatar_base64?: string;
+    avatar_url?: string | null;
     type_of_bot?: string;
     first_message?: string;
   }
@@ -51,7 +66,13 @@ export default function ChatPage() {
   const [isSending, setIsSending] = useState(false);
   // isLoading is used in the loading state check
   // setIsLoading is used in the fetchData function
+  // Cursor for the next older page of history; null once the start of the chat is loaded
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const messagesContainerRef = useRef<HTMLDivElement>(null);
+  // Set while prepending older messages so the view doesn't jump to the bottom
+  const preserveScrollRef = useRef<number | null>(null);
   const userId = localStorage.getItem('user_id');
 
   useEffect(() => {
@@ -111,21 +132,10 @@ export default function ChatPage() {
             } else if (Array.isArray(historyResponse.data)) {
               console.log('Setting chat history data:', historyResponse.data);
               // Ensure each message has the required fields
-              const formattedMessages = historyResponse.data.map((msg: any) => ({
-                id: msg._id || msg.id || msg.message_id || `msg-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
-                message: msg.message || '',
-                response: msg.response || '',
-                timestamp: msg.timestamp || new Date().toISOString(),
-                is_system_message: msg.is_system_message || false,
-                message_id: msg.message_id || undefined,
-                updated: msg.updated || undefined,
-                _id: msg._id || undefined,
-                user_id: msg.user_id || undefined,
-                bot_id: msg.bot_id || undefined,
-                chat_id: msg.chat_id || undefined
-              }));
+              const formattedMessages = historyResponse.data.map(toChatMessage);
               console.log('Formatted messages:', formattedMessages);
               setChat(formattedMessages);
+              setOlderCursor(historyResponse.next_before || null);
             }
           }
         } catch (error: unknown) {
@@ -166,9 +176,38 @@ export default function ChatPage() {
   }, [userId, botId, navigate]);
 
   useEffect(() => {
+    const container = messagesContainerRef.current;
+    if (preserveScrollRef.current !== null && container) {
+      // Keep the previously visible message in place after prepending older ones
+      container.scrollTop = container.scrollHeight - preserveScrollRef.current;
+      preserveScrollRef.current = null;
+      return;
+    }
     scrollToBottom();
   }, [chat]);
 
+  const loadOlderMessages = async () => {
+    if (!olderCursor || isLoadingOlder || !userId || !botId) return;
+    setIsLoadingOlder(true);
+    try {
+      const historyResponse = await getChatHistory(userId, botId, undefined, { before: olderCursor });
+      if (historyResponse.status === 'success' && Array.isArray(historyResponse.data)) {
+        const container = messagesContainerRef.current;
+        preserveScrollRef.current = container ? container.scrollHeight - container.scrollTop : null;
+        setChat(prev => [...historyResponse.data.map(toChatMessage), ...prev]);
+        setOlderCursor(historyResponse.next_before || null);
+      }
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
+  const handleScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    if (e.currentTarget.scrollTop < 80) {
+      loadOlderMessages();
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -195,19 +234,32 @@ export default function ChatPage() {
     setChat((prev: ChatMessage[]) => [...prev, newMessage]);
 
     try {
-      const response = await sendMessage({ 
-        user_id: userId, 
-        bot_id: botId, 
-        message: userMessage 
-      });
+      let partial = '';
+      const reply = await streamMessage(
+        {
+          user_id: userId,
+          bot_id: botId,
+          message: userMessage
+        },
+        (token) => {
+          // Show tokens as they arrive instead of waiting for the full reply
+          partial += token;
+          const text = partial;
+          setChat((prev: ChatMessage[]) =>
+            prev.map((msg: ChatMessage) =>
+              msg.id === messageId ? { ...msg, response: text } : msg
+            )
+          );
+        }
+      );
       
-      // Update the message with the bot's response
+      // Update the message with the bot's final response
       setChat((prev: ChatMessage[]) => 
         prev.map((msg: ChatMessage) => 
           msg.id === messageId
             ? {
                 ...msg,
-                response: response.data.response || "I apologize, but I'm having trouble processing your request."
+                response: reply || "I apologize, but I'm having trouble processing your request."
                 // Keep the original timestamp - don't overwrite it
               }
             : msg
@@ -246,6 +298,7 @@ export default function ChatPage() {
       try {
         // Clear the current chat
         setChat([]);
+        setOlderCursor(null);
         
         // Call the restart chat endpoint
         await restartChat(userId, botId);
@@ -306,13 +359,13 @@ export default function ChatPage() {
           
           {bot && (
             <div className="flex items-center">
-              {bot.avatar_base64 ? (
+              {bot.avatar_url ? (
                 <img
-                  src={bot.avatar_base64}
+                  src={avatarSrc(bot.avatar_url, 64)}
                   alt={bot.name}
                   className="w-10 h-10 rounded-full object-cover mr-3"
                   onError={(e) => {
-                    console.error('Error loading avatar:', bot.avatar_base64);
+                    console.error('Error loading avatar:', bot.avatar_url);
                     // Fallback to default avatar if image fails to load
                     e.currentTarget.style.display = 'none';
                     e.currentTarget.nextElementSibling?.classList.remove('hidden');
@@ -343,8 +396,17 @@ export default function ChatPage() {
       </div>
 
       {/* Chat Messages */}
-      <div className="flex-1 overflow-y-auto p-6 space-y-6">
+      <div
+        ref={messagesContainerRef}
+        onScroll={handleScroll}
+        className="flex-1 overflow-y-auto p-6 space-y-6"
+      >
         {/* Removed separate welcome message since it's now part of the chat */}
+        {isLoadingOlder && (
+          <div className="flex justify-center">
+            <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+          </div>
+        )}
 
         {chat.map((message, index) => (
           <React.Fragment key={`message-${message.id}-${index}`}>
@@ -371,14 +433,14 @@ export default function ChatPage() {
             {message.response && (
               <div className="flex items-start space-x-3 mb-4">
                 <div className="flex-shrink-0">
-                  {bot?.avatar_base64 ? (
+                  {bot?.avatar_url ? (
                     <div className="relative">
                       <img
-                        src={bot.avatar_base64}
+                        src={avatarSrc(bot.avatar_url, 64)}
                         alt={bot.name}
                         className="w-8 h-8 rounded-full object-cover"
                         onError={(e) => {
-                          console.error('Error loading avatar:', bot.avatar_base64);
+                          console.error('Error loading avatar:', bot.avatar_url);
                           const img = e.currentTarget;
                           img.style.display = 'none';
                           const fallback = img.nextElementSibling as HTMLElement;
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import { Bot, Save, ArrowLeft } from 'lucide-react';
-import { createBot, getBotById, updateBot } from '../services/api';
+import { createBot, getBotById, updateBot, avatarSrc } from '../services/api';
 
 export default function CreateBot() {
   const [searchParams] = useSearchParams();
@@ -58,9 +58,9 @@ export default function CreateBot() {
         privacy: bot.privacy || 'private',
       });
       
-      if (bot.avatar_base64) {
-        setAvatarBase64(bot.avatar_base64);
-        setAvatarPreview(bot.avatar_base64);
+      // Only preview the stored avatar; it is re-uploaded only if the user picks a new one
+      if (bot.avatar_url) {
+        setAvatarPreview(avatarSrc(bot.avatar_url, 256) || '');
       }
     } catch (error) {
       console.error('Error loading bot data:', error);
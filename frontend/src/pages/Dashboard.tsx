@@ -1,9 +1,9 @@
 import { useEffect, useState, useCallback } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { Plus, MessageCircle, ChevronRight, Menu, X } from 'lucide-react';
-import { getMyBots, getPublicBots, getChatHistory, deleteBot, getBotById } from '../services/api';
+import { getMyBots, getPublicBots, getRecentChats, deleteBot, avatarSrc } from '../services/api';
 import BotCard from '../components/BotCard';
-import { Bot, ChatMessage, ChatHistoryItem } from '../types';
+import { Bot, ChatHistoryItem, RecentChat } from '../types';
 import { useMediaQuery } from 'react-responsive';
 
 // Default avatar as base64 to avoid file dependency
@@ -13,6 +13,9 @@ export default function Dashboard() {
   const [activeTab, setActiveTab] = useState<'my-bots' | 'public-bots'>('my-bots');
   const [myBots, setMyBots] = useState<Bot[]>([]);
   const [publicBots, setPublicBots] = useState<Bot[]>([]);
+  const [myBotsCursor, setMyBotsCursor] = useState<string | null>(null);
+  const [publicBotsCursor, setPublicBotsCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
   const [chatHistory, setChatHistory] = useState<ChatHistoryItem[]>([]);
   const [isLoadingHistory, setIsLoadingHistory] = useState(false);
@@ -40,8 +43,10 @@ export default function Dashboard() {
         getMyBots(userId!),
         getPublicBots()
       ]);
-      setMyBots(myBotsRes.data);
-      setPublicBots(publicBotsRes.data);
+      setMyBots(myBotsRes.data.data);
+      setMyBotsCursor(myBotsRes.data.next_cursor);
+      setPublicBots(publicBotsRes.data.data);
+      setPublicBotsCursor(publicBotsRes.data.next_cursor);
     } catch (error) {
       console.error('Error loading bots:', error);
     } finally {
@@ -49,6 +54,29 @@ export default function Dashboard() {
     }
   };
 
+  const loadMoreBots = async () => {
+    const isMyBots = activeTab === 'my-bots';
+    const cursor = isMyBots ? myBotsCursor : publicBotsCursor;
+    if (!cursor || isLoadingMore) return;
+
+    setIsLoadingMore(true);
+    try {
+      if (isMyBots) {
+        const res = await getMyBots(userId!, undefined, { cursor });
+        setMyBots(prev => [...prev, ...res.data.data]);
+        setMyBotsCursor(res.data.next_cursor);
+      } else {
+        const res = await getPublicBots(undefined, { cursor });
+        setPublicBots(prev => [...prev, ...res.data.data]);
+        setPublicBotsCursor(res.data.next_cursor);
+      }
+    } catch (error) {
+      console.error('Error loading more bots:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleDeleteBot = async (botId: string) => {
     try {
       await deleteBot(botId, userId!);
@@ -65,68 +93,22 @@ export default function Dashboard() {
     
     setIsLoadingHistory(true);
     try {
-      // Get all unique bot IDs from both myBots and publicBots
-      const allBots = [...myBots, ...publicBots];
-      const uniqueBotIds = Array.from(new Set(allBots.map(bot => bot.bot_id)));
-      
-      // Fetch chat history for each bot in parallel
-      const historyPromises = uniqueBotIds.map(async (botId) => {
-        try {
-          const response = await getChatHistory(userId, botId);
-          if (response.data && response.data.length > 0) {
-            // Get bot details to get avatar
-            let bot: Bot | undefined = allBots.find(b => b.bot_id === botId);
-            
-            // If bot not found in current lists, fetch it directly
-            if (!bot) {
-              try {
-                const botResponse = await getBotById(botId);
-                bot = botResponse.data;
-              } catch (error) {
-                console.error(`Error fetching bot ${botId}:`, error);
-              }
-            }
-            
-            const lastMessage: ChatMessage = response.data[response.data.length - 1];
-            
-            // Ensure we have a valid timestamp
-            let validTimestamp = lastMessage.timestamp;
-            if (!validTimestamp || isNaN(new Date(validTimestamp).getTime())) {
-              console.warn(`Invalid timestamp for bot ${botId}:`, lastMessage.timestamp);
-              validTimestamp = new Date().toISOString(); // fallback to current time
-            }
-            
-            return {
-              bot_id: botId,
-              bot_name: bot?.name || 'Unknown Bot',
-              bot_avatar_base64: bot?.avatar_base64,
-              last_message: lastMessage.message || lastMessage.response || '',
-              timestamp: validTimestamp
-            };
-          }
-          return null;
-        } catch (error) {
-          console.error(`Error loading history for bot ${botId}:`, error);
-          return null;
-        }
-      });
-      
-      const historyResults = await Promise.all(historyPromises);
-      const validHistory: ChatHistoryItem[] = [];
-      historyResults.forEach(item => {
-        if (item !== null) {
-          validHistory.push({
-            bot_id: item.bot_id,
-            bot_name: item.bot_name,
-            bot_avatar_base64: item.bot_avatar_base64,
-            last_message: item.last_message,
-            timestamp: item.timestamp
-          });
-        }
-      });
-      
-      // Sort by timestamp (most recent first)
-      validHistory.sort((a, b) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime());
+      // One request for every conversation summary, already sorted most recent first
+      const response = await getRecentChats(userId);
+      if (response.data.status !== 'success') {
+        console.error('Error loading chat history:', response.data.message);
+        return;
+      }
+
+      // Fall back to the bot lists we already have loaded for older summaries
+      const botsById = new Map([...myBots, ...publicBots].map(bot => [bot.bot_id, bot]));
+      const validHistory: ChatHistoryItem[] = response.data.data.map((item: RecentChat) => ({
+        bot_id: item.bot_id,
+        bot_name: item.bot_name || botsById.get(item.bot_id)?.name || 'Unknown Bot',
+        bot_avatar_url: item.bot_avatar_url || botsById.get(item.bot_id)?.avatar_url,
+        last_message: item.last_message || '',
+        timestamp: item.last_timestamp
+      }));
       
       setChatHistory(validHistory);
     } catch (error) {
@@ -234,7 +216,7 @@ export default function Dashboard() {
                 >
                   <div className="flex items-center space-x-3">
                     <img 
-                      src={chat.bot_avatar_base64 || defaultAvatar} 
+                      src={avatarSrc(chat.bot_avatar_url, 64) || defaultAvatar} 
                       alt={chat.bot_name}
                       className="h-10 w-10 rounded-full object-cover"
                       onError={(e) => {
@@ -382,6 +364,17 @@ export default function Dashboard() {
                 )}
               </div>
             )}
+            {(activeTab === 'my-bots' ? myBotsCursor : publicBotsCursor) && (
+              <div className="flex justify-center mt-6">
+                <button
+                  onClick={loadMoreBots}
+                  disabled={isLoadingMore}
+                  className="px-4 py-2 bg-white border border-gray-300 text-gray-700 rounded-lg hover:bg-gray-50 disabled:opacity-50 transition-colors"
+                >
+                  {isLoadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
       </div>
@@ -2,14 +2,14 @@ import React from 'react';
 import { Link } from 'react-router-dom';
 import { useEffect, useState } from 'react';
 import { Bot, MessageCircle, Users, Sparkles } from 'lucide-react';
-import { getPublicBots } from '../services/api';
+import { getPublicBots, avatarSrc } from '../services/api';
 
 type BotType = {
   bot_id: string;
   name: string;
   type_of_bot: string;
   bio: string;
-  avatar_base64: string | null;
+  avatar_url: string | null;
   privacy: string;
 };
 
@@ -20,7 +20,7 @@ const sampleBots = [
     name: "Sarah the Therapist",
     type_of_bot: "Counselor",
     bio: "A compassionate AI therapist ready to listen and provide emotional support",
-    avatar_base64: null,
+    avatar_url: null,
     privacy: 'public'
   },
   {
@@ -28,7 +28,7 @@ const sampleBots = [
     name: "Code Master",
     type_of_bot: "Developer",
     bio: "Expert programming mentor to help you learn and solve coding challenges",
-    avatar_base64: null,
+    avatar_url: null,
     privacy: 'public'
   },
   {
@@ -36,7 +36,7 @@ const sampleBots = [
     name: "Mom Bot",
     type_of_bot: "Family",
     bio: "Your caring virtual mom who's always there for advice and encouragement",
-    avatar_base64: null,
+    avatar_url: null,
     privacy: 'public'
   }
 ];
@@ -67,12 +67,12 @@ export default function Landing() {
   useEffect(() => {
     const loadFeaturedBots = async () => {
       try {
-        const response = await getPublicBots();
-        const publicBots = response.data;
+        // Only the six most popular bots are featured, so only fetch those
+        const response = await getPublicBots(undefined, { limit: 6, sort: 'popularity' });
+        const publicBots = response.data.data;
         
         if (publicBots && publicBots.length > 0) {
-          // Show up to 6 featured bots, or all if less than 6
-          setFeaturedBots(publicBots.slice(0, 6));
+          setFeaturedBots(publicBots);
         } else {
           // Use sample bots if no real bots exist
           setFeaturedBots(sampleBots);
@@ -90,7 +90,7 @@ export default function Landing() {
   }, []);
 
   const getAvatarUrl = (bot: BotType) => {
-    return bot.avatar_base64 || null;
+    return avatarSrc(bot.avatar_url, 128) || null;
   };
 
   return (
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { useNavigate, Link, useLocation } from 'react-router-dom';
 import { Mail, Lock, Eye, EyeOff } from 'lucide-react';
-import { loginUser, requestPasswordReset, verifyPasswordResetOTP } from '../services/api';
+import { loginUser, saveSession, requestPasswordReset, verifyPasswordResetOTP } from '../services/api';
 
 export default function Login() {
   // Form states
@@ -36,6 +36,7 @@ export default function Login() {
       const res = await loginUser(form);
       localStorage.setItem('user_id', res.data.user_id);
       localStorage.setItem('user_name', res.data.full_name);
+      saveSession(res.data);
       navigate('/dashboard');
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Login failed. Please try again.');
@@ -1,4 +1,4 @@
-import axios from 'axios';
+import axios, { AxiosError, InternalAxiosRequestConfig } from 'axios';
 
 const API = axios.create({
   baseURL: 'http://localhost:8000',
@@ -7,6 +7,69 @@ const API = axios.create({
   },
 });
 
+// ======================
+// Session tokens
+// ======================
+export interface SessionTokens {
+  access_token: string;
+  refresh_token: string;
+}
+
+export const saveSession = (tokens: SessionTokens) => {
+  localStorage.setItem('access_token', tokens.access_token);
+  localStorage.setItem('refresh_token', tokens.refresh_token);
+};
+
+export const clearSession = () => {
+  ['access_token', 'refresh_token', 'user_id', 'user_name'].forEach((key) => localStorage.removeItem(key));
+  // Notify other components about the auth change
+  window.dispatchEvent(new Event('authChange'));
+};
+
+const authHeader = (): Record<string, string> => {
+  const token = localStorage.getItem('access_token');
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
+// Refresh tokens are single use, so concurrent 401s share one refresh request
+let refreshing: Promise<boolean> | null = null;
+
+const refreshSession = () => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) return Promise.resolve(false);
+  if (refreshing) return refreshing;
+  refreshing = axios
+    .post(`${API.defaults.baseURL}/auth/refresh`, { refresh_token: refreshToken })
+    .then((res) => {
+      saveSession(res.data);
+      return true;
+    })
+    .catch(() => {
+      clearSession();
+      return false;
+    })
+    .finally(() => {
+      refreshing = null;
+    });
+  return refreshing;
+};
+
+API.interceptors.request.use((config) => {
+  Object.entries(authHeader()).forEach(([name, value]) => config.headers.set(name, value));
+  return config;
+});
+
+// An expired access token is refreshed once and the request retried
+API.interceptors.response.use(undefined, async (error: AxiosError) => {
+  const config = error.config as (InternalAxiosRequestConfig & { _retried?: boolean }) | undefined;
+  if (error.response?.status !== 401 || !config || config._retried || config.url?.startsWith('/auth/')) {
+    throw error;
+  }
+  config._retried = true;
+  if (!(await refreshSession())) throw error;
+  return API(config);
+});
+
 // ======================
 // Auth Endpoints
 // ======================
@@ -28,6 +91,15 @@ export const verifyEmail = (data: {
 export const loginUser = (data: { email: string; password: string }) =>
   API.post('/auth/login', data);
 
+export const logoutUser = async () => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  try {
+    if (refreshToken) await API.post('/auth/logout', { refresh_token: refreshToken });
+  } finally {
+    clearSession();
+  }
+};
+
 export const requestPasswordReset = (email: string) =>
   API.post('/auth/forgot-password/request', email, {
     headers: {
@@ -58,7 +130,7 @@ export const verifyPasswordResetOTP = (email: string, otp: string, newPassword?:
 // Bot Endpoints
 // ======================
 export interface BotData {
-  user_id: string;
+  user_id: string; // Ignored by the API, which uses the logged-in user
   name: string;
   bio: string;
   first_message: string;
@@ -80,11 +152,19 @@ export const updateBot = (botId: string, botData: BotData, signal?: AbortSignal)
 export const getBotById = (id: string, signal?: AbortSignal) =>
   API.get(`/bots/${id}`, signal ? { signal } : undefined);
 
-export const getMyBots = (userId: string, signal?: AbortSignal) =>
-  API.get(`/bots/my?user_id=${userId}`, signal ? { signal } : undefined);
+// List endpoints return a page of bot cards: { data: Bot[], next_cursor: string | null }
+export interface BotListOptions {
+  cursor?: string;
+  limit?: number;
+  sort?: 'created_at' | 'popularity';
+  type_of_bot?: string;
+}
+
+export const getMyBots = (userId: string, signal?: AbortSignal, options: BotListOptions = {}) =>
+  API.get('/bots/my', { params: { user_id: userId, ...options }, ...(signal && { signal }) });
 
-export const getPublicBots = (signal?: AbortSignal) => 
-  API.get('/bots/public', signal ? { signal } : undefined);
+export const getPublicBots = (signal?: AbortSignal, options: BotListOptions = {}) => 
+  API.get('/bots/public', { params: options, ...(signal && { signal }) });
 
 export const deleteBot = (botId: string, userId: string) =>
   API.delete(`/bots/${botId}?user_id=${userId}`);
@@ -103,13 +183,73 @@ export interface SendMessagePayload {
 
 export const sendMessage = (payload: SendMessagePayload) => API.post('/chat/ask', payload);
 
-export const getChatHistory = async (userId: string, botId: string, signal?: AbortSignal) => {
+// Streams the bot reply over SSE, calling onToken for each chunk as it arrives.
+// Resolves with the full reply once the backend has stored it.
+export const streamMessage = async (
+  payload: SendMessagePayload,
+  onToken: (token: string) => void,
+  signal?: AbortSignal
+): Promise<string> => {
+  const post = () => fetch(`${API.defaults.baseURL}/chat/ask/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...authHeader() },
+    body: JSON.stringify(payload),
+    signal,
+  });
+  let res = await post();
+  if (res.status === 401 && (await refreshSession())) {
+    res = await post();
+  }
+  if (!res.ok || !res.body) {
+    throw new Error(`Stream request failed with status ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let reply = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || '';
+    for (const event of events) {
+      if (!event.startsWith('data:')) continue;
+      const data = JSON.parse(event.slice('data:'.length));
+      if (data.status === 'error') throw new Error(data.message);
+      if (data.token) {
+        reply += data.token;
+        onToken(data.token);
+      }
+      if (data.done) return data.response;
+    }
+  }
+  return reply;
+};
+
+export interface ChatHistoryOptions {
+  before?: string;
+  after?: string;
+  limit?: number;
+  fields?: string;
+}
+
+export const getChatHistory = async (
+  userId: string,
+  botId: string,
+  signal?: AbortSignal,
+  options: ChatHistoryOptions = {}
+) => {
   try {
-    console.log('Fetching chat history with params:', { userId, botId });
+    console.log('Fetching chat history with params:', { userId, botId, ...options });
     const config = {
       params: { 
         user_id: userId, 
-        bot_id: botId 
+        bot_id: botId,
+        ...options
       },
       ...(signal && { signal })
     };
@@ -140,7 +280,14 @@ export const getChatHistory = async (userId: string, botId: string, signal?: Abo
   }
 };
 
+export const getRecentChats = (userId: string, signal?: AbortSignal) =>
+  API.get('/chat/recent', { params: { user_id: userId }, ...(signal && { signal }) });
+
 export const restartChat = (userId: string, botId: string) =>
   API.delete(`/chat/restart?user_id=${userId}&bot_id=${botId}`);
 
+// Avatar URLs from the API are relative; size picks a server-side thumbnail (64, 128 or 256)
+export const avatarSrc = (avatarUrl?: string | null, size?: number) =>
+  avatarUrl ? `${API.defaults.baseURL}${avatarUrl}${size ? `?size=${size}` : ''}` : undefined;
+
 export default API;
@@ -1,7 +1,7 @@
 export interface Bot {
   bot_id: string;
   name: string;
-  avatar_base64?: string;
+  avatar_url?: string | null;
   type_of_bot: string;
   privacy: 'public' | 'private';
   bio: string;
@@ -9,6 +9,8 @@ export interface Bot {
   created_at?: string;
   updated_at?: string;
   user_id?: string;
+  // "provider" or "provider:model"; unset means the server's default chain
+  model?: string | null;
 }
 
 export interface ChatMessage {
@@ -29,7 +31,17 @@ export interface ChatMessage {
 export interface ChatHistoryItem {
   bot_id: string;
   bot_name: string;
-  bot_avatar_base64?: string;
+  bot_avatar_url?: string | null;
   last_message: string;
   timestamp: string;
-}
\ No newline at end of file
+}
+export interface RecentChat {
+  chat_id: string;
+  user_id: string;
+  bot_id: string;
+  bot_name?: string;
+  bot_avatar_url?: string | null;
+  last_message: string;
+  last_timestamp: string;
+  message_count: number;
+}